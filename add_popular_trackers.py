@@ -1,88 +1,247 @@
 import os
-import requests
+import sys
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from qb_client import get_client, state_path
+from torrent_store import get_torrents
+from tracker_list import get_trackers
+from tracker_prober import filter_live_trackers, dead_trackers_from_status
 
 # Load environment variables from .env file
 load_dotenv()
 
-# CONFIGURATION - Update these values with your own
-QB_HOST = os.getenv("QB_URL", "http://localhost:8080")
-USERNAME = os.getenv("QB_USER", "admin")
-PASSWORD = os.getenv("QB_PASS", "admin")
+# The qBittorrent connection (QB_URL, QB_USER, QB_PASS) is configured in qb_client.py
 
-# Best trackers list, updated regularly
-# Alternatively, you can put your own list of trackers here
-TRACKERS_URL = (
-    "https://raw.githubusercontent.com/ngosang/trackerslist/master/trackers_best.txt"
-)
+# Number of torrents reconciled in parallel (1 = original sequential behaviour)
+TRACKER_WORKERS = int(os.getenv("TRACKER_WORKERS", "8"))
 
+# Local file remembering which tracker list was last applied to each torrent
+TRACKER_STATE_FILE = state_path(os.getenv("TRACKER_STATE_FILE", ".tracker_state.json"))
 
-def login(session):
-    r = session.post(
-        f"{QB_HOST}/api/v2/auth/login",
-        data={"username": USERNAME, "password": PASSWORD},
-    )
-    if r.text != "Ok.":
-        raise Exception("Failed to log in to qBittorrent WebUI")
+# Torrent fields the tracker tools read
+TORRENT_FIELDS = ("name", "private")
 
+# The tracker list sources (TRACKER_SOURCES) are configured in tracker_list.py
 
-def get_torrents(session):
-    r = session.get(f"{QB_HOST}/api/v2/torrents/info")
-    return r.json()
 
-
-def edit_trackers(session, hash, torrent_name, new_trackers):
+def edit_trackers(client, hash, torrent_name, new_trackers):
+    """Add any missing trackers to a torrent, returns "added" or "skipped"."""
     # Get existing trackers
-    r = session.get(f"{QB_HOST}/api/v2/torrents/trackers", params={"hash": hash})
+    r = client.get("torrents/trackers", params={"hash": hash})
     existing_trackers = set(t["url"] for t in r.json())
 
     # Only add trackers that aren't already there
     unique_trackers = [t for t in new_trackers if t not in existing_trackers]
     if unique_trackers:
         trackers_str = "\n".join(unique_trackers)
-        session.post(
-            f"{QB_HOST}/api/v2/torrents/addTrackers",
-            data={"hash": hash, "urls": trackers_str},
-        )
+        client.post("torrents/addTrackers", data={"hash": hash, "urls": trackers_str})
         print(f"✅ Added trackers to {torrent_name}")
+        return "added"
     else:
         print(f"ℹ️ No new trackers needed for {torrent_name}")
+        return "skipped"
+
 
+def trackers_digest(trackers):
+    """Stable digest of a tracker list, independent of order and duplicates"""
+    joined = "\n".join(sorted(set(trackers)))
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()
 
-def add_popular_trackers():
-    """Add popular trackers to all public torrents in qBittorrent"""
-    trackers_to_add = []
+
+def load_tracker_state(path=None):
+    """Load the {torrent hash: digest} map written by the previous run"""
+    path = path or TRACKER_STATE_FILE
     try:
-        response = requests.get(TRACKERS_URL)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        trackers_to_add = [
-            tracker.strip() for tracker in response.text.splitlines() if tracker.strip()
-        ]
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable tracker state file {path}: {e}")
+        return {}
+
+
+def save_tracker_state(state, path=None):
+    """Atomically write the {torrent hash: digest} map"""
+    path = path or TRACKER_STATE_FILE
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def reconcile_torrent(client, torrent, new_trackers):
+    """Reconcile one torrent, never raises - returns "added", "skipped" or "failed"."""
+    try:
+        return edit_trackers(client, torrent["hash"], torrent["name"], new_trackers)
+    except Exception as e:
+        print(f"❌ Failed to update trackers for {torrent['name']}: {e}")
+        return "failed"
+
+
+def prune_torrent(client, torrent):
+    """Remove trackers qBittorrent reports as not working from one torrent
+
+    Never raises - returns "removed", "skipped" or "failed".
+    """
+    try:
+        r = client.get("torrents/trackers", params={"hash": torrent["hash"]})
+        dead_trackers = dead_trackers_from_status(r.json())
+        if not dead_trackers:
+            return "skipped"
+
+        client.post(
+            "torrents/removeTrackers",
+            data={"hash": torrent["hash"], "urls": "|".join(dead_trackers)},
+        )
+        print(f"🧹 Removed {len(dead_trackers)} dead trackers from {torrent['name']}")
+        return "removed"
+    except Exception as e:
+        print(f"❌ Failed to prune trackers for {torrent['name']}: {e}")
+        return "failed"
+
+
+def for_each_torrent(client, torrents, func, workers=None):
+    """Yield (torrent, func(client, torrent)) using a bounded worker pool.
+
+    With workers <= 1 the torrents are processed one after another on the
+    calling thread.
+    """
+    if workers is None:
+        workers = TRACKER_WORKERS
+
+    if workers <= 1:
+        for torrent in torrents:
+            yield torrent, func(client, torrent)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(func, client, torrent): torrent for torrent in torrents
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def reconcile_trackers(client, torrents, new_trackers, workers=None):
+    """Add trackers to the given torrents using a bounded worker pool.
+
+    Returns a summary dict of counts, plus the hashes of every torrent that
+    was reconciled successfully under "succeeded".
+    """
+    summary = {"added": 0, "skipped": 0, "failed": 0, "succeeded": []}
+
+    def reconcile(client, torrent):
+        return reconcile_torrent(client, torrent, new_trackers)
+
+    for torrent, status in for_each_torrent(client, torrents, reconcile, workers):
+        summary[status] += 1
+        if status != "failed":
+            summary["succeeded"].append(torrent["hash"])
+
+    return summary
+
+
+def print_summary(summary):
+    print(f"\n📊 Tracker Summary:")
+    print(f"   ✅ Added: {summary['added']} torrents")
+    print(f"   ℹ️ Skipped: {summary['skipped']} torrents")
+    if summary.get("up_to_date"):
+        print(f"   💤 Already up to date: {summary['up_to_date']} torrents")
+    if summary["failed"] > 0:
+        print(f"   ❌ Failed: {summary['failed']} torrents")
+
+
+def add_popular_trackers(workers=None, force=False, probe=False):
+    """Add popular trackers to all public torrents in qBittorrent
+
+    Torrents whose last applied tracker list matches the current one are
+    skipped without contacting qBittorrent, unless force is True. With
+    probe=True only trackers that answer a liveness check are added.
+    """
+    try:
+        trackers_to_add = get_trackers()
         if not trackers_to_add:
-            print("⚠️ Fetched tracker list is empty. No trackers will be added.")
+            print(
+                "⚠️ No trackers available from any source. No trackers will be added."
+            )
             return False
-        print(f"ℹ️ Successfully fetched {len(trackers_to_add)} trackers.")
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error fetching trackers: {e}")
-        print("ℹ️ Proceeding without adding new trackers.")
-        return False  # Or, optionally, proceed with an empty list or a default list
+        print(f"ℹ️ Successfully loaded {len(trackers_to_add)} trackers.")
+
+        if probe:
+            trackers_to_add = filter_live_trackers(trackers_to_add)
+            if not trackers_to_add:
+                print(
+                    "⚠️ None of the trackers are reachable. No trackers will be added."
+                )
+                return False
+
+        client = get_client()
+        torrents = get_torrents(TORRENT_FIELDS)
+        # Only edit public torrents
+        public_torrents = [t for t in torrents if not t.get("private")]
+
+        digest = trackers_digest(trackers_to_add)
+        previous_state = {} if force else load_tracker_state()
+        pending = [
+            t for t in public_torrents if previous_state.get(t["hash"]) != digest
+        ]
 
-    try:
-        with requests.Session() as s:
-            login(s)
-            torrents = get_torrents(s)
-            for torrent in torrents:
-                if not torrent.get("private"):  # Only edit public torrents
-                    edit_trackers(s, torrent["hash"], torrent["name"], trackers_to_add)
-        return True
+        summary = reconcile_trackers(client, pending, trackers_to_add, workers)
+        summary["up_to_date"] = len(public_torrents) - len(pending)
+
+        # Keep entries for torrents that still exist, drop removed ones
+        public_hashes = {t["hash"] for t in public_torrents}
+        new_state = {h: d for h, d in previous_state.items() if h in public_hashes}
+        for torrent_hash in summary["succeeded"]:
+            new_state[torrent_hash] = digest
+        try:
+            save_tracker_state(new_state)
+        except OSError as e:
+            print(f"⚠️ Could not save tracker state: {e}")
+
+        print_summary(summary)
+        return summary["failed"] == 0
     except Exception as e:
         print(f"❌ Error adding trackers: {e}")
         return False
 
 
+def prune_dead_trackers(workers=None):
+    """Remove trackers marked as not working from all public torrents"""
+    try:
+        client = get_client()
+        public_torrents = [
+            t for t in get_torrents(TORRENT_FIELDS) if not t.get("private")
+        ]
+
+        summary = {"removed": 0, "skipped": 0, "failed": 0}
+        for _, status in for_each_torrent(
+            client, public_torrents, prune_torrent, workers
+        ):
+            summary[status] += 1
+
+        print(f"\n📊 Prune Summary:")
+        print(f"   🧹 Pruned: {summary['removed']} torrents")
+        print(f"   ℹ️ Nothing to prune: {summary['skipped']} torrents")
+        if summary["failed"] > 0:
+            print(f"   ❌ Failed: {summary['failed']} torrents")
+        return summary["failed"] == 0
+    except Exception as e:
+        print(f"❌ Error pruning trackers: {e}")
+        return False
+
+
 def main():
-    add_popular_trackers()
+    args = sys.argv[1:]
+    if "--prune" in args:
+        prune_dead_trackers()
+    else:
+        add_popular_trackers(force="--force" in args, probe="--probe" in args)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
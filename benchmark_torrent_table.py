@@ -0,0 +1,161 @@
+"""Compare dict-based torrent statistics with the columnar TorrentTable
+
+Usage: python benchmark_torrent_table.py [counts...]   (default 1000 10000 100000)
+"""
+
+import sys
+import time
+import random
+import tracemalloc
+from torrent_table import TorrentTable, np
+from disk_usage import format_bytes
+
+STATES = [
+    "uploading",
+    "stalledUP",
+    "queuedUP",
+    "pausedUP",
+    "downloading",
+    "stalledDL",
+    "pausedDL",
+    "error",
+]
+CATEGORIES = ["", "Movies", "TV", "Music", "Books", "ISOs", "Games"]
+
+# Filler fields so each dict looks like a real /torrents/info entry
+EXTRA_FIELDS = [f"field_{i}" for i in range(40)]
+
+
+def make_torrents(count, seed=0):
+    rng = random.Random(seed)
+    torrents = []
+    for i in range(count):
+        downloaded = rng.randint(0, 50 * 1024**3)
+        torrent = {
+            "hash": f"{i:040x}",
+            "name": f"Torrent {i}",
+            "state": rng.choice(STATES),
+            "category": rng.choice(CATEGORIES),
+            "size": rng.randint(1024**2, 80 * 1024**3),
+            "downloaded": downloaded,
+            "uploaded": int(downloaded * rng.random() * 3),
+            "progress": rng.random(),
+        }
+        for field in EXTRA_FIELDS:
+            torrent[field] = i
+        torrents.append(torrent)
+    return torrents
+
+
+def dict_statistics(torrents):
+    """The list-of-dicts aggregation the report and storage chart used"""
+    stats = {
+        "downloading": len(
+            [
+                t
+                for t in torrents
+                if t["state"] in ["downloading", "queuedDL", "stalledDL"]
+            ]
+        ),
+        "seeding": len(
+            [
+                t
+                for t in torrents
+                if t["state"] in ["uploading", "queuedUP", "stalledUP"]
+            ]
+        ),
+        "total_size": sum(t["size"] for t in torrents),
+        "downloaded": sum(t["downloaded"] for t in torrents),
+        "uploaded": sum(t["uploaded"] for t in torrents),
+    }
+    categories = {}
+    storage = {}
+    for torrent in torrents:
+        cat = torrent.get("category", "Uncategorized") or "Uncategorized"
+        categories[cat] = categories.get(cat, 0) + 1
+        storage[cat] = storage.get(cat, 0) + torrent["size"]
+    states = {}
+    for torrent in torrents:
+        states[torrent["state"]] = states.get(torrent["state"], 0) + 1
+    stats.update(categories=categories, storage=storage, states=states)
+    return stats
+
+
+def table_statistics(table):
+    return {
+        "downloading": table.count_where(
+            "state", ["downloading", "queuedDL", "stalledDL"]
+        ),
+        "seeding": table.count_where("state", ["uploading", "queuedUP", "stalledUP"]),
+        "total_size": table.total("size"),
+        "downloaded": table.total("downloaded"),
+        "uploaded": table.total("uploaded"),
+        "categories": table.counts("category"),
+        "storage": table.group_sum("size", by="category"),
+        "states": table.counts("state"),
+    }
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def measure_time(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def kept_statistics(table, changes):
+    """What TorrentStore.table() costs: apply a delta, copy, aggregate"""
+    for torrent in changes:
+        table.set(torrent)
+    return table_statistics(table.copy())
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f"NumPy: {'yes' if np is not None else 'no (pure Python fallback)'}")
+    print(
+        f"{'torrents':>10} {'dict mem':>12} {'table mem':>12} "
+        f"{'dict time':>12} {'table time':>12} {'build+table':>12} "
+        f"{'kept table':>12}"
+    )
+
+    for count in counts:
+        torrents, dict_memory = measure_memory(lambda: make_torrents(count))
+        table, table_memory = measure_memory(
+            lambda: TorrentTable.from_torrents(torrents)
+        )
+
+        expected = dict_statistics(torrents)
+        actual = table_statistics(table)
+        assert expected == actual, "table statistics differ from dict statistics"
+
+        dict_time = measure_time(dict_statistics, torrents)
+        table_time = measure_time(table_statistics, table)
+        # Building a fresh table on every call, against keeping one current
+        # from sync/maindata deltas (1% of torrents changed) like the store
+        built_time = measure_time(
+            lambda: table_statistics(TorrentTable.from_torrents(torrents))
+        )
+        changes = [{**t, "downloaded": t["downloaded"] + 1} for t in torrents[::100]]
+        kept_time = measure_time(kept_statistics, table, changes)
+
+        print(
+            f"{count:>10} {format_bytes(dict_memory):>12} "
+            f"{format_bytes(table_memory):>12} "
+            f"{dict_time * 1000:>10.1f}ms {table_time * 1000:>10.1f}ms "
+            f"{built_time * 1000:>10.1f}ms {kept_time * 1000:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Orphans sized in parallel by the cleanup dialog
+SIZE_WORKERS = int(os.getenv("SIZE_WORKERS", "8"))
+
+# Other folders that may hold hardlinks to completed files, e.g. a media
+# library: "/mnt/media/movies;/mnt/media/tv"
+LIBRARY_ROOTS = [path for path in os.getenv("LIBRARY_ROOTS", "").split(";") if path]
+
+
+def format_bytes(bytes_value):
+    """Convert bytes to human readable format"""
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if bytes_value < 1024.0:
+            return f"{bytes_value:.1f} {unit}"
+        bytes_value /= 1024.0
+    return f"{bytes_value:.1f} PB"
+
+
+def allocated_size(st):
+    """Bytes a stat result occupies on disk (st_size where st_blocks is missing)"""
+    blocks = getattr(st, "st_blocks", None)
+    return st.st_size if blocks is None else blocks * 512
+
+
+def iter_tree_stats(path):
+    """Yield (path, stat, is_dir) for path and everything below it
+
+    Walks directories with os.scandir, so file types come from the listing
+    and only one stat per entry is needed. Symlinks are not followed and
+    unreadable entries are skipped.
+    """
+    st = os.stat(path, follow_symlinks=False)
+    is_dir = os.path.isdir(path) and not os.path.islink(path)
+    yield path, st, is_dir
+    if not is_dir:
+        return
+
+    pending = [path]
+    while pending:
+        folder = pending.pop()
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if is_dir:
+                        pending.append(entry.path)
+                    yield entry.path, st, is_dir
+        except OSError:
+            continue
+
+
+def disk_usage(path):
+    """Bytes allocated on disk by a file or a whole directory tree"""
+    return tree_usage(path)["allocated"]
+
+
+def tree_usage(path):
+    """Hardlink-aware space used by a file or directory tree
+
+    Returns a dict with:
+
+    - "allocated": bytes on disk, counting each inode once
+    - "reclaimable": bytes freed by deleting path, which excludes files
+      that still have hardlinks outside of it
+    - "shared": {(dev, inode): [links, links inside path, bytes]} for the
+      files that are also linked from elsewhere
+    """
+    allocated = 0
+    reclaimable = 0
+    linked = {}
+
+    for _, st, is_dir in iter_tree_stats(path):
+        size = allocated_size(st)
+        if is_dir or st.st_nlink <= 1:
+            allocated += size
+            reclaimable += size
+            continue
+        key = (st.st_dev, st.st_ino)
+        if key in linked:
+            linked[key][1] += 1
+        else:
+            linked[key] = [st.st_nlink, 1, size]
+
+    shared = {}
+    for key, (links, inside, size) in linked.items():
+        allocated += size
+        if inside >= links:
+            reclaimable += size
+        else:
+            shared[key] = [links, inside, size]
+
+    return {"allocated": allocated, "reclaimable": reclaimable, "shared": shared}
+
+
+def reclaimable_together(usages):
+    """Bytes freed by deleting several trees at once
+
+    Files hardlinked between the trees only count once, and count as freed
+    when every one of their links is among them.
+    """
+    total = 0
+    shared = {}
+    for usage in usages:
+        total += usage["reclaimable"]
+        for key, (links, inside, size) in usage["shared"].items():
+            if key in shared:
+                shared[key][1] += inside
+            else:
+                shared[key] = [links, inside, size]
+    return total + sum(
+        size for links, inside, size in shared.values() if inside >= links
+    )
+
+
+_size_cache = {}
+_size_cache_lock = threading.Lock()
+
+
+def cached_tree_usage(path):
+    """tree_usage() cached by (path, mtime)
+
+    A directory's mtime only changes when its direct children change, so
+    files growing (or gaining links) deeper inside an unchanged folder
+    aren't noticed until the folder itself changes.
+    """
+    mtime = os.stat(path, follow_symlinks=False).st_mtime_ns
+    with _size_cache_lock:
+        cached = _size_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    usage = tree_usage(path)
+    with _size_cache_lock:
+        _size_cache[path] = (mtime, usage)
+    return usage
+
+
+def build_inode_index(roots, workers=None):
+    """Map (dev, inode) to the paths of every hardlinked file under roots
+
+    Only files with more than one link are kept, so the index stays small
+    even for large libraries. Roots are walked in parallel.
+    """
+
+    def index_root(root):
+        index = {}
+        for path, st, is_dir in iter_tree_stats(root):
+            if not is_dir and st.st_nlink > 1:
+                index.setdefault((st.st_dev, st.st_ino), []).append(path)
+        return index
+
+    workers = SIZE_WORKERS if workers is None else workers
+    index = {}
+    roots = [root for root in roots if os.path.isdir(root)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for partial in executor.map(index_root, roots):
+            for key, paths in partial.items():
+                index.setdefault(key, []).extend(paths)
+    return index
+
+
+def linked_from(path, usage, inode_index):
+    """Paths outside of path that share data with it, as far as the index knows"""
+    prefix = os.path.join(os.path.abspath(path), "")
+    others = set()
+    for key in usage["shared"]:
+        for other in inode_index.get(key, ()):
+            other = os.path.abspath(other)
+            if other != os.path.abspath(path) and not other.startswith(prefix):
+                others.add(other)
+    return sorted(others)
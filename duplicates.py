@@ -0,0 +1,271 @@
+import os
+import sys
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from qb_client import QBittorrentError
+from torrent_store import get_torrents
+from orphan_scan import TORRENT_FIELDS, OWNED, build_content_index
+from disk_usage import allocated_size, format_bytes, iter_tree_stats
+from quarantine import quarantine_root
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Files smaller than this are never reported as duplicates
+DUPE_MIN_SIZE = int(os.getenv("DUPE_MIN_SIZE", str(1024 * 1024)))
+
+# Processes hashing files in parallel
+DUPE_WORKERS = int(os.getenv("DUPE_WORKERS", str(os.cpu_count() or 2)))
+
+# Bytes hashed at the start and at the end of a file before a full hash
+PARTIAL_HASH_SIZE = 64 * 1024
+
+# Read size for full hashes
+READ_SIZE = 4 * 1024 * 1024
+
+
+def partial_hash(path):
+    """Hash of the first and last PARTIAL_HASH_SIZE bytes of a file"""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        digest.update(f.read(PARTIAL_HASH_SIZE))
+        size = os.fstat(f.fileno()).st_size
+        if size > 2 * PARTIAL_HASH_SIZE:
+            f.seek(size - PARTIAL_HASH_SIZE)
+            digest.update(f.read(PARTIAL_HASH_SIZE))
+        elif size > PARTIAL_HASH_SIZE:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def full_hash(path):
+    """Hash of a whole file, read in large blocks into a reused buffer"""
+    digest = hashlib.blake2b()
+    buffer = bytearray(READ_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+
+def _hash_file(task):
+    # Runs in a worker process, never raises so one bad file can't stop the run
+    func, path = task
+    try:
+        return path, func(path)
+    except OSError:
+        return path, None
+
+
+def _regroup(executor, groups, func):
+    """Split groups of same-size files further by func(path) in the pool"""
+    paths = [path for group in groups for path in group]
+    hashes = dict(
+        executor.map(_hash_file, [(func, path) for path in paths], chunksize=16)
+    )
+    regrouped = []
+    for group in groups:
+        by_hash = {}
+        for path in group:
+            if hashes.get(path) is not None:
+                by_hash.setdefault(hashes[path], []).append(path)
+        regrouped.extend(g for g in by_hash.values() if len(g) > 1)
+    return regrouped
+
+
+def iter_duplicates(roots, workers=None, min_size=None):
+    """Find files with identical content under roots, yielding events
+
+    Candidates are narrowed in stages so cheap checks eliminate most of
+    them first: same size, then same hash of the first and last 64 KB, then
+    same full hash. Hashing runs in a pool of workers processes
+    (DUPE_WORKERS by default). Hardlinks to the same data are counted once
+    and never reported as duplicates of each other. A copy only counts as
+    reclaimable when it has no other hardlinks, as replacing it would
+    otherwise free nothing. Events:
+
+    - {"type": "stage", "stage": name, "candidates": n}
+    - {"type": "duplicate", "size": bytes, "paths": [...], "reclaimable": bytes}
+    - {"type": "done", "groups": n, "reclaimable": bytes}
+    """
+    workers = DUPE_WORKERS if workers is None else workers
+    min_size = DUPE_MIN_SIZE if min_size is None else min_size
+
+    by_size = {}
+    seen_inodes = set()
+    for root in roots:
+        skip = os.path.join(quarantine_root(root), "")
+        for path, st, is_dir in iter_tree_stats(root):
+            if is_dir or st.st_size < max(min_size, 1) or path.startswith(skip):
+                continue
+            if os.path.islink(path):
+                continue
+            inode = (st.st_dev, st.st_ino)
+            if inode in seen_inodes:
+                continue
+            seen_inodes.add(inode)
+            by_size.setdefault(st.st_size, []).append(path)
+
+    groups = [paths for paths in by_size.values() if len(paths) > 1]
+    yield {"type": "stage", "stage": "size", "candidates": sum(map(len, groups))}
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        groups = _regroup(executor, groups, partial_hash)
+        yield {
+            "type": "stage",
+            "stage": "partial hash",
+            "candidates": sum(map(len, groups)),
+        }
+
+        # Files no bigger than the partial hash window are already fully hashed
+        small = [g for g in groups if _size(g[0]) <= 2 * PARTIAL_HASH_SIZE]
+        large = [g for g in groups if _size(g[0]) > 2 * PARTIAL_HASH_SIZE]
+        groups = small + _regroup(executor, large, full_hash)
+        yield {
+            "type": "stage",
+            "stage": "full hash",
+            "candidates": sum(map(len, groups)),
+        }
+
+    duplicates = []
+    for group in groups:
+        stats = {}
+        for path in group:
+            try:
+                stats[path] = os.stat(path)
+            except OSError:
+                continue
+        if len(stats) > 1:
+            duplicates.append(stats)
+
+    reclaimable = 0
+    for stats in sorted(duplicates, key=lambda s: -next(iter(s.values())).st_size):
+        size = allocated_size(next(iter(stats.values())))
+        # One copy is kept, preferably one whose data stays linked elsewhere
+        freed = sum(1 for st in stats.values() if st.st_nlink == 1)
+        freed = size * min(freed, len(stats) - 1)
+        reclaimable += freed
+        yield {
+            "type": "duplicate",
+            "size": size,
+            "paths": sorted(stats),
+            "reclaimable": freed,
+        }
+    yield {"type": "done", "groups": len(duplicates), "reclaimable": reclaimable}
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _links(path):
+    try:
+        return os.stat(path).st_nlink
+    except OSError:
+        return 0
+
+
+def hardlink_duplicates(paths, keep):
+    """Replace every path but keep with a hardlink to keep
+
+    Each replacement is atomic (link to a temporary name, then rename over
+    the duplicate), so a failure never leaves a path missing. Returns
+    (linked count, error messages).
+    """
+    keep_stat = os.stat(keep)
+    linked = 0
+    errors = []
+    for path in paths:
+        if path == keep:
+            continue
+        tmp_path = f"{path}.dedupe-tmp"
+        try:
+            if os.stat(path).st_dev != keep_stat.st_dev:
+                raise OSError(f"{path} is on another filesystem than {keep}")
+            os.link(keep, tmp_path)
+            os.replace(tmp_path, path)
+            linked += 1
+        except OSError as e:
+            errors.append(f"Could not hardlink {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    return linked, errors
+
+
+def main():
+    completed_folder = os.getenv("COMPLETED_FOLDER")
+    if not completed_folder or not os.path.isdir(completed_folder):
+        print(f"❌ Completed folder not found: {completed_folder}")
+        return False
+
+    # Tell torrent data apart from orphans, if qBittorrent can be reached
+    index = None
+    try:
+        torrents = get_torrents(TORRENT_FIELDS)
+        index, warning = build_content_index(torrents, completed_folder)
+        if warning:
+            print(f"Warning: {warning}")
+    except QBittorrentError as e:
+        print(f"Warning: {e}, duplicates won't be marked as torrent data")
+
+    groups = []
+    for event in iter_duplicates([completed_folder]):
+        if event["type"] == "stage":
+            print(
+                f"🔎 After comparing {event['stage']}: {event['candidates']} candidates"
+            )
+        elif event["type"] == "duplicate":
+            groups.append(event)
+        elif event["type"] == "done":
+            print(
+                f"\n📑 {event['groups']} groups of duplicates, "
+                f"{format_bytes(event['reclaimable'])} reclaimable"
+            )
+
+    for group in groups:
+        print(f"\n  {format_bytes(group['size'])} × {len(group['paths'])}:")
+        for path in group["paths"]:
+            owned = index is not None and index.classify(path) == OWNED
+            print(f"    {'🌱 torrent' if owned else '🗑️  orphan '} {path}")
+
+    if not groups or "--hardlink" not in sys.argv[1:]:
+        return True
+
+    answer = input(
+        f"\nReplace duplicates with hardlinks to one copy each? (y/n): "
+    ).lower()
+    if answer.strip() not in ["y", "yes"]:
+        print("❌ Operation cancelled by user")
+        return False
+
+    total_linked = 0
+    for group in groups:
+        # Keep a copy qBittorrent seeds from, so its data is never replaced
+        owned = [
+            p
+            for p in group["paths"]
+            if index is not None and index.classify(p) == OWNED
+        ]
+        # Otherwise keep one linked elsewhere, replacing it would free nothing
+        linked = [p for p in group["paths"] if _links(p) > 1]
+        keep = (owned or linked or group["paths"])[0]
+        linked, errors = hardlink_duplicates(group["paths"], keep)
+        total_linked += linked
+        for message in errors:
+            print(f"❌ {message}")
+    print(f"✅ Replaced {total_linked} duplicates with hardlinks")
+    return True
+
+
+if __name__ == "__main__":
+    main()
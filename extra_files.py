@@ -0,0 +1,294 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from qb_client import QBittorrentError, get_client, state_path
+from torrent_store import get_torrents
+from orphan_scan import (
+    PROTECTED_CATEGORIES,
+    SCAN_WORKERS,
+    fetch_torrent_files,
+    map_qb_path,
+    normalize_path,
+    scan_orphans,
+    torrent_content_path,
+)
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Also look for stray files inside the folders of live torrents
+DEEP_SCAN = os.getenv("DEEP_SCAN", "0") == "1"
+
+# Torrent fields the deep scan reads
+TORRENT_FIELDS = ("content_path", "save_path", "name", "size", "progress")
+
+# /torrents/files requests sent to qBittorrent in parallel
+FILES_WORKERS = int(os.getenv("FILES_WORKERS", "8"))
+
+# Cache of each torrent's file list, so unchanged torrents aren't asked again
+TORRENT_FILES_CACHE = state_path(
+    os.getenv("TORRENT_FILES_CACHE", ".torrent_files_cache.json")
+)
+
+# Extension qBittorrent gives files that are still downloading
+INCOMPLETE_EXT = ".!qB"
+
+# Folder older qBittorrent versions keep skipped ("do not download") files in
+UNWANTED_DIR = ".unwanted"
+
+
+def load_files_cache(path=None):
+    """Load the {torrent hash: {"key": ..., "files": [[path, size, priority]]}} cache"""
+    path = path or TORRENT_FILES_CACHE
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable torrent files cache {path}: {e}")
+        return {}
+
+
+def save_files_cache(cache, path=None):
+    """Atomically write the torrent files cache"""
+    path = path or TORRENT_FILES_CACHE
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+def files_cache_key(torrent):
+    """What must stay the same for a cached file list to still be valid
+
+    Renaming files inside a torrent changes neither, which is why extra
+    files found with a cached list are double-checked with a fresh one.
+    """
+    return f"{torrent_content_path(torrent)}|{torrent.get('size')}"
+
+
+def get_torrent_files(client, torrents, cache, refresh=False, workers=None):
+    """{hash: fetch_torrent_files()} for torrents, asking qBittorrent only when needed
+
+    Torrents missing from cache (or all of them with refresh) are fetched
+    concurrently with up to workers requests (FILES_WORKERS by default).
+    cache is updated in place. Returns (files, fetched hashes).
+    """
+    workers = FILES_WORKERS if workers is None else workers
+    files = {}
+    missing = []
+    for torrent in torrents:
+        entry = cache.get(torrent["hash"])
+        if (
+            not refresh
+            and entry
+            and entry.get("key") == files_cache_key(torrent)
+            and all(isinstance(f, list) for f in entry["files"])
+        ):
+            files[torrent["hash"]] = entry["files"]
+        else:
+            missing.append(torrent)
+
+    def fetch(torrent):
+        return torrent, fetch_torrent_files(client, torrent)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for torrent, names in executor.map(fetch, missing):
+            files[torrent["hash"]] = names
+            cache[torrent["hash"]] = {"key": files_cache_key(torrent), "files": names}
+
+    return files, {torrent["hash"] for torrent in missing}
+
+
+def expected_paths(torrents, files):
+    """(files, folders) every torrent is expected to have on disk
+
+    Paths are local (after QB_PATH_MAP) and normalized. Folders are all
+    ancestors of expected files, so they can be descended into. Torrents
+    without a file list in files are expected to be their content path.
+    """
+    expected = set()
+    folders = set()
+    for torrent in torrents:
+        save_path = map_qb_path(torrent.get("save_path") or "")
+        incomplete = torrent.get("progress", 1) < 1
+        if torrent["hash"] in files:
+            paths = [
+                os.path.join(save_path, name) for name, _, _ in files[torrent["hash"]]
+            ]
+        else:
+            content_path = torrent_content_path(torrent)
+            paths = [map_qb_path(content_path)] if content_path else []
+        for path in paths:
+            path = normalize_path(path)
+            expected.add(path)
+            if incomplete:
+                expected.add(path + normalize_path(INCOMPLETE_EXT))
+            folder = os.path.dirname(path)
+            while folder and folder not in folders:
+                folders.add(folder)
+                parent = os.path.dirname(folder)
+                if parent == folder:
+                    break
+                folder = parent
+    return expected, folders
+
+
+def find_extra_files(content_dir, expected, folders):
+    """Walk a torrent's content folder and return what no torrent expects
+
+    Folders holding no expected file at all are reported as a whole
+    instead of file by file. Files inside .unwanted folders are left alone.
+    """
+    extras = []
+    pending = [content_dir]
+    while pending:
+        folder = pending.pop()
+        try:
+            with os.scandir(folder) as it:
+                entries = [(entry.path, entry.is_dir()) for entry in it]
+        except OSError:
+            continue
+        for path, is_dir in entries:
+            normalized = normalize_path(path)
+            if os.path.basename(normalized) == UNWANTED_DIR:
+                continue
+            if is_dir and normalized in folders:
+                pending.append(path)
+            elif normalized not in expected:
+                extras.append(path)
+    return extras
+
+
+def content_dirs(torrents, completed_folder):
+    """{hash: local content folder} for multi-file torrents under completed_folder"""
+    root = os.path.join(normalize_path(os.path.abspath(completed_folder)), "")
+    dirs = {}
+    for torrent in torrents:
+        path = torrent_content_path(torrent)
+        if not path:
+            continue
+        path = map_qb_path(path)
+        if normalize_path(os.path.abspath(path)).startswith(root) and os.path.isdir(
+            path
+        ):
+            dirs[torrent["hash"]] = path
+    return dirs
+
+
+def iter_extra_files(client, torrents, completed_folder, workers=None):
+    """Find stray files inside the folders of torrents qBittorrent still has
+
+    Leftover samples, old versions and .!qB files of finished downloads are
+    never reported by the orphan scan because their top-level folder is
+    torrent content. File lists come from /torrents/files (cached in
+    TORRENT_FILES_CACHE) and every content folder is diffed against them
+    in one walk, up to workers folders at a time (SCAN_WORKERS by default).
+    Events:
+
+    - {"type": "deep", "torrents": n, "fetched": n}: file lists ready
+    - {"type": "extra", "path": path, "hash": hash, "torrent": name}
+    - {"type": "warning", "message": text}
+    """
+    workers = SCAN_WORKERS if workers is None else workers
+    dirs = content_dirs(torrents, completed_folder)
+    by_hash = {torrent["hash"]: torrent for torrent in torrents}
+    cache = load_files_cache()
+    lock = threading.Lock()
+
+    try:
+        # Single-file torrents need no file list, their content path is it
+        files, fetched = get_torrent_files(
+            client, [by_hash[torrent_hash] for torrent_hash in dirs], cache
+        )
+    except QBittorrentError as e:
+        yield {"type": "warning", "message": f"Skipping extra file check: {e}"}
+        return
+    yield {"type": "deep", "torrents": len(dirs), "fetched": len(fetched)}
+
+    def scan(hashes):
+        expected, folders = expected_paths(torrents, files)
+        found = {}
+
+        def walk(torrent_hash):
+            extras = find_extra_files(dirs[torrent_hash], expected, folders)
+            with lock:
+                found[torrent_hash] = extras
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            list(executor.map(walk, hashes))
+        return found
+
+    found = scan(dirs)
+
+    # A cached list may predate files being renamed inside the torrent
+    stale = [by_hash[h] for h, extras in found.items() if extras and h not in fetched]
+    if stale:
+        try:
+            fresh, _ = get_torrent_files(client, stale, cache, refresh=True)
+        except QBittorrentError as e:
+            yield {"type": "warning", "message": f"Skipping extra file check: {e}"}
+            return
+        files.update(fresh)
+        found.update(scan([torrent["hash"] for torrent in stale]))
+
+    try:
+        save_files_cache(cache)
+    except OSError as e:
+        yield {
+            "type": "warning",
+            "message": f"Could not save {TORRENT_FILES_CACHE}: {e}",
+        }
+
+    for torrent_hash, extras in found.items():
+        for path in sorted(extras):
+            yield {
+                "type": "extra",
+                "path": path,
+                "hash": torrent_hash,
+                "torrent": by_hash[torrent_hash].get("name", ""),
+            }
+
+
+def scan_orphans_deep(completed_folder=None, use_index=None):
+    """scan_orphans() followed by a check for extra files in live torrents
+
+    Yields the same events, with stray files inside torrent folders added
+    as orphan events carrying "extra": True (and the torrent they were found
+    in) just before the final "done" event, whose orphan_count includes them.
+    """
+    completed_folder = completed_folder or os.getenv("COMPLETED_FOLDER")
+    try:
+        # Fetched first so the orphan scan reuses the same cached listing
+        torrents = get_torrents(TORRENT_FIELDS)
+    except QBittorrentError as e:
+        yield {"type": "error", "message": str(e)}
+        return
+
+    for event in scan_orphans(completed_folder, use_index):
+        if event["type"] != "done":
+            yield event
+            continue
+
+        root = os.path.abspath(completed_folder)
+        for extra in iter_extra_files(get_client(), torrents, completed_folder):
+            if extra["type"] != "extra":
+                yield extra
+                continue
+            parts = os.path.relpath(extra["path"], root).split(os.sep)
+            category = parts[0] if len(parts) > 1 else "root"
+            name = os.path.join(*parts[1:]) if len(parts) > 1 else parts[0]
+            event["orphan_count"] += 1
+            yield {
+                "type": "orphan",
+                "name": name,
+                "category": category,
+                "protected": category in PROTECTED_CATEGORIES,
+                "extra": True,
+                "torrent": extra["torrent"],
+            }
+        yield event
@@ -0,0 +1,263 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from disk_usage import format_bytes
+from qb_client import state_path
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Where the filesystem index is stored
+FS_INDEX_DB = state_path(os.getenv("FS_INDEX_DB", ".fs_index.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    inode INTEGER NOT NULL,
+    dev INTEGER NOT NULL,
+    -- for directories: mtime at which the listing below was last taken
+    listed_mtime REAL
+);
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+"""
+
+
+# Columns written by refresh(), older databases may have more
+COLUMNS = "path, parent, name, is_dir, size, mtime, inode, dev"
+ROW = ", ".join("?" * len(COLUMNS.split(", ")))
+
+
+def subtree_bounds(path):
+    """(low, high) such that low <= p < high for every path p below path"""
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class FsIndex:
+    """Persistent SQLite index of a directory tree
+
+    Stores path, size, mtime and inode of every entry. The database is
+    shared by every indexed root, so nested roots reuse the same rows and
+    categories are worked out per root when queried. Symlinks are followed
+    like orphan_scan.list_directory() does. refresh() only re-lists directories
+    whose mtime changed since they were last listed; unchanged directories
+    are descended into from the index, costing one stat each. Changes to
+    the size of a file inside an unchanged directory are therefore only
+    picked up by refresh(full=True).
+    """
+
+    def __init__(self, root, db_path=None):
+        self.root = os.path.abspath(root)
+        self.db_path = FS_INDEX_DB if db_path is None else db_path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _row(self, path, parent, st, is_dir):
+        return (
+            path,
+            parent,
+            os.path.basename(path),
+            int(is_dir),
+            0 if is_dir else st.st_size,
+            st.st_mtime,
+            st.st_ino,
+            st.st_dev,
+        )
+
+    def _delete_subtree(self, path):
+        low, high = subtree_bounds(path)
+        self.db.execute(
+            "DELETE FROM entries WHERE path = ? OR (path >= ? AND path < ?)",
+            (path, low, high),
+        )
+
+    def refresh(self, full=False):
+        """Bring the index up to date with the disk
+
+        Returns a stats dict: directories checked, directories re-listed,
+        entries written and entries removed, plus elapsed seconds.
+        """
+        start = time.perf_counter()
+        stats = {"checked": 0, "listed": 0, "updated": 0, "removed": 0}
+
+        with self._lock, self.db:
+            root_stat = os.stat(self.root)
+            self.db.execute(
+                f"INSERT OR IGNORE INTO entries ({COLUMNS}) VALUES ({ROW})",
+                self._row(self.root, None, root_stat, True),
+            )
+            pending = [(self.root, root_stat)]
+
+            def visit(path, st):
+                # Don't follow a symlink back up the tree it is in
+                if os.path.islink(path):
+                    target = os.path.realpath(path)
+                    parent = os.path.realpath(os.path.dirname(path))
+                    if parent == target or parent.startswith(target + os.sep):
+                        return
+                pending.append((path, st))
+
+            while pending:
+                folder, folder_stat = pending.pop()
+                stats["checked"] += 1
+                listed_mtime = self.db.execute(
+                    "SELECT listed_mtime FROM entries WHERE path = ?", (folder,)
+                ).fetchone()
+
+                if (
+                    not full
+                    and listed_mtime
+                    and listed_mtime[0] == folder_stat.st_mtime
+                ):
+                    # Unchanged listing: only revisit the subdirectories
+                    for (child,) in self.db.execute(
+                        "SELECT path FROM entries WHERE parent = ? AND is_dir = 1",
+                        (folder,),
+                    ).fetchall():
+                        try:
+                            visit(child, os.stat(child))
+                        except OSError:
+                            self._delete_subtree(child)
+                            stats["removed"] += 1
+                    continue
+
+                stats["listed"] += 1
+                rows = []
+                try:
+                    with os.scandir(folder) as it:
+                        for entry in it:
+                            try:
+                                is_dir = entry.is_dir()
+                                st = entry.stat()
+                            except FileNotFoundError:
+                                # Dangling symlink, listed as a file
+                                st = entry.stat(follow_symlinks=False)
+                            except OSError:
+                                continue
+                            rows.append(self._row(entry.path, folder, st, is_dir))
+                            if is_dir:
+                                visit(entry.path, st)
+                except OSError:
+                    continue
+
+                current = {row[0] for row in rows}
+                for (child,) in self.db.execute(
+                    "SELECT path FROM entries WHERE parent = ?", (folder,)
+                ).fetchall():
+                    if child not in current:
+                        self._delete_subtree(child)
+                        stats["removed"] += 1
+
+                # Keep listed_mtime of subdirectories so they can be skipped
+                self.db.executemany(
+                    f"""
+                    INSERT INTO entries ({COLUMNS}) VALUES ({ROW})
+                    ON CONFLICT (path) DO UPDATE SET
+                        parent = excluded.parent, name = excluded.name,
+                        is_dir = excluded.is_dir, size = excluded.size,
+                        mtime = excluded.mtime, inode = excluded.inode,
+                        dev = excluded.dev,
+                        listed_mtime = CASE WHEN entries.is_dir = excluded.is_dir
+                            THEN entries.listed_mtime END
+                    """,
+                    rows,
+                )
+                stats["updated"] += len(rows)
+                self.db.execute(
+                    "UPDATE entries SET listed_mtime = ?, mtime = ? WHERE path = ?",
+                    (folder_stat.st_mtime, folder_stat.st_mtime, folder),
+                )
+
+        stats["seconds"] = time.perf_counter() - start
+        return stats
+
+    def list_directory(self, path):
+        """Drop-in for orphan_scan.list_directory() answered from the index"""
+        start = time.perf_counter()
+        path = os.path.abspath(path)
+        with self._lock:
+            if not self.db.execute(
+                "SELECT 1 FROM entries WHERE path = ? AND is_dir = 1", (path,)
+            ).fetchone():
+                raise FileNotFoundError(f"Not in the index: {path}")
+            entries = self.db.execute(
+                "SELECT name, is_dir FROM entries WHERE parent = ?", (path,)
+            ).fetchall()
+        return [(name, bool(is_dir)) for name, is_dir in entries], (
+            time.perf_counter() - start
+        )
+
+    def category_totals(self):
+        """{category: bytes on disk} under root from the index, without touching the disk"""
+        # The category is the first path component below this root, the same
+        # rows may belong to a nested root with categories of its own
+        low, high = subtree_bounds(self.root)
+        with self._lock:
+            rows = self.db.execute(
+                """
+                SELECT category, SUM(size) FROM (
+                    SELECT size, CASE WHEN instr(relative, ?) > 0
+                        THEN substr(relative, 1, instr(relative, ?) - 1)
+                        ELSE 'root' END AS category
+                    FROM (
+                        SELECT size, substr(path, ?) AS relative FROM entries
+                        WHERE is_dir = 0 AND path >= ? AND path < ?
+                    )
+                )
+                GROUP BY category ORDER BY SUM(size) DESC
+                """,
+                (os.sep, os.sep, len(low) + 1, low, high),
+            ).fetchall()
+        return dict(rows)
+
+    def subtree_size(self, path):
+        """Total size of the files at or below path, from the index"""
+        path = os.path.abspath(path)
+        low, high = subtree_bounds(path)
+        with self._lock:
+            (total,) = self.db.execute(
+                """
+                SELECT COALESCE(SUM(size), 0) FROM entries
+                WHERE is_dir = 0 AND (path = ? OR (path >= ? AND path < ?))
+                """,
+                (path, low, high),
+            ).fetchone()
+        return total
+
+
+def main():
+    completed_folder = os.getenv("COMPLETED_FOLDER")
+    if not completed_folder:
+        print("❌ COMPLETED_FOLDER environment variable is required")
+        return False
+
+    index = FsIndex(completed_folder)
+    try:
+        stats = index.refresh(full="--full" in sys.argv[1:])
+        print(
+            f"✅ Index updated in {stats['seconds']:.2f}s: "
+            f"{stats['checked']} folders checked, {stats['listed']} re-listed, "
+            f"{stats['updated']} entries written, {stats['removed']} removed"
+        )
+        print(f"\n💾 On-disk usage by category:")
+        for category, total in index.category_totals().items():
+            print(f"   {category}: {format_bytes(total)}")
+    finally:
+        index.close()
+    return True
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,50 @@
 import os
-import requests
+import heapq
+from itertools import count, islice
 from datetime import datetime
 from dotenv import load_dotenv
+from qb_client import get_client, QBittorrentError
+from torrent_store import get_torrents
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Settings
 qb_url = os.getenv("QB_URL")
-qb_user = os.getenv("QB_USER", "admin")
-qb_pass = os.getenv("QB_PASS", "admin")
+
+# Torrent fields the report reads
+TORRENT_FIELDS = (
+    "name",
+    "state",
+    "category",
+    "size",
+    "downloaded",
+    "uploaded",
+    "progress",
+    "ratio",
+    "upspeed",
+    "dlspeed",
+)
+
+# Entries shown in each "top torrents" list of the report
+REPORT_TOP_N = int(os.getenv("REPORT_TOP_N", "10"))
 
 
 def generate_html_report():
     """Generate a comprehensive HTML report of qBittorrent status with graphs"""
     try:
-        # Login to qBittorrent Web API
-        s = requests.Session()
-        login_response = s.post(
-            f"{qb_url}/api/v2/auth/login",
-            data={"username": qb_user, "password": qb_pass},
-        )
-
-        if login_response.status_code != 200:
-            print(f"❌ Failed to login to qBittorrent: {login_response.status_code}")
-            return False, None
+        try:
+            client = get_client()
 
-        # Get server info
-        server_info = s.get(f"{qb_url}/api/v2/app/version").text.strip('"')
+            # Get server info
+            server_info = client.app_version()
 
-        # Get torrents info
-        torrents_response = s.get(f"{qb_url}/api/v2/torrents/info")
-        if torrents_response.status_code != 200:
-            print(
-                f"❌ Failed to get torrents from qBittorrent: {torrents_response.status_code}"
-            )
+            # Get torrents info
+            torrents = get_torrents(TORRENT_FIELDS)
+        except QBittorrentError as e:
+            print(f"❌ {e}")
             return False, None
 
-        torrents = torrents_response.json()
-
         # Generate statistics
         stats = calculate_statistics(torrents)
 
@@ -61,50 +67,172 @@ def generate_html_report():
         return False, None
 
 
-def calculate_statistics(torrents):
-    """Calculate statistics from torrents data"""
-    stats = {}
-
-    # Basic counts
-    stats["total_torrents"] = len(torrents)
-    stats["downloading"] = len(
-        [t for t in torrents if t["state"] in ["downloading", "queuedDL", "stalledDL"]]
-    )
-    stats["seeding"] = len(
-        [t for t in torrents if t["state"] in ["uploading", "queuedUP", "stalledUP"]]
-    )
-    stats["completed"] = len([t for t in torrents if t["state"] == "uploading"])
-    stats["paused"] = len([t for t in torrents if "paused" in t["state"]])
-    stats["error"] = len([t for t in torrents if "error" in t["state"]])
-
-    # Size statistics
-    stats["total_size"] = sum(t["size"] for t in torrents)
-    stats["downloaded"] = sum(t["downloaded"] for t in torrents)
-    stats["uploaded"] = sum(t["uploaded"] for t in torrents)
-    stats["ratio"] = (
-        stats["uploaded"] / stats["downloaded"] if stats["downloaded"] > 0 else 0
-    )
-
-    # Categories
-    categories = {}
-    for torrent in torrents:
-        cat = torrent.get("category", "Uncategorized") or "Uncategorized"
-        categories[cat] = categories.get(cat, 0) + 1
-    stats["categories"] = categories
+class StatisticsAggregator:
+    """Compute every report statistic in a single pass over the torrents
 
-    # States distribution
-    states = {}
-    for torrent in torrents:
+    Torrents can be fed one at a time with add() (or from any iterable or
+    generator with feed()), no per-statistic lists are built. The top-N
+    views keep a size-k heap each, O(n log k) overall.
+
+    Torrents are tracked by hash, so the statistics can follow
+    sync/maindata: add() a torrent again with its merged fields to update
+    it and remove() it by hash once it is gone. The totals are adjusted in
+    place; a top-N view or the active list that loses an entry is rebuilt
+    the next time it is read.
+    """
+
+    DOWNLOADING_STATES = {"downloading", "queuedDL", "stalledDL"}
+    SEEDING_STATES = {"uploading", "queuedUP", "stalledUP"}
+    ACTIVE_STATES = {"downloading", "uploading"}
+    ACTIVE_LIMIT = 10
+
+    # name -> function giving the value a torrent is ranked by
+    TOP_VIEWS = {
+        "largest": lambda t: t.get("size", 0),
+        "best_ratio": lambda t: t.get(
+            "ratio",
+            t.get("uploaded", 0) / t["downloaded"] if t.get("downloaded") else 0,
+        ),
+        "fastest_upload": lambda t: t.get("upspeed", 0),
+        "fastest_download": lambda t: t.get("dlspeed", 0),
+    }
+
+    def __init__(self, top_n=None):
+        self.top_n = REPORT_TOP_N if top_n is None else top_n
+        self.total_torrents = 0
+        self.downloading = 0
+        self.seeding = 0
+        self.total_size = 0
+        self.downloaded = 0
+        self.uploaded = 0
+        self.categories = {}
+        self.states = {}
+        self._active = []
+        self._heaps = {name: [] for name in self.TOP_VIEWS}
+        # Tie-breaker so heapq never compares torrent dicts
+        self._sequence = count()
+        # hash -> (sequence, torrent), in the order torrents were added
+        self._rows = {}
+        # Views (and "active") that lost an entry and need a rebuild
+        self._stale = set()
+
+    @staticmethod
+    def _bump(counts, key, delta):
+        counts[key] = counts.get(key, 0) + delta
+        if not counts[key]:
+            del counts[key]
+
+    def _count(self, torrent, sign):
         state = torrent["state"]
-        states[state] = states.get(state, 0) + 1
-    stats["states"] = states
+        self.total_torrents += sign
+        self._bump(self.states, state, sign)
+        if state in self.DOWNLOADING_STATES:
+            self.downloading += sign
+        elif state in self.SEEDING_STATES:
+            self.seeding += sign
+
+        self.total_size += sign * torrent["size"]
+        self.downloaded += sign * torrent["downloaded"]
+        self.uploaded += sign * torrent["uploaded"]
+
+        cat = torrent.get("category", "Uncategorized") or "Uncategorized"
+        self._bump(self.categories, cat, sign)
+
+    def add(self, torrent):
+        """Count a torrent, replacing the earlier version with the same hash"""
+        sequence = next(self._sequence)
+        torrent_hash = torrent.get("hash", sequence)
+        self.remove(torrent_hash)
+        self._rows[torrent_hash] = (sequence, torrent)
+        self._count(torrent, 1)
+
+        if (
+            "active" not in self._stale
+            and torrent["state"] in self.ACTIVE_STATES
+            and len(self._active) < self.ACTIVE_LIMIT
+        ):
+            self._active.append(torrent)
+
+        if self.top_n > 0:
+            for name, key in self.TOP_VIEWS.items():
+                if name in self._stale:
+                    continue
+                entry = (key(torrent), sequence, torrent)
+                heap = self._heaps[name]
+                if len(heap) < self.top_n:
+                    heapq.heappush(heap, entry)
+                elif entry[0] > heap[0][0]:
+                    heapq.heapreplace(heap, entry)
+
+    def remove(self, torrent_hash):
+        """Take a torrent out of every statistic"""
+        row = self._rows.pop(torrent_hash, None)
+        if row is None:
+            return
+        _, torrent = row
+        self._count(torrent, -1)
+        if any(t is torrent for t in self._active):
+            self._stale.add("active")
+        for name, heap in self._heaps.items():
+            if any(entry[2] is torrent for entry in heap):
+                self._stale.add(name)
+
+    def feed(self, torrents):
+        for torrent in torrents:
+            self.add(torrent)
+        return self
+
+    @property
+    def active_torrents(self):
+        """The first ACTIVE_LIMIT active torrents, in the order they were added"""
+        if "active" in self._stale:
+            self._stale.discard("active")
+            active = (
+                t for _, t in self._rows.values() if t["state"] in self.ACTIVE_STATES
+            )
+            self._active = list(islice(active, self.ACTIVE_LIMIT))
+        return self._active
+
+    def top(self, name):
+        """The top-N torrents for a view as (value, torrent), best first"""
+        if name in self._stale:
+            self._stale.discard(name)
+            key = self.TOP_VIEWS[name]
+            heap = heapq.nlargest(
+                self.top_n,
+                ((key(t), sequence, t) for sequence, t in self._rows.values()),
+                key=lambda e: (e[0], -e[1]),
+            )
+            heapq.heapify(heap)
+            self._heaps[name] = heap
+        ranked = sorted(self._heaps[name], key=lambda e: (-e[0], e[1]))
+        return [(value, torrent) for value, _, torrent in ranked]
+
+    def result(self):
+        states = self.states
+        stats = {
+            "total_torrents": self.total_torrents,
+            "downloading": self.downloading,
+            "seeding": self.seeding,
+            "completed": states.get("uploading", 0),
+            "paused": sum(n for state, n in states.items() if "paused" in state),
+            "error": sum(n for state, n in states.items() if "error" in state),
+            "total_size": self.total_size,
+            "downloaded": self.downloaded,
+            "uploaded": self.uploaded,
+            "ratio": self.uploaded / self.downloaded if self.downloaded > 0 else 0,
+            "categories": dict(self.categories),
+            "states": dict(states),
+            "active_torrents": list(self.active_torrents),
+        }
+        for name in self.TOP_VIEWS:
+            stats[f"top_{name}"] = self.top(name)
+        return stats
 
-    # Active torrents
-    stats["active_torrents"] = [
-        t for t in torrents if t["state"] in ["downloading", "uploading"]
-    ][:10]
 
-    return stats
+def calculate_statistics(torrents):
+    """Calculate statistics from torrents data"""
+    return StatisticsAggregator().feed(torrents).result()
 
 
 def generate_html_content(server_info, stats, torrents):
@@ -287,6 +415,8 @@ def generate_html_content(server_info, stats, torrents):
         </div>
         
         {generate_active_torrents_html(stats['active_torrents'])}
+
+        {generate_top_torrents_html(stats)}
     </div>
     
     <script>
@@ -378,6 +508,46 @@ def generate_active_torrents_html(active_torrents):
     return html
 
 
+def generate_top_torrents_html(stats):
+    """Generate HTML for the top-N torrent lists"""
+    views = [
+        ("💾 Largest Torrents", stats["top_largest"], format_bytes),
+        ("📈 Best Ratio", stats["top_best_ratio"], lambda v: f"{v:.2f}"),
+        (
+            "⬆️ Fastest Uploads",
+            stats["top_fastest_upload"],
+            lambda v: f"{format_bytes(v)}/s",
+        ),
+        (
+            "⬇️ Fastest Downloads",
+            stats["top_fastest_download"],
+            lambda v: f"{format_bytes(v)}/s",
+        ),
+    ]
+
+    html = ""
+    for title, entries, format_value in views:
+        # Idle torrents aren't worth listing under the speed views
+        entries = [(value, torrent) for value, torrent in entries if value > 0]
+        if not entries:
+            continue
+
+        html += f"""
+        <div class="active-torrents">
+            <h3>{title}</h3>
+        """
+        for value, torrent in entries:
+            html += f"""
+            <div class="torrent-item">
+                <div class="torrent-name">{torrent['name'][:60]}{'...' if len(torrent['name']) > 60 else ''}</div>
+                <div class="torrent-progress">{format_value(value)}</div>
+            </div>
+            """
+        html += "</div>"
+
+    return html
+
+
 def format_bytes(bytes_value):
     """Convert bytes to human readable format"""
     for unit in ["B", "KB", "MB", "GB", "TB"]:
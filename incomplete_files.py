@@ -0,0 +1,197 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from qb_client import QBittorrentError, get_client
+from torrent_store import get_torrents
+from extra_files import INCOMPLETE_EXT
+from scan_roots import incomplete_index, iter_root_scans, merge_roots, resolve_qb_path
+from disk_usage import (
+    SIZE_WORKERS,
+    cached_tree_usage,
+    format_bytes,
+    reclaimable_together,
+)
+from quarantine import QUARANTINE_RETENTION, orphan_source, quarantine_files
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Torrent fields the incomplete data scan reads
+TORRENT_FIELDS = ("content_path", "save_path", "name")
+
+# Fields read from the downloading torrents only
+DOWNLOAD_FIELDS = ("hash", "download_path")
+
+
+def temp_sources(client, torrents):
+    """(path as qBittorrent sees it, source) for every folder it downloads into
+
+    Sources are the global temp path (when enabled), category download
+    paths and the distinct download paths of torrents.
+    """
+    preferences = client.get("app/preferences").json()
+    temp_path = ""
+    sources = []
+    if preferences.get("temp_path_enabled") and preferences.get("temp_path"):
+        temp_path = resolve_qb_path(
+            preferences["temp_path"], preferences.get("save_path", "")
+        )
+        sources.append((temp_path, "temp path"))
+
+    for name, category in client.get("torrents/categories").json().items():
+        path = category.get("download_path")
+        # Disabled download paths come back as false or an empty string
+        if isinstance(path, str) and path:
+            sources.append((resolve_qb_path(path, temp_path), f"category {name}"))
+
+    downloads = {t.get("download_path") for t in torrents}
+    for path in sorted(p for p in downloads if isinstance(p, str) and p):
+        sources.append((path, "torrent download path"))
+    return sources
+
+
+def scan_incomplete(use_index=None):
+    """Find leftovers in the folders qBittorrent downloads into
+
+    Anything there that no torrent (downloading or not) owns is left over
+    from an aborted or removed download. Uses the multi-root scanner of
+    scan_roots.py and yields its events, preceded by "torrents" and
+    "roots" events as in scan_orphans_roots(). These folders have no
+    category layout, so an aborted multi-file download is one leftover.
+    Orphan events get "fragment": True for partial files named with
+    INCOMPLETE_EXT.
+    """
+    if not os.getenv("QB_URL"):
+        yield {"type": "error", "message": "QB_URL environment variable is required"}
+        return
+
+    try:
+        client = get_client()
+        # Only unfinished torrents download into these folders, let
+        # qBittorrent pick them out (paused and queued ones included)
+        downloading = client.torrents_info(DOWNLOAD_FIELDS, filter="downloading")
+        sources = temp_sources(client, downloading)
+        # Every torrent is indexed, in case a finished one is saved there
+        torrents = get_torrents(TORRENT_FIELDS)
+    except (QBittorrentError, ValueError) as e:
+        yield {"type": "error", "message": str(e)}
+        return
+
+    yield {
+        "type": "torrents",
+        "count": len(torrents),
+        "downloading": len(downloading),
+    }
+
+    roots, warnings = merge_roots(sources)
+    for message in warnings:
+        yield {"type": "warning", "message": message}
+    if not roots:
+        yield {
+            "type": "error",
+            "message": "qBittorrent has no separate folder for incomplete downloads",
+        }
+        return
+    yield {"type": "roots", "roots": roots}
+
+    try:
+        index = incomplete_index(torrents, roots)
+    except (QBittorrentError, ValueError) as e:
+        yield {"type": "error", "message": str(e)}
+        return
+    for event in iter_root_scans(roots, index, use_index):
+        if event["type"] == "orphan":
+            event["fragment"] = event["name"].endswith(INCOMPLETE_EXT)
+        yield event
+
+
+def measure_leftovers(leftovers):
+    """{(root, name, category): tree_usage()} for leftover orphan events"""
+
+    def measure(event):
+        entry = (event["root"], event["name"], event["category"])
+        try:
+            return entry, cached_tree_usage(orphan_source(*entry))
+        except OSError:
+            return entry, None
+
+    with ThreadPoolExecutor(max_workers=max(1, SIZE_WORKERS)) as executor:
+        return {
+            entry: usage
+            for entry, usage in executor.map(measure, leftovers)
+            if usage is not None
+        }
+
+
+def main(quarantine=None):
+    quarantine = "--quarantine" in sys.argv[1:] if quarantine is None else quarantine
+    leftovers = []
+
+    for event in scan_incomplete():
+        if event["type"] == "error" and "root" not in event:
+            print(f"❌ {event['message']}")
+            return False
+        elif event["type"] in ("error", "warning"):
+            print(f"Warning: {event['message']}")
+        elif event["type"] == "torrents":
+            print(
+                f"Found {event['count']} torrents in qBittorrent, "
+                f"{event['downloading']} still downloading"
+            )
+        elif event["type"] == "roots":
+            for root in event["roots"]:
+                print(f"📂 {root['path']} ({', '.join(root['sources'])})")
+        elif event["type"] == "orphan":
+            leftovers.append(event)
+
+    if not leftovers:
+        print("✅ No leftover incomplete data found!")
+        return True
+
+    usages = measure_leftovers(leftovers)
+    leftovers.sort(key=lambda e: (e["root"], e["category"], e["name"]))
+    print(f"\n🧩 {len(leftovers)} leftovers no torrent references:")
+    for i, event in enumerate(leftovers, 1):
+        entry = (event["root"], event["name"], event["category"])
+        path = orphan_source(*entry)
+        usage = usages.get(entry)
+        size = f" - {format_bytes(usage['reclaimable'])}" if usage else ""
+        kind = "partial file" if event["fragment"] else "leftover"
+        print(f"  {i}. {path} ({kind}){size}")
+    total = reclaimable_together(usages.values())
+    print(f"\n💾 Leftovers take up {format_bytes(total)}")
+
+    if not quarantine:
+        print("Run with --quarantine to move them aside")
+        return True
+
+    answer = input(f"\nMove {len(leftovers)} leftovers to quarantine? (y/n): ")
+    if answer.lower().strip() not in ["y", "yes"]:
+        print("❌ Operation cancelled by user")
+        return False
+
+    # Each root quarantines into its own folder, so moves stay renames
+    by_root = {}
+    for event in leftovers:
+        by_root.setdefault(event["root"], []).append((event["name"], event["category"]))
+    errors = 0
+    for root, files in by_root.items():
+        result = quarantine_files(files, root)
+        errors += result["error_count"]
+        for message in result["error_messages"]:
+            print(f"❌ {message}")
+        if result["batch"]:
+            print(
+                f"📦 Moved {result['deleted_count']} leftovers from {root} to "
+                f"quarantine batch {result['batch']}"
+            )
+    print(
+        f"⏳ Purged after {QUARANTINE_RETENTION / 86400:g} days, undo with "
+        "python quarantine.py --restore <batch>"
+    )
+    return errors == 0
+
+
+if __name__ == "__main__":
+    main()
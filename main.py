@@ -10,10 +10,11 @@ import sys
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 import webbrowser
 import shutil
 from dotenv import load_dotenv, set_key, find_dotenv
-import requests
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
@@ -21,8 +22,17 @@ from matplotlib.figure import Figure
 
 # Import our toolkit modules
 from add_popular_trackers import add_popular_trackers
-from remove_orphaned_torrents import get_orphaned_torrents_data, delete_selected_files
+from remove_orphaned_torrents import delete_selected_files
+from orphan_scan import scan_orphans
+from extra_files import DEEP_SCAN, scan_orphans_deep
 from generate_report import generate_html_report
+from torrent_store import get_torrent_table, invalidate_torrents
+from disk_usage import (
+    SIZE_WORKERS,
+    cached_tree_usage,
+    reclaimable_together,
+)
+from quarantine import DELETE_MODE, QUARANTINE_RETENTION, Purger, quarantine_folders
 
 # Environment variables will be loaded after .env file check
 
@@ -52,6 +62,10 @@ class TorrentToolkitGUI:
         self.create_modern_widgets()
         self.center_window()
 
+        # Quarantined orphans are purged in the background once they expire
+        self.purger = None
+        self.start_purger()
+
     def setup_modern_style(self):
         """Configure modern dark theme styling"""
         style = ttk.Style()
@@ -596,6 +610,9 @@ class TorrentToolkitGUI:
             # Reload environment variables to ensure they're up to date
             load_dotenv(override=True)
 
+            # Cached torrent listings may belong to the previous server
+            invalidate_torrents()
+
             self.update_config_status()
             config_window.destroy()
             messagebox.showinfo("Success", "Configuration saved successfully!")
@@ -603,6 +620,36 @@ class TorrentToolkitGUI:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save configuration: {e}")
 
+    def start_purger(self):
+        """Start purging expired quarantine batches if any folder has a quarantine"""
+        completed_folder = os.getenv("COMPLETED_FOLDER")
+        # Leftovers can be quarantined explicitly, whatever DELETE_MODE says
+        if DELETE_MODE != "quarantine" and not quarantine_folders():
+            return
+
+        def on_event(event):
+            # Called from the purger thread, hand the update to the Tk thread
+            if event["type"] == "progress":
+                message = (
+                    f"Purging quarantine... {event['files_done']}/{event['files']} "
+                    f"files, {self.format_bytes(event['bytes_done'])} freed"
+                )
+            elif event["type"] == "done" and event["files_done"]:
+                message = (
+                    f"Purged {event['batches']} quarantine batches, "
+                    f"{self.format_bytes(event['bytes_done'])} freed"
+                )
+            elif event["type"] == "partial":
+                message = (
+                    f"Kept quarantine batch {event['batch']}: "
+                    f"{event['failed']} items could not be removed"
+                )
+            else:
+                return
+            self.root.after(0, self.set_status, message)
+
+        self.purger = Purger(completed_folder, on_event).start()
+
     def set_status(self, message):
         """Update status label"""
         self.status_label.config(text=message)
@@ -652,51 +699,128 @@ class TorrentToolkitGUI:
         )
 
     def run_remove_orphaned(self):
-        """Run remove orphaned torrents tool with GUI"""
-        try:
-            # Get orphaned torrents data
-            self.set_status("Scanning for orphaned torrents...")
-            self.show_progress(True)
-
-            # Run in thread to prevent GUI freezing
-            def get_data():
-                return get_orphaned_torrents_data()
-
-            # Use threading to get data
-            import threading
-
-            result = {}
-
-            def worker():
-                result["data"] = get_data()
+        """Run remove orphaned torrents tool with GUI
 
-            thread = threading.Thread(target=worker)
-            thread.start()
-            thread.join()
+        The scan runs in a background thread and streams its events back to
+        the Tk thread, which fills the selection dialog as orphans are found.
+        Orphan sizes are computed by a separate pool and follow as "size"
+        events, so slow folders never hold up the list.
+        """
+        self.set_status("Scanning for orphaned torrents...")
+        self.remove_orphaned_btn.config(state=tk.DISABLED)
 
-            data = result["data"]
-            self.show_progress(False)
+        completed_folder = os.getenv("COMPLETED_FOLDER")
+        events = queue.Queue()
+        stop = threading.Event()
+        state = {"dialog": None, "orphans": 0}
 
-            if "error" in data:
-                messagebox.showerror("Error", data["error"])
-                self.set_status("Ready")
-                return
+        def measure(event):
+            path = self.orphan_path(completed_folder, event["name"], event["category"])
+            try:
+                usage = None if stop.is_set() else cached_tree_usage(path)
+            except OSError:
+                usage = None
+            events.put(
+                {
+                    "type": "size",
+                    "name": event["name"],
+                    "category": event["category"],
+                    "usage": usage,
+                }
+            )
 
-            if not data["orphans"]:
-                messagebox.showinfo("No Orphans", "No orphaned files found!")
+        def worker():
+            sizer = ThreadPoolExecutor(max_workers=max(1, SIZE_WORKERS))
+            sizes = []
+            scan = scan_orphans_deep if DEEP_SCAN else scan_orphans
+            try:
+                for event in scan(completed_folder):
+                    if stop.is_set():
+                        break
+                    events.put(event)
+                    if event["type"] == "orphan":
+                        sizes.append(sizer.submit(measure, event))
+            except Exception as e:
+                events.put(
+                    {
+                        "type": "error",
+                        "message": f"Failed to scan for orphaned torrents: {e}",
+                    }
+                )
+            # Keep polling until every size has been delivered, unless the
+            # dialog is gone (shutdown(cancel_futures=True) needs Python 3.9)
+            if stop.is_set():
+                for future in sizes:
+                    future.cancel()
+            sizer.shutdown(wait=True)
+            events.put(None)
+
+        def finish():
+            self.progress.config(mode="indeterminate", value=0)
+            self.remove_orphaned_btn.config(state=tk.NORMAL)
+
+        def handle(event):
+            if event["type"] == "error":
+                messagebox.showerror("Error", event["message"])
                 self.set_status("Ready")
-                return
-
-            # Show selection dialog
-            self.show_orphan_selection_dialog(data)
-
-        except Exception as e:
-            self.show_progress(False)
-            messagebox.showerror("Error", f"Failed to scan for orphaned torrents: {e}")
-            self.set_status("Ready")
+            elif event["type"] == "start":
+                self.progress.config(mode="determinate", maximum=max(event["total"], 1))
+            elif event["type"] == "progress":
+                self.progress.config(value=event["done"])
+                self.set_status(
+                    f"Scanning for orphaned torrents... "
+                    f"{event['done']}/{event['total']} "
+                    f"({state['orphans']} orphans so far)"
+                )
+            elif event["type"] == "orphan":
+                state["orphans"] += 1
+                if state["dialog"] is None:
+                    state["dialog"] = self.show_orphan_selection_dialog(
+                        completed_folder, on_close=stop.set
+                    )
+                state["dialog"](event)
+            elif event["type"] == "size":
+                if state["dialog"] is not None:
+                    state["dialog"](event)
+            elif event["type"] == "done":
+                if state["dialog"] is not None:
+                    state["dialog"](event)
+                    self.set_status("Select orphaned files to delete")
+                else:
+                    messagebox.showinfo("No Orphans", "No orphaned files found!")
+                    self.set_status("Ready")
+
+        def poll():
+            # Handle a bounded batch per tick so the window stays responsive
+            for _ in range(500):
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    finish()
+                    return
+                if not stop.is_set():
+                    handle(event)
+            self.root.after(50, poll)
 
-    def show_orphan_selection_dialog(self, data):
-        """Show modern dialog for selecting which orphaned torrents to delete"""
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(50, poll)
+
+    def orphan_path(self, completed_folder, orphan, category):
+        """Full path of an orphan reported by the scan"""
+        if category == "root":
+            return os.path.join(completed_folder, orphan)
+        return os.path.join(completed_folder, category, orphan)
+
+    def show_orphan_selection_dialog(self, completed_folder, on_close=None):
+        """Show modern dialog for selecting which orphaned torrents to delete
+
+        The dialog starts empty and returns a function that takes orphan scan
+        events: "orphan" events add a row, "size" events fill in its size and
+        the "done" event enables deletion. on_close is called if the dialog is
+        closed before the scan finished.
+        """
         dialog = tk.Toplevel(self.root)
         dialog.title("Clean Orphaned Files - TorrentToolkit")
         dialog.geometry("900x600")
@@ -782,56 +906,96 @@ class TorrentToolkitGUI:
         # Store checkbox states
         checkbox_states = {}
 
-        # Add ISO files (unchecked by default)
-        if data["iso_orphans"]:
-            iso_parent = tree.insert(
-                "",
-                "end",
-                text="📀 ISO Files (excluded by default)",
-                values=("", ""),
-                tags=("category",),
-            )
-            tree.set(iso_parent, "Category", "ISOs")
-            for orphan, category in data["iso_orphans"]:
-                file_path = os.path.join(data["completed_folder"], category, orphan)
-                size = self.get_file_size(file_path)
+        # Sizes arrive after their rows, keyed by (name, category)
+        items_by_orphan = {}
+        usages = {}
+
+        # Parent rows are created when the first orphan of their kind arrives
+        parents = {}
+        counts = {"orphans": 0, "isos": 0, "sizing": 0, "linked": 0}
+        scan_state = {"finished": False}
+
+        def get_parent(protected):
+            if protected not in parents:
+                if protected:
+                    parent = tree.insert(
+                        "",
+                        0,
+                        text="📀 ISO Files (excluded by default)",
+                        values=("", ""),
+                        tags=("category",),
+                        open=True,
+                    )
+                    tree.set(parent, "Category", "ISOs")
+                else:
+                    parent = tree.insert(
+                        "",
+                        "end",
+                        text="🗑️ Files for Deletion",
+                        values=("", ""),
+                        tags=("category",),
+                        open=True,
+                    )
+                parents[protected] = parent
+            return parents[protected]
+
+        def add_orphan(event):
+            counts["orphans"] += 1
+            if event["protected"]:
+                # ISO files are unchecked by default
+                counts["isos"] += 1
                 item_id = tree.insert(
-                    iso_parent,
+                    get_parent(True),
                     "end",
-                    text=f"☐ {orphan}",
-                    values=(category, size),
+                    text=f"☐ {event['name']}",
+                    values=(event["category"], "…"),
                     tags=("unchecked",),
                 )
                 checkbox_states[item_id] = False
-
-        # Add deletable files (checked by default)
-        if data["deletable_orphans"]:
-            deletable_parent = tree.insert(
-                "",
-                "end",
-                text="🗑️ Files for Deletion",
-                values=("", ""),
-                tags=("category",),
-            )
-            for orphan, category in data["deletable_orphans"]:
-                file_path = os.path.join(
-                    data["completed_folder"],
-                    category if category != "root" else "",
-                    orphan,
-                )
-                size = self.get_file_size(file_path)
+            else:
+                # Deletable files are checked by default
                 item_id = tree.insert(
-                    deletable_parent,
+                    get_parent(False),
                     "end",
-                    text=f"☑ {orphan}",
-                    values=(category, size),
+                    text=f"☑ {event['name']}",
+                    values=(event["category"], "…"),
                     tags=("checked",),
                 )
                 checkbox_states[item_id] = True
+            items_by_orphan[(event["name"], event["category"])] = item_id
+            counts["sizing"] += 1
+            update_summary()
+
+        def set_size(event):
+            item_id = items_by_orphan.get((event["name"], event["category"]))
+            if item_id is None:
+                return
+            counts["sizing"] -= 1
+            usage = event["usage"]
+            if usage is None:
+                tree.set(item_id, "Size", "Unknown")
+                update_summary()
+                return
 
-        # Expand all
-        for item in tree.get_children():
-            tree.item(item, open=True)
+            usages[item_id] = usage
+            if not usage["shared"]:
+                tree.set(item_id, "Size", self.format_bytes(usage["reclaimable"]))
+            else:
+                # Hardlinked elsewhere: show what deleting it would free
+                tree.set(
+                    item_id,
+                    "Size",
+                    f"🔗 {self.format_bytes(usage['reclaimable'])} of "
+                    f"{self.format_bytes(usage['allocated'])}",
+                )
+                if usage["reclaimable"] * 100 < usage["allocated"]:
+                    # Deleting it would free (next to) nothing, skip by default
+                    counts["linked"] += 1
+                    if checkbox_states[item_id]:
+                        checkbox_states[item_id] = False
+                        text = tree.item(item_id, "text").replace("☑", "☐")
+                        tree.item(item_id, text=text, tags=("unchecked",))
+            update_summary()
 
         # Configure tags
         tree.tag_configure("category", background="#e8f4fd")
@@ -854,6 +1018,7 @@ class TorrentToolkitGUI:
                     # Uncheck the box
                     new_text = current_text.replace("☑", "☐")
                     tree.item(item, text=new_text, tags=("unchecked",))
+                update_summary()
 
         tree.bind("<Double-1>", toggle_checkbox)
         tree.bind("<Return>", toggle_checkbox)
@@ -867,6 +1032,7 @@ class TorrentToolkitGUI:
                     current_text = tree.item(item_id, "text")
                     new_text = current_text.replace("☐", "☑")
                     tree.item(item_id, text=new_text, tags=("checked",))
+            update_summary()
 
         def deselect_all():
             for item_id in checkbox_states:
@@ -875,6 +1041,7 @@ class TorrentToolkitGUI:
                     current_text = tree.item(item_id, "text")
                     new_text = current_text.replace("☑", "☐")
                     tree.item(item_id, text=new_text, tags=("unchecked",))
+            update_summary()
 
         # Modern buttons frame
         button_frame = ttk.Frame(main_frame, style="Modern.TFrame")
@@ -918,28 +1085,42 @@ class TorrentToolkitGUI:
                 return
 
             # Confirm deletion
-            result = messagebox.askyesno(
-                "Confirm Deletion",
-                f"Are you sure you want to permanently delete {len(selected_files)} selected files?\n\n"
-                f"This action cannot be undone!",
-                icon="warning",
-            )
+            if DELETE_MODE == "quarantine":
+                result = messagebox.askyesno(
+                    "Confirm Quarantine",
+                    f"Move {len(selected_files)} selected files to quarantine?\n\n"
+                    f"They can be restored for {QUARANTINE_RETENTION / 86400:g} "
+                    f"days before they are purged.",
+                )
+            else:
+                result = messagebox.askyesno(
+                    "Confirm Deletion",
+                    f"Are you sure you want to permanently delete {len(selected_files)} selected files?\n\n"
+                    f"This action cannot be undone!",
+                    icon="warning",
+                )
 
             if result:
                 dialog.destroy()
-                self.perform_deletion(selected_files, data["completed_folder"])
+                self.perform_deletion(selected_files, completed_folder)
 
         def cancel():
+            if not scan_state["finished"] and on_close:
+                on_close()
             dialog.destroy()
             self.set_status("Ready")
 
+        dialog.protocol("WM_DELETE_WINDOW", cancel)
+
         # Modern action buttons
-        ttk.Button(
+        delete_btn = ttk.Button(
             action_frame,
             text="🗑️ Delete Selected",
             command=delete_selected,
             style="Warning.TButton",
-        ).pack(side=tk.LEFT, padx=(0, 15))
+            state=tk.DISABLED,
+        )
+        delete_btn.pack(side=tk.LEFT, padx=(0, 15))
 
         ttk.Button(
             action_frame, text="✖️ Cancel", command=cancel, style="Secondary.TButton"
@@ -949,45 +1130,47 @@ class TorrentToolkitGUI:
         summary_frame = ttk.Frame(main_frame, style="Modern.TFrame")
         summary_frame.grid(row=4, column=0, pady=(20, 0))
 
-        summary_text = f"📁 Found {len(data['orphans'])} orphaned files"
-        if data["iso_orphans"]:
-            summary_text += f" • {len(data['iso_orphans'])} ISOs excluded by default"
+        summary_label = ttk.Label(summary_frame, text="", style="Footer.TLabel")
+        summary_label.grid(row=0, column=0)
+
+        def update_summary():
+            summary_text = f"📁 Found {counts['orphans']} orphaned files"
+            if counts["isos"]:
+                summary_text += f" • {counts['isos']} ISOs excluded by default"
+            if counts["linked"]:
+                summary_text += (
+                    f" • 🔗 {counts['linked']} still hardlinked elsewhere, "
+                    f"unchecked"
+                )
+            # Files hardlinked between selected orphans are only freed once
+            reclaim = reclaimable_together(
+                usage for item_id, usage in usages.items() if checkbox_states[item_id]
+            )
+            summary_text += f" • 💾 {self.format_bytes(reclaim)} to reclaim"
+            if counts["sizing"]:
+                summary_text += f" ({counts['sizing']} still being measured)"
+            if not scan_state["finished"]:
+                summary_text += " • still scanning..."
+            summary_label.config(text=summary_text)
+
+        def handle_event(event):
+            if not dialog.winfo_exists():
+                return
+            if event["type"] == "orphan":
+                add_orphan(event)
+            elif event["type"] == "size":
+                set_size(event)
+            elif event["type"] == "done":
+                scan_state["finished"] = True
+                delete_btn.config(state=tk.NORMAL)
+                update_summary()
 
-        ttk.Label(summary_frame, text=summary_text, style="Footer.TLabel").grid(
-            row=0, column=0
-        )
+        return handle_event
 
     def open_github(self):
         """Open the GitHub repository in the default browser"""
         webbrowser.open("https://github.com/Owen-3456/TorrentToolkit")
 
-    def get_file_size(self, file_path):
-        """Get human-readable file size"""
-        try:
-            if os.path.exists(file_path):
-                size = os.path.getsize(file_path) if os.path.isfile(file_path) else 0
-                # For directories, get total size
-                if os.path.isdir(file_path):
-                    total_size = 0
-                    for dirpath, dirnames, filenames in os.walk(file_path):
-                        for filename in filenames:
-                            filepath = os.path.join(dirpath, filename)
-                            try:
-                                total_size += os.path.getsize(filepath)
-                            except:
-                                continue
-                    size = total_size
-
-                # Convert to human readable
-                for unit in ["B", "KB", "MB", "GB", "TB"]:
-                    if size < 1024.0:
-                        return f"{size:.1f} {unit}"
-                    size /= 1024.0
-                return f"{size:.1f} PB"
-            return "Unknown"
-        except:
-            return "Unknown"
-
     def perform_deletion(self, selected_files, completed_folder):
         """Perform the actual deletion of selected files"""
         self.set_status("Deleting selected files...")
@@ -1009,11 +1192,18 @@ class TorrentToolkitGUI:
         self.show_progress(False)
         deletion_result = result["data"]
 
+        # Anything cached from before the deletion is now stale
+        invalidate_torrents()
+
         # Show results
-        message = f"Deletion completed!\n\n"
-        message += (
-            f"✅ Successfully deleted: {deletion_result['deleted_count']} files\n"
-        )
+        if deletion_result.get("batch"):
+            message = f"Moved to quarantine ({deletion_result['batch']})\n\n"
+            message += f"✅ Successfully quarantined: {deletion_result['deleted_count']} files\n"
+        else:
+            message = f"Deletion completed!\n\n"
+            message += (
+                f"✅ Successfully deleted: {deletion_result['deleted_count']} files\n"
+            )
 
         if deletion_result["error_count"] > 0:
             message += f"❌ Errors: {deletion_result['error_count']} files\n\n"
@@ -1049,53 +1239,23 @@ class TorrentToolkitGUI:
         )
 
     def get_torrent_data(self):
-        """Get torrent data from qBittorrent for analysis"""
-        qb_url = os.getenv("QB_URL")
-        qb_user = os.getenv("QB_USER", "admin")
-        qb_pass = os.getenv("QB_PASS", "admin")
-
-        if not qb_url:
+        """Get a TorrentTable of qBittorrent's torrents for analysis"""
+        if not os.getenv("QB_URL"):
             return None
 
         try:
-            # Login to qBittorrent Web API
-            session = requests.Session()
-            login_response = session.post(
-                f"{qb_url}/api/v2/auth/login",
-                data={"username": qb_user, "password": qb_pass},
-            )
-
-            if login_response.status_code != 200:
-                return None
-
-            # Get list of torrents from qBittorrent
-            torrents_response = session.get(f"{qb_url}/api/v2/torrents/info")
-            if torrents_response.status_code != 200:
-                return None
-
-            return torrents_response.json()
+            # Shared store, only the changes since the last refresh are fetched
+            return get_torrent_table(("category", "size"))
 
         except Exception as e:
             print(f"Error getting torrent data: {e}")
             return None
 
-    def calculate_storage_by_category(self, torrents):
+    def calculate_storage_by_category(self, table):
         """Calculate storage usage by category"""
-        storage_by_category = {}
-
-        for torrent in torrents:
-            category = torrent.get("category", "Uncategorized")
-            if not category:
-                category = "Uncategorized"
-
-            size = torrent.get("size", 0)
-
-            if category in storage_by_category:
-                storage_by_category[category] += size
-            else:
-                storage_by_category[category] = size
-
-        return storage_by_category
+        # Categories whose torrents were all removed keep a row of zeros
+        storage = table.group_sum("size", by="category")
+        return {category: size for category, size in storage.items() if size}
 
     def format_bytes(self, bytes_value):
         """Convert bytes to human readable format"""
@@ -1112,10 +1272,10 @@ class TorrentToolkitGUI:
         self.show_progress(True)
 
         def get_data_and_show_chart():
-            torrents = self.get_torrent_data()
+            table = self.get_torrent_data()
             self.show_progress(False)
 
-            if not torrents:
+            if not table:
                 self.set_status("Ready")
                 messagebox.showerror(
                     "Error",
@@ -1123,7 +1283,7 @@ class TorrentToolkitGUI:
                 )
                 return
 
-            storage_by_category = self.calculate_storage_by_category(torrents)
+            storage_by_category = self.calculate_storage_by_category(table)
 
             if not storage_by_category:
                 self.set_status("Ready")
@@ -0,0 +1,478 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from qb_client import QBittorrentError, get_client
+from torrent_store import get_torrents
+from fs_index import FsIndex
+from quarantine import quarantine_root
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Torrent fields the orphan scan reads
+TORRENT_FIELDS = ("content_path", "save_path", "name")
+
+# Category folders listed in parallel during a scan
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "4"))
+
+# Answer scans from the persistent filesystem index (fs_index.py)
+FS_INDEX = os.getenv("FS_INDEX", "0") == "1"
+
+# Orphans in these category folders are never selected for deletion by default
+PROTECTED_CATEGORIES = {"ISOs"}
+
+# How paths reported by qBittorrent map to local paths, for when qBittorrent
+# runs elsewhere (e.g. in Docker): "/downloads=/mnt/nas/completed;..."
+QB_PATH_MAP = [
+    tuple(pair.split("=", 1))
+    for pair in os.getenv("QB_PATH_MAP", "").split(";")
+    if "=" in pair
+]
+
+# Results of ContentIndex.classify()
+OWNED = "owned"  # a torrent's content, or inside it
+CONTAINS = "contains"  # a directory holding some torrent's content deeper down
+ORPHAN = "orphan"
+
+
+def normalize_path(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+def map_qb_path(path, path_map=None):
+    """Translate a path as qBittorrent sees it into a local path"""
+    path_map = QB_PATH_MAP if path_map is None else path_map
+    for remote, local in path_map:
+        remote = remote.rstrip("/\\")
+        if path == remote or path.startswith((remote + "/", remote + "\\")):
+            return local.rstrip("/\\") + path[len(remote) :]
+    return path
+
+
+def torrent_content_path(torrent):
+    """Content path of a torrent, rebuilt from save_path + name if missing"""
+    if torrent.get("content_path"):
+        return torrent["content_path"]
+    if torrent.get("save_path") and torrent.get("name"):
+        return os.path.join(torrent["save_path"], torrent["name"])
+    return None
+
+
+def fetch_torrent_files(client, torrent):
+    """[path relative to the save path, size, priority] of a torrent's files
+
+    Files are in torrent order, which piece offsets depend on.
+    """
+    r = client.get("torrents/files", params={"hash": torrent["hash"]})
+    return [[f["name"], f["size"], f.get("priority", 1)] for f in r.json()]
+
+
+def is_whole_folder(torrent, roots=(), path_map=None):
+    """Whether a torrent's content path is a folder it shares with others
+
+    Multi-file torrents with the NoSubfolder layout report their save path
+    as content path, and a content path that is a scan root (or above one)
+    covers far more than the torrent. Neither may be indexed as content.
+    """
+    path = torrent_content_path(torrent)
+    if not path:
+        return False
+    key = normalize_path(os.path.abspath(map_qb_path(path, path_map)))
+    save_path = torrent.get("save_path")
+    if save_path and key == normalize_path(
+        os.path.abspath(map_qb_path(save_path, path_map))
+    ):
+        return True
+    for root in roots:
+        root = normalize_path(os.path.abspath(root))
+        if root == key or root.startswith(os.path.join(key, "")):
+            return True
+    return False
+
+
+def fetch_folder_files(torrents, roots=(), client=None):
+    """{hash: fetch_torrent_files()} for the torrents is_whole_folder() flags"""
+    folders = [t for t in torrents if is_whole_folder(t, roots)]
+    if not folders:
+        return {}
+    client = client or get_client()
+    return {t["hash"]: fetch_torrent_files(client, t) for t in folders}
+
+
+def torrent_paths(torrents, files=None, roots=(), path_map=None):
+    """Content paths (as qBittorrent sees them) to index for torrents
+
+    Torrents whose content path is a whole folder (see is_whole_folder())
+    contribute the top-level entries of their file list instead, or
+    nothing when files has no list for them.
+    """
+    files = files or {}
+    paths = []
+    for torrent in torrents:
+        path = torrent_content_path(torrent)
+        if not path:
+            continue
+        if not is_whole_folder(torrent, roots, path_map):
+            paths.append(path)
+            continue
+        base = torrent.get("save_path") or path
+        names = {
+            name.replace("\\", "/").split("/")[0]
+            for name, _, _ in files.get(torrent["hash"], ())
+        }
+        paths.extend(os.path.join(base, name) for name in sorted(names))
+    return paths
+
+
+class ContentPathIndex:
+    """Index of the full content paths of every torrent
+
+    Each filesystem path is classified with an O(depth) walk up its parents:
+    it is either torrent content (or inside it), a directory that holds
+    content further down (so it must be descended into), or an orphan.
+    """
+
+    def __init__(self, paths=(), path_map=None):
+        self.contents = set()
+        self.ancestors = set()
+        for path in paths:
+            self.add(map_qb_path(path, path_map))
+
+    @classmethod
+    def from_torrents(cls, torrents, path_map=None, files=None, roots=()):
+        """Index of torrents' content, see torrent_paths() for files and roots"""
+        return cls(torrent_paths(torrents, files, roots, path_map), path_map)
+
+    def add(self, path):
+        path = normalize_path(path)
+        self.contents.add(path)
+        parent = os.path.dirname(path)
+        while parent and parent not in self.ancestors:
+            self.ancestors.add(parent)
+            next_parent = os.path.dirname(parent)
+            if next_parent == parent:
+                break
+            parent = next_parent
+
+    def classify(self, path):
+        path = normalize_path(path)
+        if path in self.contents:
+            return OWNED
+        if path in self.ancestors:
+            return CONTAINS
+        # Inside some torrent's content folder?
+        current = path
+        while True:
+            parent = os.path.dirname(current)
+            if parent == current:
+                return ORPHAN
+            if parent in self.contents:
+                return OWNED
+            current = parent
+
+    def has_content_under(self, folder):
+        return normalize_path(folder) in self.ancestors
+
+
+class ContentNameIndex:
+    """Fallback index matching entries by name only, like older versions
+
+    Used when qBittorrent's paths can't be related to the local folder.
+    Never asks for nested directories to be descended into.
+    """
+
+    def __init__(self, names=()):
+        self.names = set(names)
+
+    @classmethod
+    def from_torrents(cls, torrents, files=None, roots=()):
+        paths = torrent_paths(torrents, files, roots)
+        return cls(os.path.basename(p.rstrip("/\\")) for p in paths)
+
+    def classify(self, path):
+        return OWNED if os.path.basename(path) in self.names else ORPHAN
+
+
+def list_directory(path):
+    """List a directory with os.scandir
+
+    Returns ([(name, is_dir), ...], seconds). The entry type comes from the
+    directory listing itself, so no extra stat is needed per entry (except
+    for symlinks, which are followed).
+    """
+    start = time.perf_counter()
+    with os.scandir(path) as it:
+        entries = [(entry.name, entry.is_dir()) for entry in it]
+    return entries, time.perf_counter() - start
+
+
+def scan_category(path, index, lister=list_directory):
+    """Find orphans under a category folder, descending into nested layouts
+
+    Returns (orphans, items, warnings, seconds) where orphans are paths
+    relative to the category folder. lister lists one directory, see
+    list_directory().
+    """
+    start = time.perf_counter()
+    orphans = []
+    warnings = []
+    items = 0
+    pending = [(path, "")]
+
+    while pending:
+        folder, relative = pending.pop()
+        try:
+            entries, _ = lister(folder)
+        except OSError:
+            if not relative:
+                raise
+            warnings.append(f"Cannot access {folder}")
+            continue
+
+        for name, is_dir in entries:
+            items += 1
+            full_path = os.path.join(folder, name)
+            relative_path = os.path.join(relative, name) if relative else name
+            status = index.classify(full_path)
+            if status == OWNED:
+                continue
+            if status == CONTAINS and is_dir:
+                pending.append((full_path, relative_path))
+            else:
+                orphans.append(relative_path)
+
+    return orphans, items, warnings, time.perf_counter() - start
+
+
+def iter_orphan_scan(
+    completed_folder, index, workers=None, lister=list_directory, categories=True
+):
+    """Walk the completed folder and yield scan events as they happen
+
+    Every immediate subfolder is treated as a category folder. Without
+    categories (for folders not laid out like COMPLETED_FOLDER, e.g. a
+    torrent save path) only subfolders holding torrent content are, and
+    orphaned subfolders are reported whole under "root". Entries are
+    classified with index (a ContentPathIndex or ContentNameIndex) and
+    folders that hold torrent content deeper down are descended into, so
+    nested layouts of any depth work. Category folders are scanned
+    concurrently by up to workers threads (SCAN_WORKERS by default), so
+    events arrive in completion order. lister lists one directory, pass
+    FsIndex.list_directory to answer the scan from the index instead of the
+    disk. Events are dicts with a "type" key:
+
+    - {"type": "start", "total": n}: number of top-level entries to scan
+    - {"type": "category", "category": name, "items": n, "seconds": t}:
+      a category was scanned, and how long that took
+    - {"type": "warning", "message": text}: a folder could not be read
+    - {"type": "orphan", "name": path, "category": name, "protected": bool}:
+      name is relative to the category folder ("root" for the top level)
+    - {"type": "progress", "done": i, "total": n}: top-level entries done
+    - {"type": "done", "category_count": n, "total_items": n,
+      "orphan_count": n, "timings": {category: seconds}}
+    - {"type": "error", "message": text}: the scan could not run at all
+    """
+    workers = SCAN_WORKERS if workers is None else workers
+
+    if not os.path.exists(completed_folder):
+        yield {
+            "type": "error",
+            "message": f"Completed folder not found: {completed_folder}",
+        }
+        return
+
+    try:
+        folder_contents, _ = lister(completed_folder)
+    except PermissionError:
+        yield {
+            "type": "error",
+            "message": f"Cannot access completed folder: {completed_folder}",
+        }
+        return
+
+    # The quarantine folder holds orphans on purpose
+    quarantine = quarantine_root(completed_folder)
+    folder_contents = [
+        (item, is_dir)
+        for item, is_dir in folder_contents
+        if os.path.join(os.path.abspath(completed_folder), item) != quarantine
+    ]
+
+    total = len(folder_contents)
+    done = 0
+    total_items = 0
+    orphan_count = 0
+    timings = {}
+    categories = []
+    yield {"type": "start", "total": total}
+
+    def orphan(name, category):
+        return {
+            "type": "orphan",
+            "name": name,
+            "category": category,
+            "protected": category in PROTECTED_CATEGORIES,
+        }
+
+    # Files in the root completed folder need no further listing, and
+    # folders that are themselves torrent content aren't categories
+    for item, is_dir in folder_contents:
+        status = index.classify(os.path.join(completed_folder, item))
+        if is_dir and (status == CONTAINS or categories and status == ORPHAN):
+            categories.append(item)
+            continue
+
+        done += 1
+        total_items += 1
+        if status == ORPHAN:
+            orphan_count += 1
+            yield orphan(item, "root")
+        yield {"type": "progress", "done": done, "total": total}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(
+                scan_category, os.path.join(completed_folder, item), index, lister
+            ): item
+            for item in categories
+        }
+        try:
+            for future in as_completed(futures):
+                category = futures[future]
+                done += 1
+                try:
+                    orphans, items, warnings, seconds = future.result()
+                except OSError:
+                    path = os.path.join(completed_folder, category)
+                    yield {"type": "warning", "message": f"Cannot access {path}"}
+                else:
+                    timings[category] = seconds
+                    total_items += items
+                    for message in warnings:
+                        yield {"type": "warning", "message": message}
+                    yield {
+                        "type": "category",
+                        "category": category,
+                        "items": items,
+                        "seconds": seconds,
+                    }
+                    for name in orphans:
+                        orphan_count += 1
+                        yield orphan(name, category)
+
+                yield {"type": "progress", "done": done, "total": total}
+        finally:
+            # Don't start scanning more folders if the consumer stopped early
+            for future in futures:
+                future.cancel()
+
+    yield {
+        "type": "done",
+        "category_count": len(categories),
+        "total_items": total_items,
+        "orphan_count": orphan_count,
+        "timings": timings,
+    }
+
+
+def build_content_index(torrents, completed_folder, files=None):
+    """Build the index used to recognise torrent content on disk
+
+    Returns (index, warning). Full paths are used when qBittorrent's content
+    paths (after QB_PATH_MAP) lie under completed_folder. Otherwise matching
+    falls back to entry names and warning explains why. files holds the
+    file lists of torrents whose content path is a whole folder, they are
+    fetched from qBittorrent when not given.
+    """
+    roots = [completed_folder]
+    if files is None:
+        files = fetch_folder_files(torrents, roots)
+    index = ContentPathIndex.from_torrents(torrents, files=files, roots=roots)
+    if not torrents or index.has_content_under(completed_folder):
+        return index, None
+
+    warning = (
+        f"No torrent content paths are under {completed_folder}, matching "
+        "orphans by name instead. Set QB_PATH_MAP if qBittorrent sees this "
+        "folder under a different path."
+    )
+    return ContentNameIndex.from_torrents(torrents, files, roots), warning
+
+
+def scan_orphans(completed_folder=None, use_index=None):
+    """Fetch the torrent list and stream an orphan scan of the completed folder
+
+    Yields the same events as iter_orphan_scan(), preceded by
+    {"type": "torrents", "count": n, "sample": [...]} once qBittorrent answered.
+    With use_index (FS_INDEX by default) the persistent filesystem index is
+    refreshed incrementally first, reported as {"type": "index", ...stats},
+    and the scan is answered from it. Settings are read from the environment
+    when not given.
+    """
+    completed_folder = completed_folder or os.getenv("COMPLETED_FOLDER")
+    use_index = FS_INDEX if use_index is None else use_index
+
+    # Validate required environment variables
+    if not os.getenv("QB_URL"):
+        yield {"type": "error", "message": "QB_URL environment variable is required"}
+        return
+    if not completed_folder:
+        yield {
+            "type": "error",
+            "message": "COMPLETED_FOLDER environment variable is required",
+        }
+        return
+
+    # Get list of torrents from qBittorrent
+    try:
+        torrents = get_torrents(TORRENT_FIELDS)
+    except QBittorrentError as e:
+        yield {"type": "error", "message": str(e)}
+        return
+
+    paths = sorted(p for p in map(torrent_content_path, torrents) if p)
+    yield {"type": "torrents", "count": len(torrents), "sample": paths[:5]}
+
+    try:
+        index, warning = build_content_index(torrents, completed_folder)
+    except QBittorrentError as e:
+        yield {"type": "error", "message": str(e)}
+        return
+    if warning:
+        yield {"type": "warning", "message": warning}
+
+    if not use_index:
+        yield from iter_orphan_scan(completed_folder, index)
+        return
+
+    if not os.path.isdir(completed_folder):
+        yield {
+            "type": "error",
+            "message": f"Completed folder not found: {completed_folder}",
+        }
+        return
+
+    fs_index = FsIndex(completed_folder)
+    try:
+        yield {"type": "index", **fs_index.refresh()}
+        yield from iter_orphan_scan(
+            completed_folder, index, lister=fs_index.list_directory
+        )
+    finally:
+        fs_index.close()
+
+
+def split_orphans(orphan_events):
+    """Sort orphan events into (protected, deletable) lists of (name, category)"""
+    protected = []
+    deletable = []
+
+    for orphan in sorted(orphan_events, key=lambda o: (o["name"], o["category"])):
+        entry = (orphan["name"], orphan["category"])
+        if orphan["protected"]:
+            protected.append(entry)
+        else:
+            deletable.append(entry)
+
+    return protected, deletable
@@ -0,0 +1,478 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from qb_client import QBittorrentError
+from torrent_store import get_torrents
+from quarantine import quarantine_root
+from orphan_scan import (
+    TORRENT_FIELDS,
+    SCAN_WORKERS,
+    PROTECTED_CATEGORIES,
+    OWNED,
+    ORPHAN,
+    ContentPathIndex,
+    build_content_index,
+    is_whole_folder,
+    list_directory,
+    map_qb_path,
+    normalize_path,
+    scan_category,
+    torrent_content_path,
+)
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Seconds without new filesystem events before a burst is rescanned
+WATCH_DEBOUNCE = float(os.getenv("WATCH_DEBOUNCE", "2"))
+
+# Longest a continuous burst of events may postpone the rescan
+WATCH_MAX_DELAY = float(os.getenv("WATCH_MAX_DELAY", "30"))
+
+# Seconds between polls of qBittorrent for added/removed torrents
+WATCH_QB_INTERVAL = float(os.getenv("WATCH_QB_INTERVAL", "10"))
+
+# Seconds between full reconciling rescans, in case an event was missed
+WATCH_RECONCILE = float(os.getenv("WATCH_RECONCILE", "3600"))
+
+# Seconds between full rescans when inotify is not available
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "300"))
+
+# inotify constants from <sys/inotify.h>
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CREATE
+    | IN_DELETE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal inotify binding through libc, Linux only
+
+    Raises OSError if inotify isn't available on this system.
+    """
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "libc has no inotify support")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout):
+        """Wait up to timeout seconds and return [(wd, mask, name), ...]"""
+        readable, _, _ = select.select([self.fd], [], [], max(0, timeout))
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class OrphanWatcher:
+    """Keep the orphan set of the completed folder current in memory
+
+    The set is built with one full scan, then kept up to date from inotify
+    events on the folders the scan lists (the completed folder, category
+    folders and folders holding torrent content deeper down) and from the
+    torrents qBittorrent adds or removes. Only the affected top-level
+    entries are rescanned. Bursts of events are coalesced, and a full
+    reconciling rescan runs when the event queue overflows, every
+    WATCH_RECONCILE seconds, and every WATCH_POLL_INTERVAL seconds if
+    inotify is not available.
+    """
+
+    def __init__(self, completed_folder, workers=None):
+        self.root = os.path.abspath(completed_folder)
+        self.workers = SCAN_WORKERS if workers is None else workers
+        self.index = ContentPathIndex()
+        self._content_paths = None
+        # top-level entry name -> {(name, category), ...} / {folder, ...}
+        self._orphans = {}
+        self._folders = {}
+        self._watches = {}
+        self._watch_paths = {}
+        self._lock = threading.Lock()
+        try:
+            self.inotify = Inotify()
+        except OSError:
+            self.inotify = None
+
+    def orphans(self):
+        """Current orphans as orphan events, like iter_orphan_scan() yields"""
+        with self._lock:
+            entries = [e for found in self._orphans.values() for e in found]
+        return [_orphan_event(name, category) for name, category in sorted(entries)]
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+    def _scan_entry(self, name):
+        """Scan one top-level entry: ({(name, category), ...}, folders, warnings)"""
+        path = os.path.join(self.root, name)
+        if not os.path.lexists(path):
+            return set(), set(), []
+
+        status = self.index.classify(path)
+        if not os.path.isdir(path) or status == OWNED:
+            return ({(name, "root")} if status == ORPHAN else set()), set(), []
+
+        folders = set()
+
+        def lister(folder):
+            folders.add(folder)
+            return list_directory(folder)
+
+        try:
+            orphans, _, warnings, _ = scan_category(path, self.index, lister)
+        except OSError:
+            return set(), set(), [f"Cannot access {path}"]
+        return {(orphan, name) for orphan in orphans}, folders, warnings
+
+    def _watch_folders(self, old, new):
+        if not self.inotify:
+            return []
+        warnings = []
+        for folder in old - new:
+            wd = self._watches.pop(folder, None)
+            if wd is not None:
+                self._watch_paths.pop(wd, None)
+                self.inotify.rm_watch(wd)
+        # Re-adding an existing watch is harmless and picks up recreated folders
+        for folder in new:
+            try:
+                wd = self.inotify.add_watch(folder)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    warnings.append(
+                        "Out of inotify watches, raise fs.inotify.max_user_watches"
+                    )
+                    break
+                continue
+            self._watches[folder] = wd
+            self._watch_paths[wd] = folder
+        return warnings
+
+    def rescan(self, names, reason):
+        """Rescan the given top-level entries and yield what changed"""
+        start = time.perf_counter()
+        names = sorted(names)
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            results = list(executor.map(self._scan_entry, names))
+
+        for name, (found, folders, warnings) in zip(names, results):
+            for message in warnings:
+                yield {"type": "warning", "message": message}
+            for message in self._watch_folders(self._folders.get(name, set()), folders):
+                yield {"type": "warning", "message": message}
+
+            with self._lock:
+                previous = self._orphans.pop(name, set())
+                if found:
+                    self._orphans[name] = found
+            if folders:
+                self._folders[name] = folders
+            else:
+                self._folders.pop(name, None)
+
+            for orphan, category in sorted(found - previous):
+                yield {**_orphan_event(orphan, category), "type": "orphan_added"}
+            for orphan, category in sorted(previous - found):
+                yield {**_orphan_event(orphan, category), "type": "orphan_removed"}
+
+        yield {
+            "type": "rescan",
+            "reason": reason,
+            "entries": len(names),
+            "seconds": time.perf_counter() - start,
+        }
+
+    def reconcile(self, reason):
+        """Full rescan of every top-level entry, known or new"""
+        entries, _ = list_directory(self.root)
+        names = {name for name, _ in entries} | set(self._orphans) | set(self._folders)
+        names.discard(os.path.relpath(quarantine_root(self.root), self.root))
+        yield from self.rescan(names, reason)
+
+    def refresh_torrents(self):
+        """Rebuild the content index from qBittorrent
+
+        Returns (names, warning): the top-level entries affected by added or
+        removed torrents (None if everything needs rescanning), and the
+        warning of build_content_index() if the index changed.
+        """
+        torrents = get_torrents(TORRENT_FIELDS, max_age=0)
+        content_paths = {t["hash"]: torrent_content_path(t) for t in torrents}
+        if content_paths == self._content_paths:
+            return set(), None
+
+        previous = self._content_paths
+        self._content_paths = content_paths
+        index, warning = build_content_index(torrents, self.root)
+        kind_changed = type(index) is not type(self.index)
+        self.index = index
+        if previous is None or kind_changed:
+            return None, warning
+
+        changed = set(previous.items()) ^ set(content_paths.items())
+        root = normalize_path(self.root)
+        names = set()
+        # Torrents whose content path is a whole folder own scattered entries
+        folders = {t["hash"] for t in torrents if is_whole_folder(t, [self.root])}
+        if any(torrent_hash in folders for torrent_hash, _ in changed):
+            return None, warning
+        for _, path in changed:
+            if not path:
+                continue
+            relative = os.path.relpath(normalize_path(map_qb_path(path)), root)
+            if relative == ".":
+                # A torrent saved straight into the root, without a subfolder
+                return None, warning
+            if not relative.startswith(os.pardir):
+                names.add(relative.split(os.sep)[0])
+        return names, warning
+
+    def _top_level_name(self, wd, name):
+        folder = self._watch_paths.get(wd)
+        if folder is None:
+            return None
+        if folder == self.root:
+            if os.path.join(self.root, name) == quarantine_root(self.root):
+                return None
+            return name or None
+        return os.path.relpath(folder, self.root).split(os.sep)[0]
+
+    def _collect_events(self, timeout):
+        """Wait for filesystem events and coalesce a burst of them
+
+        Returns (top-level names touched, queue overflowed, root vanished).
+        """
+        if not self.inotify:
+            time.sleep(max(0, timeout))
+            return set(), False, False
+
+        events = self.inotify.read(timeout)
+        names = set()
+        overflow = False
+        root_gone = False
+        deadline = time.monotonic() + WATCH_MAX_DELAY
+
+        while events:
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    folder = self._watch_paths.pop(wd, None)
+                    if self._watches.get(folder) == wd:
+                        del self._watches[folder]
+                    root_gone = root_gone or folder == self.root
+                    continue
+                top = self._top_level_name(wd, name)
+                if top:
+                    names.add(top)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            events = self.inotify.read(min(WATCH_DEBOUNCE, remaining))
+
+        return names, overflow, root_gone
+
+    def watch(self):
+        """Yield events as the orphan set changes, until the consumer stops
+
+        - {"type": "ready", "orphan_count": n, "inotify": bool}
+        - {"type": "orphan_added" / "orphan_removed", "name": path,
+          "category": name, "protected": bool}
+        - {"type": "rescan", "reason": text, "entries": n, "seconds": t}
+        - {"type": "warning", "message": text}
+        - {"type": "error", "message": text}: watching had to stop
+        """
+        try:
+            _, warning = self.refresh_torrents()
+        except QBittorrentError as e:
+            yield {"type": "error", "message": str(e)}
+            return
+        if warning:
+            yield {"type": "warning", "message": warning}
+
+        if self.inotify:
+            self._watch_folders(set(), {self.root})
+        yield from self.reconcile("startup")
+        with self._lock:
+            orphan_count = sum(len(found) for found in self._orphans.values())
+        yield {
+            "type": "ready",
+            "orphan_count": orphan_count,
+            "inotify": self.inotify is not None,
+        }
+
+        reconcile_interval = WATCH_RECONCILE if self.inotify else WATCH_POLL_INTERVAL
+        next_poll = time.monotonic() + WATCH_QB_INTERVAL
+        next_reconcile = time.monotonic() + reconcile_interval
+
+        while True:
+            timeout = min(next_poll, next_reconcile) - time.monotonic()
+            names, overflow, root_gone = self._collect_events(timeout)
+
+            if root_gone:
+                yield {
+                    "type": "error",
+                    "message": f"Completed folder disappeared: {self.root}",
+                }
+                return
+
+            if overflow:
+                yield {
+                    "type": "warning",
+                    "message": "inotify queue overflowed, rescanning everything",
+                }
+                yield from self.reconcile("event queue overflow")
+                next_reconcile = time.monotonic() + reconcile_interval
+            elif names:
+                yield from self.rescan(names, "filesystem changes")
+
+            if time.monotonic() >= next_poll:
+                try:
+                    names, warning = self.refresh_torrents()
+                except QBittorrentError as e:
+                    yield {"type": "warning", "message": str(e)}
+                else:
+                    if warning:
+                        yield {"type": "warning", "message": warning}
+                    if names is None:
+                        yield from self.reconcile("torrent list reloaded")
+                    elif names:
+                        yield from self.rescan(names, "torrents added or removed")
+                next_poll = time.monotonic() + WATCH_QB_INTERVAL
+
+            if time.monotonic() >= next_reconcile:
+                yield from self.reconcile("periodic reconcile")
+                next_reconcile = time.monotonic() + reconcile_interval
+
+
+def _orphan_event(name, category):
+    return {
+        "type": "orphan",
+        "name": name,
+        "category": category,
+        "protected": category in PROTECTED_CATEGORIES,
+    }
+
+
+def print_orphans(watcher):
+    orphans = watcher.orphans()
+    if not orphans:
+        print("✅ No orphaned files right now")
+        return
+    print(f"\n🔍 {len(orphans)} orphaned files right now:")
+    for orphan in orphans:
+        print(f"  • {orphan['name']} (in {orphan['category']})")
+
+
+def main():
+    completed_folder = os.getenv("COMPLETED_FOLDER")
+    if not os.getenv("QB_URL"):
+        print("❌ QB_URL environment variable is required")
+        return False
+    if not completed_folder or not os.path.isdir(completed_folder):
+        print(f"❌ Completed folder not found: {completed_folder}")
+        return False
+
+    watcher = OrphanWatcher(completed_folder)
+
+    def read_input():
+        # Every Enter prints the current orphan set
+        for _ in sys.stdin:
+            print_orphans(watcher)
+
+    try:
+        for event in watcher.watch():
+            if event["type"] == "error":
+                print(f"❌ {event['message']}")
+                return False
+            elif event["type"] == "warning":
+                print(f"Warning: {event['message']}")
+            elif event["type"] == "ready":
+                mode = "inotify" if event["inotify"] else "periodic rescans"
+                print(
+                    f"👀 Watching {completed_folder} with {mode}, "
+                    f"{event['orphan_count']} orphans. Press Enter to list them."
+                )
+                threading.Thread(target=read_input, daemon=True).start()
+            elif event["type"] == "rescan":
+                print(
+                    f"🔄 Rescanned {event['entries']} entries after "
+                    f"{event['reason']} ({event['seconds']:.2f}s)"
+                )
+            elif event["type"] == "orphan_added":
+                print(f"➕ Orphaned: {event['name']} (in {event['category']})")
+            elif event["type"] == "orphan_removed":
+                print(
+                    f"➖ No longer orphaned: {event['name']} (in {event['category']})"
+                )
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+    finally:
+        watcher.close()
+    return True
+
+
+if __name__ == "__main__":
+    main()
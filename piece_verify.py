@@ -0,0 +1,356 @@
+import os
+import sys
+import mmap
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dotenv import load_dotenv
+from disk_usage import format_bytes
+from torrent_file import BencodeError, read_torrent
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Processes hashing pieces in parallel
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", str(os.cpu_count() or 2)))
+
+# Stop verifying a torrent after this many bad pieces (0 = check every piece)
+VERIFY_MAX_MISMATCHES = int(os.getenv("VERIFY_MAX_MISMATCHES", "0"))
+
+# Pieces hashed by a quick check, spread over the whole torrent
+QUICK_CHECK_PIECES = int(os.getenv("QUICK_CHECK_PIECES", "16"))
+
+# Bytes of pieces handed to a worker process at a time
+TASK_BYTES = 64 * 1024 * 1024
+
+# v2 torrents hash files in 16 KiB blocks arranged in a Merkle tree
+BLOCK_SIZE = 16 * 1024
+_ZERO_HASH = bytes(32)
+
+
+def local_files(torrent, content_path, mapping=None):
+    """{torrent file path: local path} for a torrent's data at content_path
+
+    content_path is the torrent's root folder (or its only file). mapping
+    overrides it for individual files, e.g. the pairs readopt matched.
+    """
+    mapping = mapping or {}
+    files = {}
+    for entry in torrent["files"]:
+        if entry.get("pad"):
+            continue
+        parts = entry["path"].split("/")
+        if len(torrent["files"]) == 1 and len(parts) == 1:
+            local = content_path
+        else:
+            local = os.path.join(content_path, *parts[1:])
+        files[entry["path"]] = mapping.get(entry["path"], local)
+    return files
+
+
+def _usable(path, size):
+    # Files of the wrong size can't hold the right pieces, treat them as missing
+    try:
+        return os.path.getsize(path) == size
+    except OSError:
+        return False
+
+
+def _segments(ranges, start, length):
+    """(local path, offset in file, length) covering a span of the torrent
+
+    ranges are (torrent offset, size, local path) in piece order, with ""
+    for padding (read as zeros) and None for missing files.
+    """
+    segments = []
+    end = start + length
+    for offset, size, path in ranges:
+        if offset + size <= start or offset >= end:
+            continue
+        first = max(start, offset)
+        segments.append((path, first - offset, min(end, offset + size) - first))
+    return segments
+
+
+def _v1_items(torrent, files):
+    """(file paths, segments, expected SHA-1, 0) for every v1 piece"""
+    ranges = []
+    for entry in torrent["files"]:
+        # Empty files hold no piece data (and can't be mmapped)
+        if entry["size"] == 0:
+            continue
+        if entry["pad"]:
+            path = ""
+        else:
+            path = files[entry["path"]]
+            if not _usable(path, entry["size"]):
+                path = None
+        ranges.append((entry["offset"], entry["size"], path, entry["path"]))
+
+    piece_length = torrent["piece_length"]
+    total = sum(entry["size"] for entry in torrent["files"])
+    pieces = torrent["pieces"]
+    items = []
+    # Files and pieces are both in torrent order, so walk them side by side
+    first = 0
+    for index in range(len(pieces) // 20):
+        start = index * piece_length
+        length = min(piece_length, total - start)
+        while first < len(ranges) and sum(ranges[first][:2]) <= start:
+            first += 1
+        covered = []
+        for r in ranges[first:]:
+            if r[0] >= start + length:
+                break
+            covered.append(r)
+        items.append(
+            (
+                tuple(r[3] for r in covered if r[2] != ""),
+                _segments([r[:3] for r in covered], start, length),
+                bytes(pieces[index * 20 : index * 20 + 20]),
+                0,
+            )
+        )
+    return items
+
+
+def _v2_items(torrent, files):
+    """(file paths, segments, expected SHA-256 root, leaves) for every v2 piece
+
+    Files larger than a piece are checked piece by piece against the piece
+    layers, smaller ones as a whole against their pieces root.
+    """
+    piece_length = torrent["piece_length"]
+    items = []
+    for entry in torrent["files"]:
+        size = entry["size"]
+        if size == 0:
+            continue
+        path = files[entry["path"]]
+        if not _usable(path, size):
+            path = None
+        if size <= piece_length:
+            blocks = -(-size // BLOCK_SIZE)
+            leaves = 1 << (blocks - 1).bit_length()
+            segments = [(path, 0, size)]
+            items.append(((entry["path"],), segments, entry["pieces_root"], leaves))
+            continue
+        layer = torrent["piece_layers"].get(entry["pieces_root"])
+        if layer is None:
+            raise BencodeError(f"No piece layer for {entry['path']}")
+        for index in range(len(layer) // 32):
+            start = index * piece_length
+            segments = [(path, start, min(piece_length, size - start))]
+            expected = bytes(layer[index * 32 : index * 32 + 32])
+            items.append(
+                ((entry["path"],), segments, expected, piece_length // BLOCK_SIZE)
+            )
+    return items
+
+
+def _merkle_root(data, leaves):
+    """Root of the SHA-256 tree over 16 KiB blocks, padded to leaves with zeros"""
+    hashes = [
+        hashlib.sha256(data[i : i + BLOCK_SIZE]).digest()
+        for i in range(0, len(data), BLOCK_SIZE)
+    ]
+    hashes += [_ZERO_HASH] * (leaves - len(hashes))
+    while len(hashes) > 1:
+        hashes = [
+            hashlib.sha256(hashes[i] + hashes[i + 1]).digest()
+            for i in range(0, len(hashes), 2)
+        ]
+    return hashes[0]
+
+
+def _verify_items(items):
+    # Runs in a worker process: hash the pieces straight out of mmapped files
+    views = {}
+
+    def view(path):
+        if path not in views:
+            with open(path, "rb") as f:
+                views[path] = memoryview(
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                )
+        return views[path]
+
+    failures = []
+    for paths, segments, expected, leaves in items:
+        if any(path is None for path, _, _ in segments):
+            failures.append((paths, "missing"))
+            continue
+        try:
+            parts = [
+                view(path)[offset : offset + length] if path else bytes(length)
+                for path, offset, length in segments
+            ]
+        except (OSError, ValueError):
+            failures.append((paths, "missing"))
+            continue
+        if leaves:
+            # v2 pieces never span files
+            digest = _merkle_root(parts[0], leaves)
+        else:
+            sha1 = hashlib.sha1()
+            for part in parts:
+                sha1.update(part)
+            digest = sha1.digest()
+        if digest != expected:
+            failures.append((paths, "mismatch"))
+        del parts
+    views.clear()
+    return len(items), failures
+
+
+def _chunks(items, piece_length):
+    per_task = max(1, TASK_BYTES // max(piece_length, 1))
+    for i in range(0, len(items), per_task):
+        yield items[i : i + per_task]
+
+
+def _sample(items, samples):
+    """samples items spread evenly over items"""
+    if samples <= 0 or samples >= len(items):
+        return items
+    step = len(items) / samples
+    return [items[int(i * step)] for i in range(samples)]
+
+
+def iter_verify(torrent, content_path, mapping=None, quick=False, **options):
+    """Hash a torrent's data at content_path against its piece hashes
+
+    torrent comes from read_torrent(). Hybrid torrents are checked with
+    their v1 (SHA-1) pieces and v2-only ones with their SHA-256 piece
+    layers. Pieces are read from mmapped files, across file boundaries,
+    and hashed by a pool of processes. Options (defaults from .env):
+
+    - quick: only hash QUICK_CHECK_PIECES pieces spread over the torrent
+      (samples=n overrides the count)
+    - max_mismatches: stop after this many bad pieces, 0 = never (pieces
+      are handed out in 64 MB tasks, so a few more may get hashed)
+    - workers: processes to hash with
+
+    Events:
+
+    - {"type": "start", "pieces": n, "checking": n}
+    - {"type": "progress", "checked": n, "bad": n}
+    - {"type": "done", "checked": n, "matched": n, "mismatched": n,
+      "missing": n, "bad_files": [...], "stopped_early": bool}
+    """
+    samples = options.get("samples", QUICK_CHECK_PIECES)
+    max_mismatches = options.get("max_mismatches", VERIFY_MAX_MISMATCHES)
+    workers = options.get("workers", VERIFY_WORKERS)
+
+    files = local_files(torrent, content_path, mapping)
+    if torrent["pieces"] is not None:
+        items = _v1_items(torrent, files)
+    else:
+        items = _v2_items(torrent, files)
+    checking = _sample(items, samples) if quick else items
+    yield {"type": "start", "pieces": len(items), "checking": len(checking)}
+
+    checked = 0
+    counts = {"mismatch": 0, "missing": 0}
+    bad_files = set()
+    stopped_early = False
+    tasks = _chunks(checking, torrent["piece_length"])
+    executor = ProcessPoolExecutor(max_workers=max(1, workers))
+    # Keep a couple of tasks per worker queued, so stopping early is quick
+    pending = set()
+    try:
+        for task in tasks:
+            pending.add(executor.submit(_verify_items, task))
+            if len(pending) < 2 * max(1, workers):
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                checked += _tally(future.result(), counts, bad_files)
+            yield {"type": "progress", "checked": checked, "bad": sum(counts.values())}
+            if max_mismatches and sum(counts.values()) >= max_mismatches:
+                stopped_early = True
+                break
+        if not stopped_early:
+            for future in pending:
+                checked += _tally(future.result(), counts, bad_files)
+    finally:
+        # shutdown(cancel_futures=True) needs Python 3.9
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+    yield {
+        "type": "done",
+        "checked": checked,
+        "matched": checked - sum(counts.values()),
+        "mismatched": counts["mismatch"],
+        "missing": counts["missing"],
+        "bad_files": sorted(bad_files),
+        "stopped_early": stopped_early,
+    }
+
+
+def _tally(result, counts, bad_files):
+    checked, failures = result
+    for paths, status in failures:
+        counts[status] += 1
+        bad_files.update(paths)
+    return checked
+
+
+def verify_torrent(torrent, content_path, mapping=None, quick=False, **options):
+    """iter_verify() run to completion, returning its "done" event"""
+    for event in iter_verify(torrent, content_path, mapping, quick, **options):
+        pass
+    return event
+
+
+def main():
+    args = sys.argv[1:]
+    paths = [arg for arg in args if not arg.startswith("--")]
+    if len(paths) < 2:
+        print(
+            "Usage: python piece_verify.py <file.torrent> <content path> "
+            "[--quick] [--max-mismatches N]"
+        )
+        return False
+    options = {}
+    if "--max-mismatches" in args:
+        value = args[args.index("--max-mismatches") + 1]
+        options["max_mismatches"] = int(value)
+        paths.remove(value)
+
+    try:
+        torrent = read_torrent(paths[0])
+    except (OSError, BencodeError) as e:
+        print(f"❌ {e}")
+        return False
+
+    try:
+        for event in iter_verify(torrent, paths[1], quick="--quick" in args, **options):
+            if event["type"] == "start":
+                print(
+                    f"🔎 Checking {event['checking']} of {event['pieces']} pieces of "
+                    f"{torrent['name']} ({format_bytes(torrent['size'])})"
+                )
+            elif event["type"] == "progress":
+                print(f"   {event['checked']} pieces hashed, {event['bad']} bad")
+    except BencodeError as e:
+        print(f"❌ {e}")
+        return False
+
+    if event["stopped_early"]:
+        print(f"⏹️  Stopped after {event['mismatched'] + event['missing']} bad pieces")
+    if event["mismatched"] or event["missing"]:
+        print(
+            f"❌ {event['mismatched']} pieces don't match, "
+            f"{event['missing']} have missing data"
+        )
+        for path in event["bad_files"]:
+            print(f"   {path}")
+        return False
+    print(f"✅ All {event['checked']} checked pieces match")
+    return True
+
+
+if __name__ == "__main__":
+    main()
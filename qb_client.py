@@ -0,0 +1,366 @@
+import os
+import json
+import codecs
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Timeout in seconds for every individual WebUI request
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))
+
+# Keep-alive connections kept open to qBittorrent
+QB_POOL_SIZE = int(os.getenv("QB_POOL_SIZE", "16"))
+
+# Retries (with exponential backoff) for connection errors, and for 502/503/504
+# answers to GET requests (POSTs may have changed something already)
+QB_RETRIES = int(os.getenv("QB_RETRIES", "3"))
+
+# Folder relative state and cache file settings are resolved against, so
+# every tool finds the same files whatever folder it is started from
+STATE_DIR = os.getenv("STATE_DIR") or os.path.dirname(os.path.abspath(__file__))
+
+
+def state_path(path):
+    """Resolve a state file setting against STATE_DIR, "" stays disabled"""
+    return os.path.join(STATE_DIR, os.path.expanduser(path)) if path else path
+
+
+# Where the WebUI session cookie is kept between runs
+QB_SESSION_FILE = state_path(os.getenv("QB_SESSION_FILE", ".qb_session.json"))
+
+
+# Bytes read from the socket at a time when streaming large responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_JSON_WHITESPACE = " \t\r\n"
+
+# Characters a JSON number can start with / continue with
+_NUMBER_START = "-0123456789"
+_NUMBER_CHARS = "+-.0123456789eE"
+
+
+class QBittorrentError(Exception):
+    """Raised when qBittorrent can't be reached or rejects a request"""
+
+
+class _JsonReader:
+    """Pull parser for a JSON document arriving as a sequence of text chunks
+
+    Containers are walked with members()/elements() and leaf values (each
+    torrent dict, for example) are decoded one at a time, so only the
+    current value and the unread part of the last chunk are held in memory.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        for chunk in self._chunks:
+            if chunk:
+                self._buf = self._buf[self._pos :] + chunk
+                self._pos = 0
+                return True
+        self._eof = True
+        return False
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while (
+                self._pos < len(self._buf) and self._buf[self._pos] in _JSON_WHITESPACE
+            ):
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in JSON stream")
+        self._pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        number = self.peek() in _NUMBER_START
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number may continue in the next chunk ("1" + ".5"), so it
+                # is only complete once something else follows it
+                if (
+                    not number
+                    or self._eof
+                    or end < len(self._buf)
+                    and self._buf[end] not in _NUMBER_CHARS
+                ):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def members(self):
+        """Yield the keys of an object; consume each key's value before resuming"""
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self._pos += 1
+            else:
+                self.expect("}")
+                return
+
+    def elements(self):
+        """Yield once per array element; consume the element before resuming"""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ",":
+                self._pos += 1
+            else:
+                self.expect("]")
+                return
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a top-level JSON array one by one"""
+    reader = _JsonReader(chunks)
+    for _ in reader.elements():
+        yield reader.value()
+
+
+def iter_json_object(chunks, expand=()):
+    """Yield (key, value) pairs of a top-level JSON object one by one
+
+    Object values under a key listed in expand are not decoded in one go;
+    their members are yielded individually as ((key, member), value).
+    """
+    reader = _JsonReader(chunks)
+    for key in reader.members():
+        if key in expand and reader.peek() == "{":
+            for member in reader.members():
+                yield (key, member), reader.value()
+        else:
+            yield key, reader.value()
+
+
+def iter_response_text(response):
+    """Decode a streamed response body into text chunks, then close it"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+    finally:
+        response.close()
+
+
+def project(record, fields):
+    """Keep only the given fields of a dict (all of them if fields is None)"""
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+class QBClient:
+    """Pooled, keep-alive qBittorrent WebUI client
+
+    Logs in lazily, reuses the SID cookie saved by a previous run when
+    possible and logs in again automatically when qBittorrent answers 403.
+    The client is safe to share between threads.
+    """
+
+    def __init__(self, url, username, password, session_file=None, timeout=None):
+        self.url = url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.session_file = QB_SESSION_FILE if session_file is None else session_file
+        self.timeout = REQUEST_TIMEOUT if timeout is None else timeout
+        self._login_lock = threading.Lock()
+
+        # Default allowed methods: connection errors are retried for any
+        # request, 502/503/504 and read errors only for idempotent ones
+        retry = Retry(
+            total=QB_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=QB_POOL_SIZE, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # qBittorrent rejects API calls whose Referer doesn't match the host
+        # when CSRF protection is enabled
+        self.session.headers["Referer"] = self.url
+
+        self._load_sid()
+
+    def _load_sid(self):
+        if not self.session_file:
+            return
+        try:
+            with open(self.session_file, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if saved.get("url") == self.url and saved.get("username") == self.username:
+            if saved.get("sid"):
+                self.session.cookies.set("SID", saved["sid"])
+
+    def _save_sid(self):
+        sid = self.session.cookies.get("SID")
+        if not self.session_file or not sid:
+            return
+        try:
+            tmp_path = f"{self.session_file}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"url": self.url, "username": self.username, "sid": sid}, f)
+            os.replace(tmp_path, self.session_file)
+        except OSError as e:
+            print(f"⚠️ Could not save qBittorrent session: {e}")
+
+    @property
+    def logged_in(self):
+        return "SID" in self.session.cookies
+
+    def login(self, stale_sid=None):
+        """Log in to the WebUI, replacing the session cookie stale_sid
+
+        stale_sid is the SID a request was sent with (None when there was
+        none). Threads share the session, so when several of them get
+        turned away at once only the first logs in; the others find the SID
+        changed and skip the login.
+        """
+        with self._login_lock:
+            if self.session.cookies.get("SID") != stale_sid:
+                return
+
+            # Only drop the SID, requests of other threads keep their cookies
+            for cookie in [c for c in self.session.cookies if c.name == "SID"]:
+                self.session.cookies.clear(cookie.domain, cookie.path, cookie.name)
+            try:
+                r = self.session.post(
+                    f"{self.url}/api/v2/auth/login",
+                    data={"username": self.username, "password": self.password},
+                    timeout=self.timeout,
+                )
+            except requests.exceptions.RequestException as e:
+                raise QBittorrentError(f"Failed to connect to qBittorrent: {e}")
+
+            if r.status_code != 200 or r.text != "Ok.":
+                raise QBittorrentError(
+                    f"Failed to login to qBittorrent: {r.status_code} {r.text}".strip()
+                )
+            self._save_sid()
+
+    def request(self, method, path, **kwargs):
+        """Send an API request, logging in first or again as needed
+
+        path is relative to /api/v2, e.g. "torrents/info". Raises
+        QBittorrentError on connection errors and non-2xx responses.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        url = f"{self.url}/api/v2/{path.lstrip('/')}"
+
+        sid = self.session.cookies.get("SID")
+        if sid is None:
+            self.login()
+            sid = self.session.cookies.get("SID")
+
+        try:
+            r = self.session.request(method, url, **kwargs)
+            if r.status_code == 403:
+                # Session expired or the saved cookie is no longer valid
+                self.login(stale_sid=sid)
+                r = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise QBittorrentError(f"Request to {path} failed: {e}")
+
+        if not r.ok:
+            raise QBittorrentError(f"Request to {path} failed: {r.status_code}")
+        return r
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def app_version(self):
+        return self.get("app/version").text.strip('"')
+
+    def stream(self, path, **kwargs):
+        """Send a GET request and return the body as an iterator of text chunks"""
+        return iter_response_text(self.get(path, stream=True, **kwargs))
+
+    def iter_torrents(self, fields=None, **params):
+        """Stream /torrents/info, yielding each torrent projected to fields
+
+        params are passed to qBittorrent, which filters server-side: filter,
+        category, tag, hashes (a list or "|"-separated string), sort...
+        """
+        if isinstance(params.get("hashes"), (list, tuple, set)):
+            params["hashes"] = "|".join(params["hashes"])
+        chunks = self.stream("torrents/info", params=params or None)
+        for torrent in iter_json_array(chunks):
+            yield project(torrent, fields)
+
+    def torrents_info(self, fields=None, **params):
+        return list(self.iter_torrents(fields, **params))
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client for the current QB_* settings
+
+    The client is created on first use and replaced when the settings
+    change, e.g. after saving the configuration in the GUI.
+    """
+    global _client
+
+    qb_url = os.getenv("QB_URL")
+    qb_user = os.getenv("QB_USER", "admin")
+    qb_pass = os.getenv("QB_PASS", "admin")
+
+    if not qb_url:
+        raise QBittorrentError("QB_URL environment variable is required")
+
+    with _client_lock:
+        if _client is None or (_client.url, _client.username, _client.password) != (
+            qb_url.rstrip("/"),
+            qb_user,
+            qb_pass,
+        ):
+            if _client is not None:
+                _client.close()
+            _client = QBClient(qb_url, qb_user, qb_pass)
+        return _client
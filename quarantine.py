@@ -0,0 +1,491 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+from dotenv import load_dotenv
+from disk_usage import format_bytes
+from qb_client import state_path
+
+# Load environment variables from .env file
+load_dotenv()
+
+# "delete" removes orphans right away, "quarantine" moves them aside first
+DELETE_MODE = os.getenv("DELETE_MODE", "delete")
+
+# Quarantine folder, relative to the completed folder unless absolute. It
+# must be on the same filesystem so moving an orphan there is a rename
+QUARANTINE_DIR = os.getenv("QUARANTINE_DIR", ".quarantine")
+
+# Seconds quarantined files are kept (and can be restored) before purging
+QUARANTINE_RETENTION = float(os.getenv("QUARANTINE_RETENTION", str(7 * 24 * 3600)))
+
+# Purge budget: filesystem operations and bytes freed per second (0 = no limit)
+PURGE_OPS_PER_SECOND = float(os.getenv("PURGE_OPS_PER_SECOND", "100"))
+PURGE_BYTES_PER_SECOND = float(os.getenv("PURGE_BYTES_PER_SECOND", "0"))
+
+# Seconds between background purges of expired quarantine batches
+PURGE_INTERVAL = float(os.getenv("PURGE_INTERVAL", "3600"))
+
+# Folders other than COMPLETED_FOLDER that hold quarantine batches (scan
+# roots, download folders), so purging and restoring can find them
+QUARANTINE_REGISTRY = state_path(
+    os.getenv("QUARANTINE_REGISTRY", ".quarantine_roots.json")
+)
+
+MANIFEST = "manifest.json"
+
+_registry_lock = threading.Lock()
+
+
+def quarantine_root(completed_folder):
+    """Absolute path of the quarantine folder for a completed folder"""
+    return os.path.abspath(os.path.join(completed_folder, QUARANTINE_DIR))
+
+
+def _read_registry():
+    try:
+        with open(QUARANTINE_REGISTRY) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def register_quarantine_folder(completed_folder):
+    """Remember a folder that has a quarantine, see quarantine_folders()"""
+    folder = os.path.abspath(completed_folder)
+    with _registry_lock:
+        folders = _read_registry()
+        if folder in folders:
+            return
+        try:
+            with open(QUARANTINE_REGISTRY + ".tmp", "w") as f:
+                json.dump(folders + [folder], f, indent=2)
+            os.replace(QUARANTINE_REGISTRY + ".tmp", QUARANTINE_REGISTRY)
+        except OSError:
+            pass
+
+
+def forget_quarantine_folder(completed_folder):
+    """Drop a registered folder once its quarantine holds no batches"""
+    folder = os.path.abspath(completed_folder)
+    with _registry_lock:
+        folders = _read_registry()
+        # Checked under the lock so a batch created meanwhile keeps the entry
+        if folder not in folders or list_batches(folder):
+            return
+        folders.remove(folder)
+        try:
+            with open(QUARANTINE_REGISTRY + ".tmp", "w") as f:
+                json.dump(folders, f, indent=2)
+            os.replace(QUARANTINE_REGISTRY + ".tmp", QUARANTINE_REGISTRY)
+        except OSError:
+            pass
+
+
+def quarantine_folders(completed_folder=None):
+    """completed_folder plus every registered folder that still has a quarantine"""
+    folders = []
+    if completed_folder:
+        folders.append(os.path.abspath(completed_folder))
+    for folder in _read_registry():
+        if folder not in folders and os.path.isdir(quarantine_root(folder)):
+            folders.append(folder)
+    return folders
+
+
+def find_batch(folders, batch):
+    """The folder among folders whose quarantine holds batch, or None"""
+    for folder in folders:
+        if os.path.isdir(os.path.join(quarantine_root(folder), batch)):
+            return folder
+    return None
+
+
+def orphan_source(completed_folder, orphan, category):
+    if category == "root":
+        return os.path.join(completed_folder, orphan)
+    return os.path.join(completed_folder, category, orphan)
+
+
+def _write_manifest(batch_dir, manifest):
+    path = os.path.join(batch_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def quarantine_files(files_to_quarantine, completed_folder):
+    """Move orphans into a new quarantine batch
+
+    Each move is a rename within the same filesystem, so it takes the same
+    time for a 1 KB file as for a 100 GB season pack. Returns the same dict
+    as delete_selected_files() plus the batch id.
+    """
+    root = quarantine_root(completed_folder)
+    batch = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    batch_dir = os.path.join(root, batch)
+    manifest = {"created": time.time(), "items": []}
+    deleted_count = 0
+    error_count = 0
+    error_messages = []
+
+    try:
+        os.makedirs(batch_dir)
+    except OSError as e:
+        return {
+            "deleted_count": 0,
+            "error_count": len(files_to_quarantine),
+            "error_messages": [f"Cannot create quarantine folder {batch_dir}: {e}"],
+            "batch": None,
+        }
+    device = os.stat(batch_dir).st_dev
+    register_quarantine_folder(completed_folder)
+
+    for orphan, category in files_to_quarantine:
+        source = orphan_source(completed_folder, orphan, category)
+        target = os.path.join(batch_dir, category, orphan)
+        try:
+            if not os.path.lexists(source):
+                error_messages.append(f"File not found: {orphan}")
+                error_count += 1
+                continue
+            if os.stat(source, follow_symlinks=False).st_dev != device:
+                error_messages.append(
+                    f"{orphan} is on another filesystem than {root}, not moved"
+                )
+                error_count += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.rename(source, target)
+            manifest["items"].append(
+                {
+                    "name": orphan,
+                    "category": category,
+                    "original": os.path.abspath(source),
+                    "quarantined": os.path.relpath(target, batch_dir),
+                }
+            )
+            deleted_count += 1
+        except OSError as e:
+            error_messages.append(f"Error quarantining {orphan}: {e}")
+            error_count += 1
+
+    _write_manifest(batch_dir, manifest)
+    return {
+        "deleted_count": deleted_count,
+        "error_count": error_count,
+        "error_messages": error_messages,
+        "batch": batch,
+    }
+
+
+def list_batches(completed_folder):
+    """Quarantine batches, oldest first, as dicts with their manifest data"""
+    root = quarantine_root(completed_folder)
+    batches = []
+    try:
+        names = sorted(os.listdir(root))
+    except FileNotFoundError:
+        return batches
+
+    for name in names:
+        batch_dir = os.path.join(root, name)
+        try:
+            with open(os.path.join(batch_dir, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            # Interrupted quarantine, age it by the folder itself
+            if not os.path.isdir(batch_dir):
+                continue
+            manifest = {"created": os.stat(batch_dir).st_mtime, "items": []}
+        batches.append(
+            {
+                "batch": name,
+                "path": batch_dir,
+                "created": manifest["created"],
+                "expires": manifest["created"] + QUARANTINE_RETENTION,
+                "items": manifest["items"],
+            }
+        )
+    return batches
+
+
+def restore_batch(completed_folder, batch):
+    """Move every item of a quarantine batch back where it came from"""
+    batch_dir = os.path.join(quarantine_root(completed_folder), batch)
+    with open(os.path.join(batch_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    restored_count = 0
+    error_messages = []
+    remaining = []
+    for item in manifest["items"]:
+        source = os.path.join(batch_dir, item["quarantined"])
+        try:
+            if os.path.lexists(item["original"]):
+                raise FileExistsError(f"{item['original']} already exists")
+            os.makedirs(os.path.dirname(item["original"]), exist_ok=True)
+            os.rename(source, item["original"])
+            restored_count += 1
+        except OSError as e:
+            error_messages.append(f"Error restoring {item['name']}: {e}")
+            remaining.append(item)
+
+    manifest["items"] = remaining
+    _write_manifest(batch_dir, manifest)
+    return {
+        "restored_count": restored_count,
+        "error_count": len(error_messages),
+        "error_messages": error_messages,
+    }
+
+
+class Throttle:
+    """Spread work out to at most rate units per second (0 = unlimited)"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = time.monotonic()
+
+    def consume(self, amount=1):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        # Allow up to a second's worth of burst after being idle
+        self._next = max(self._next, now - 1) + amount / self.rate
+        if self._next > now:
+            time.sleep(self._next - now)
+
+
+def iter_purge(
+    completed_folder,
+    everything=False,
+    ops_per_second=None,
+    bytes_per_second=None,
+    stop=None,
+):
+    """Permanently delete expired quarantine batches, yielding progress events
+
+    Only batches older than QUARANTINE_RETENTION are purged unless
+    everything is set. Deletion is paced to ops_per_second unlinks/rmdirs
+    and bytes_per_second freed (PURGE_OPS_PER_SECOND and
+    PURGE_BYTES_PER_SECOND by default) so the disks keep serving seeds.
+    Setting the stop event pauses the purge, the next one picks up where
+    it left off. A batch where some removals failed keeps its manifest
+    and is reported as partial so the next purge retries it. Once every
+    batch is gone the folder is dropped from the registry. Events:
+
+    - {"type": "start", "batches": n, "files": n, "bytes": n}
+    - {"type": "progress", "files_done": n, "bytes_done": n, "files": n,
+      "bytes": n}
+    - {"type": "purged", "batch": id}
+    - {"type": "partial", "batch": id, "failed": n}
+    - {"type": "warning", "message": text}
+    - {"type": "done", "batches": n, "files_done": n, "bytes_done": n}
+    """
+    ops = Throttle(PURGE_OPS_PER_SECOND if ops_per_second is None else ops_per_second)
+    freed = Throttle(
+        PURGE_BYTES_PER_SECOND if bytes_per_second is None else bytes_per_second
+    )
+    now = time.time()
+    batches = [
+        b for b in list_batches(completed_folder) if everything or b["expires"] <= now
+    ]
+
+    # Count first so progress can be reported as a fraction
+    plans = []
+    files = 0
+    total_bytes = 0
+    for batch in batches:
+        plan = []
+        manifest = os.path.join(batch["path"], MANIFEST)
+        for folder, dirnames, filenames in os.walk(batch["path"], topdown=False):
+            for name in filenames:
+                path = os.path.join(folder, name)
+                if path == manifest:
+                    continue
+                try:
+                    size = os.stat(path, follow_symlinks=False).st_size
+                except OSError:
+                    size = 0
+                plan.append((path, False, size))
+                files += 1
+                total_bytes += size
+            for name in dirnames:
+                path = os.path.join(folder, name)
+                # os.walk lists symlinks to folders as folders
+                plan.append((path, not os.path.islink(path), 0))
+        # The manifest goes last so an interrupted purge keeps the batch's age
+        plan.append((manifest, False, 0))
+        files += 1
+        plan.append((batch["path"], True, 0))
+        plans.append((batch["batch"], manifest, plan))
+
+    yield {
+        "type": "start",
+        "batches": len(plans),
+        "files": files,
+        "bytes": total_bytes,
+    }
+
+    files_done = 0
+    bytes_done = 0
+    purged = 0
+    last_report = time.monotonic()
+    for batch, manifest, plan in plans:
+        failed = 0
+        for path, is_dir, size in plan:
+            if failed and path == manifest:
+                break
+            if stop is not None and stop.is_set():
+                yield {
+                    "type": "done",
+                    "batches": purged,
+                    "files_done": files_done,
+                    "bytes_done": bytes_done,
+                }
+                return
+            ops.consume()
+            freed.consume(size)
+            try:
+                if is_dir:
+                    os.rmdir(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                yield {"type": "warning", "message": f"Cannot remove {path}: {e}"}
+                failed += 1
+                continue
+            if not is_dir:
+                files_done += 1
+                bytes_done += size
+
+            if time.monotonic() - last_report >= 1:
+                last_report = time.monotonic()
+                yield {
+                    "type": "progress",
+                    "files_done": files_done,
+                    "bytes_done": bytes_done,
+                    "files": files,
+                    "bytes": total_bytes,
+                }
+        if failed:
+            yield {"type": "partial", "batch": batch, "failed": failed}
+            continue
+        purged += 1
+        yield {"type": "purged", "batch": batch}
+
+    forget_quarantine_folder(completed_folder)
+
+    yield {
+        "type": "done",
+        "batches": purged,
+        "files_done": files_done,
+        "bytes_done": bytes_done,
+    }
+
+
+class Purger:
+    """Purge expired quarantine batches in a background thread
+
+    Runs iter_purge() on every folder of quarantine_folders() every
+    interval seconds (PURGE_INTERVAL by default) and passes its events to
+    on_event, from the purger thread.
+    """
+
+    def __init__(self, completed_folder, on_event=None, interval=None):
+        self.completed_folder = completed_folder
+        self.on_event = on_event
+        self.interval = PURGE_INTERVAL if interval is None else interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for folder in quarantine_folders(self.completed_folder):
+                if self._stop.is_set():
+                    return
+                try:
+                    for event in iter_purge(folder, stop=self._stop):
+                        if self.on_event:
+                            self.on_event(event)
+                except OSError as e:
+                    if self.on_event:
+                        self.on_event({"type": "warning", "message": str(e)})
+            self._stop.wait(self.interval)
+
+
+def main():
+    folders = quarantine_folders(os.getenv("COMPLETED_FOLDER"))
+    if not folders:
+        print("❌ COMPLETED_FOLDER environment variable is required")
+        return False
+    args = sys.argv[1:]
+
+    if "--restore" in args:
+        index = args.index("--restore") + 1
+        if index >= len(args) or args[index].startswith("--"):
+            print("❌ Usage: python quarantine.py --restore <batch>")
+            return False
+        batch = args[index]
+        folder = find_batch(folders, batch)
+        if folder is None:
+            print(f"❌ No quarantine batch {batch}")
+            return False
+        result = restore_batch(folder, batch)
+        print(f"✅ Restored {result['restored_count']} items from {batch}")
+        for message in result["error_messages"]:
+            print(f"❌ {message}")
+        return result["error_count"] == 0
+
+    if "--purge" in args or "--purge-all" in args:
+        for folder in folders:
+            for event in iter_purge(folder, everything="--purge-all" in args):
+                if event["type"] == "start" and event["batches"]:
+                    print(
+                        f"🧹 Purging {event['batches']} batches in {folder}: "
+                        f"{event['files']} files, {format_bytes(event['bytes'])}"
+                    )
+                elif event["type"] == "progress":
+                    print(
+                        f"   {event['files_done']}/{event['files']} files, "
+                        f"{format_bytes(event['bytes_done'])} freed"
+                    )
+                elif event["type"] == "purged":
+                    print(f"✅ Purged {event['batch']}")
+                elif event["type"] == "partial":
+                    print(
+                        f"⚠️ Kept {event['batch']}: {event['failed']} items "
+                        f"could not be removed, will retry"
+                    )
+                elif event["type"] == "warning":
+                    print(f"Warning: {event['message']}")
+        return True
+
+    batches = [(folder, batch) for folder in folders for batch in list_batches(folder)]
+    if not batches:
+        print("✅ Quarantine is empty")
+        return True
+    print(f"📦 {len(batches)} quarantine batches:")
+    for folder, batch in batches:
+        expires = time.strftime("%Y-%m-%d %H:%M", time.localtime(batch["expires"]))
+        print(
+            f"  {batch['batch']}: {len(batch['items'])} items in {folder}, "
+            f"purged after {expires}"
+        )
+    return True
+
+
+if __name__ == "__main__":
+    main()
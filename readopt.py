@@ -0,0 +1,387 @@
+import os
+import sys
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from qb_client import QBittorrentError, get_client
+from torrent_store import get_torrents, invalidate_torrents
+from orphan_scan import QB_PATH_MAP, map_qb_path, scan_orphans, torrent_content_path
+from extra_files import get_torrent_files, load_files_cache, save_files_cache
+from disk_usage import SIZE_WORKERS, iter_tree_stats
+from torrent_file import TORRENT_FOLDER, index_torrent_folder, read_torrent
+from piece_verify import verify_torrent
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Torrent fields the matcher reads
+TORRENT_FIELDS = ("name", "size", "save_path", "content_path", "state")
+
+# Pieces hashed per match when confirming it against qBittorrent's hashes
+READOPT_SAMPLE_PIECES = int(os.getenv("READOPT_SAMPLE_PIECES", "4"))
+
+
+def unmap_qb_path(path):
+    """Translate a local path into the path qBittorrent sees, see QB_PATH_MAP"""
+    return map_qb_path(path, [(local, remote) for remote, local in QB_PATH_MAP])
+
+
+def orphan_signature(path):
+    """Signature of an orphan and its {relative path: size} files
+
+    The signature is (total size, file count, sorted file sizes), so it
+    survives the files and folders being renamed.
+    """
+    files = {}
+    for file_path, st, is_dir in iter_tree_stats(path):
+        if not is_dir:
+            relative = os.path.relpath(file_path, path)
+            files[os.path.basename(path) if relative == "." else relative] = st.st_size
+    sizes = tuple(sorted(files.values()))
+    return (sum(sizes), len(sizes), sizes), files
+
+
+def torrent_signature(files):
+    """Same signature as orphan_signature() for a torrent's wanted files"""
+    sizes = tuple(sorted(size for _, size, priority in files if priority > 0))
+    return sum(sizes), len(sizes), sizes
+
+
+def torrent_root(files):
+    """Top-level folder shared by all of a torrent's files, or None"""
+    roots = {name.replace("\\", "/").split("/")[0] for name, _, _ in files}
+    if len(roots) == 1 and all("/" in name.replace("\\", "/") for name, _, _ in files):
+        return roots.pop()
+    return None
+
+
+def map_torrent_files(files, orphan_path, orphan_files):
+    """{torrent file name: local path} pairing a torrent's files with an orphan's
+
+    Files are paired by relative path when the orphan still has it with the
+    right size, otherwise by size when that size is unique on both sides.
+    """
+    root = torrent_root(files)
+    single = len(files) == 1 and root is None
+    mapping = {}
+    unmatched = []
+    for name, size, _ in files:
+        parts = name.replace("\\", "/").split("/")
+        relative = os.path.join(*parts[1:]) if root else os.path.join(*parts)
+        if single:
+            relative = os.path.basename(orphan_path)
+        if orphan_files.get(relative) == size:
+            mapping[name] = (
+                orphan_path if single else os.path.join(orphan_path, relative)
+            )
+        else:
+            unmatched.append((name, size))
+
+    taken = set(mapping.values())
+    by_size = {}
+    for relative, size in orphan_files.items():
+        path = os.path.join(orphan_path, relative)
+        if path not in taken:
+            by_size.setdefault(size, []).append(path)
+    sizes = [size for _, size in unmatched]
+    for name, size in unmatched:
+        if sizes.count(size) == 1 and len(by_size.get(size, ())) == 1:
+            mapping[name] = by_size[size][0]
+    return mapping
+
+
+def find_matches(client, orphan_paths, torrents):
+    """Match orphans to torrents with the same file size signature
+
+    Only torrents whose total size equals some orphan's are asked for
+    their file lists. Returns one dict per (orphan, torrent) pair with the
+    setLocation proposal: "location" (as qBittorrent sees it), "rename"
+    ((orphan, new path) when the orphan's name differs from the torrent's
+    root) and "duplicate" when the torrent's own data is still on disk, in
+    which case the orphan is a copy rather than the torrent's lost data.
+    An orphan or torrent may be part of several pairs, see split_ambiguous().
+    """
+    with ThreadPoolExecutor(max_workers=max(1, SIZE_WORKERS)) as executor:
+        signatures = dict(
+            zip(orphan_paths, executor.map(orphan_signature, orphan_paths))
+        )
+
+    totals = {signature[0] for signature, _ in signatures.values()}
+    candidates = [t for t in torrents if t.get("size") in totals]
+    cache = load_files_cache()
+    files, _ = get_torrent_files(client, candidates, cache)
+    save_files_cache(cache)
+
+    index = {}
+    for torrent in candidates:
+        index.setdefault(torrent_signature(files[torrent["hash"]]), []).append(torrent)
+
+    matches = []
+    for orphan_path, (signature, orphan_files) in signatures.items():
+        for torrent in index.get(signature, ()):
+            torrent_files = files[torrent["hash"]]
+            root = torrent_root(torrent_files)
+            if root is None and len(torrent_files) > 1:
+                # No root folder: the orphan folder itself is the save path
+                location = orphan_path
+                expected = None
+            else:
+                location = os.path.dirname(orphan_path)
+                expected = root or torrent_files[0][0].replace("\\", "/")
+                expected = os.path.join(location, expected)
+
+            rename = None
+            if expected and os.path.normpath(expected) != os.path.normpath(orphan_path):
+                rename = (orphan_path, expected)
+
+            content_path = torrent_content_path(torrent)
+            matches.append(
+                {
+                    "orphan": orphan_path,
+                    "hash": torrent["hash"],
+                    "torrent": torrent.get("name", ""),
+                    "location": unmap_qb_path(location),
+                    "rename": rename,
+                    "duplicate": bool(content_path)
+                    and os.path.exists(map_qb_path(content_path)),
+                    "files": map_torrent_files(
+                        torrent_files, orphan_path, orphan_files
+                    ),
+                    "layout": torrent_files,
+                }
+            )
+    return matches
+
+
+def split_ambiguous(matches):
+    """Split matches into (unique, ambiguous)
+
+    A match is unique when neither its orphan nor its torrent appears in
+    any other match. Applying more than one match for the same torrent or
+    orphan would move the torrent twice or rename an orphan already moved.
+    """
+    orphans = {}
+    torrents = {}
+    for match in matches:
+        orphans[match["orphan"]] = orphans.get(match["orphan"], 0) + 1
+        torrents[match["hash"]] = torrents.get(match["hash"], 0) + 1
+    unique = []
+    ambiguous = []
+    for match in matches:
+        if orphans[match["orphan"]] == 1 and torrents[match["hash"]] == 1:
+            unique.append(match)
+        else:
+            ambiguous.append(match)
+    return unique, ambiguous
+
+
+def read_span(ranges, offset, length):
+    """Read length bytes at offset of the torrent's concatenated files
+
+    ranges are (start, size, local path or None) in torrent order. Returns
+    None when part of the span has no local file.
+    """
+    data = bytearray()
+    end = offset + length
+    for start, size, path in ranges:
+        if start + size <= offset or start >= end:
+            continue
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            f.seek(max(offset - start, 0))
+            data += f.read(min(end, start + size) - max(offset, start))
+    return bytes(data)
+
+
+def verify_sample_pieces(client, match, samples=None):
+    """Hash a few pieces of the orphan and compare with qBittorrent's hashes
+
+    Returns True if every sampled piece matches, False on any mismatch and
+    None if nothing could be checked (e.g. a v2-only torrent, whose piece
+    hashes aren't SHA-1).
+    """
+    samples = READOPT_SAMPLE_PIECES if samples is None else samples
+    properties = client.get("torrents/properties", params={"hash": match["hash"]})
+    piece_size = properties.json()["piece_size"]
+    hashes = client.get("torrents/pieceHashes", params={"hash": match["hash"]}).json()
+    if not hashes or len(hashes[0]) != 40:
+        return None
+
+    ranges = []
+    offset = 0
+    for name, size, _ in match["layout"]:
+        ranges.append((offset, size, match["files"].get(name)))
+        offset += size
+    total = offset
+
+    # Spread the samples over the whole torrent
+    step = max(len(hashes) // max(samples, 1), 1)
+    checked = 0
+    spread = list(range(0, len(hashes), step))
+    # Fall back to the other pieces if sampled ones have no local data
+    for index in dict.fromkeys(spread + list(range(len(hashes)))):
+        if checked >= samples:
+            break
+        start = index * piece_size
+        try:
+            data = read_span(ranges, start, min(piece_size, total - start))
+        except OSError:
+            return False
+        if data is None:
+            continue
+        if hashlib.sha1(data).hexdigest() != hashes[index].lower():
+            return False
+        checked += 1
+    return True if checked else None
+
+
+def verify_with_torrent_file(path, match):
+    """Like verify_sample_pieces(), against an exported .torrent file
+
+    Needs no request to qBittorrent and also works for v2 torrents.
+    """
+    torrent = read_torrent(path)
+    result = verify_torrent(
+        torrent, match["orphan"], match["files"], quick=True, max_mismatches=1
+    )
+    if result["mismatched"]:
+        return False
+    return True if result["matched"] else None
+
+
+def apply_match(client, match):
+    """Point the torrent at the orphan's data and have qBittorrent recheck it
+
+    The orphan is renamed back if qBittorrent refuses the new location, so
+    a failed re-adoption leaves the data where it was found.
+    """
+    if match["rename"]:
+        source, target = match["rename"]
+        if os.path.lexists(target):
+            raise FileExistsError(f"{target} already exists")
+        os.rename(source, target)
+    try:
+        client.post(
+            "torrents/setLocation",
+            data={"hashes": match["hash"], "location": match["location"]},
+        )
+    except Exception:
+        if match["rename"]:
+            os.rename(target, source)
+        raise
+    client.post("torrents/recheck", data={"hashes": match["hash"]})
+
+
+def main(verify=None):
+    completed_folder = os.getenv("COMPLETED_FOLDER")
+    verify = "--verify" in sys.argv[1:] if verify is None else verify
+
+    try:
+        # Fetched first so the orphan scan reuses the same cached listing
+        torrents = get_torrents(TORRENT_FIELDS)
+    except QBittorrentError as e:
+        print(f"❌ {e}")
+        return False
+
+    orphan_paths = []
+    for event in scan_orphans(completed_folder):
+        if event["type"] == "error":
+            print(f"❌ {event['message']}")
+            return False
+        if event["type"] == "orphan":
+            category = event["category"]
+            folder = (
+                completed_folder
+                if category == "root"
+                else os.path.join(completed_folder, category)
+            )
+            orphan_paths.append(os.path.join(folder, event["name"]))
+
+    if not orphan_paths:
+        print("✅ No orphaned files found!")
+        return True
+
+    client = get_client()
+    try:
+        matches = find_matches(client, orphan_paths, torrents)
+    except QBittorrentError as e:
+        print(f"❌ {e}")
+        return False
+
+    matches, ambiguous = split_ambiguous(matches)
+    proposals = [m for m in matches if not m["duplicate"]]
+    duplicates = [m for m in matches if m["duplicate"]]
+    print(
+        f"🔍 {len(orphan_paths)} orphans, {len(proposals)} can be re-adopted, "
+        f"{len(duplicates)} are copies of torrents whose data is still in place"
+    )
+    for match in duplicates:
+        print(f"  📑 {match['orphan']} = copy of {match['torrent']}")
+    if ambiguous:
+        print(f"\n❔ Ambiguous matches, not re-adopted (same sizes as others):")
+        for match in ambiguous:
+            print(f"  {match['orphan']} ~ {match['torrent']}")
+
+    if verify:
+        # Prefer exported .torrent files, qBittorrent's piece hashes otherwise
+        torrent_files = {}
+        if TORRENT_FOLDER and proposals:
+            torrent_files, _ = index_torrent_folder()
+        for match in proposals:
+            try:
+                if match["hash"] in torrent_files:
+                    match["verified"] = verify_with_torrent_file(
+                        torrent_files[match["hash"]]["path"], match
+                    )
+                else:
+                    match["verified"] = verify_sample_pieces(client, match)
+            except (QBittorrentError, OSError, ValueError, KeyError):
+                match["verified"] = None
+        proposals = [m for m in proposals if m["verified"] is not False]
+
+    if not proposals:
+        print("✅ Nothing to re-adopt")
+        return True
+
+    print(f"\n♻️  Proposed relocations:")
+    for i, match in enumerate(proposals, 1):
+        note = {True: " ✅ pieces match", None: " (not verified)"}.get(
+            match.get("verified"), ""
+        )
+        print(f"  {i}. {match['torrent']}{note}")
+        print(f"     setLocation → {match['location']}")
+        if match["rename"]:
+            print(f"     rename {match['rename'][0]} → {match['rename'][1]}")
+
+    answer = input(f"\nRe-adopt {len(proposals)} torrents? (y/n): ").lower().strip()
+    if answer not in ["y", "yes"]:
+        print("❌ Operation cancelled by user")
+        return False
+
+    # The answer may have taken a while, skip torrents removed meanwhile
+    try:
+        hashes = [match["hash"] for match in proposals]
+        present = {t["hash"] for t in client.torrents_info(("hash",), hashes=hashes)}
+    except (QBittorrentError, ValueError) as e:
+        print(f"❌ {e}")
+        return False
+
+    errors = 0
+    for match in proposals:
+        if match["hash"] not in present:
+            print(f"❌ {match['torrent']} was removed from qBittorrent, skipped")
+            errors += 1
+            continue
+        try:
+            apply_match(client, match)
+            print(f"✅ {match['torrent']} now points at its data, rechecking")
+        except (QBittorrentError, OSError) as e:
+            print(f"❌ Could not re-adopt {match['torrent']}: {e}")
+            errors += 1
+    invalidate_torrents()
+    return errors == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,30 @@
 import os
-import requests
+import sys
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from orphan_scan import scan_orphans, split_orphans
+from extra_files import DEEP_SCAN, scan_orphans_deep
+from scan_roots import SCAN_ROOTS, scan_orphans_roots
+from disk_usage import (
+    LIBRARY_ROOTS,
+    SIZE_WORKERS,
+    build_inode_index,
+    cached_tree_usage,
+    format_bytes,
+    linked_from,
+    reclaimable_together,
+)
+from quarantine import (
+    DELETE_MODE,
+    QUARANTINE_RETENTION,
+    orphan_source,
+    quarantine_files,
+    quarantine_root,
+)
+import orphan_watch
+import readopt
+import incomplete_files
 
 # Load environment variables from .env file
 load_dotenv()
@@ -11,102 +34,41 @@ load_dotenv()
 
 def get_orphaned_torrents_data():
     """Get orphaned torrent files data without console interaction - for GUI use"""
-    # Get settings from environment
-    qb_url = os.getenv("QB_URL")
-    qb_user = os.getenv("QB_USER", "admin")
-    qb_pass = os.getenv("QB_PASS", "admin")
     completed_folder = os.getenv("COMPLETED_FOLDER")
-
-    # Validate required environment variables
-    if not qb_url:
-        return {"error": "QB_URL environment variable is required"}
-    if not completed_folder:
-        return {"error": "COMPLETED_FOLDER environment variable is required"}
+    orphans = []
 
     try:
-        # Login to qBittorrent Web API
-        s = requests.Session()
-        login_response = s.post(
-            f"{qb_url}/api/v2/auth/login",
-            data={"username": qb_user, "password": qb_pass},
-        )
-
-        if login_response.status_code != 200:
-            return {
-                "error": f"Failed to login to qBittorrent: {login_response.status_code}"
-            }
-
-        # Get list of torrents from qBittorrent
-        torrents_response = s.get(f"{qb_url}/api/v2/torrents/info")
-        if torrents_response.status_code != 200:
-            return {
-                "error": f"Failed to get torrents from qBittorrent: {torrents_response.status_code}"
-            }
-
-        torrents = torrents_response.json()
-        torrent_files = {os.path.basename(t["content_path"]) for t in torrents}
-
-        # Get files in Completed folder (including subdirectories for categories)
-        completed_items = {}
-        category_count = 0
-        total_items = 0
-
-        # Check if completed folder exists
-        if not os.path.exists(completed_folder):
-            return {"error": f"Completed folder not found: {completed_folder}"}
-
-        try:
-            folder_contents = os.listdir(completed_folder)
-        except PermissionError:
-            return {"error": f"Cannot access completed folder: {completed_folder}"}
-
-        for item in folder_contents:
-            item_path = os.path.join(completed_folder, item)
-            if os.path.isdir(item_path):
-                # This is a category folder, check inside it
-                category_count += 1
-                try:
-                    subitems = os.listdir(item_path)
-                    for subitem in subitems:
-                        completed_items[subitem] = item
-                        total_items += 1
-                except PermissionError:
-                    continue
-            else:
-                # This is a file in the root completed folder
-                completed_items[item] = "root"
-                total_items += 1
+        for event in scan_orphans(completed_folder):
+            if event["type"] == "error":
+                return {"error": event["message"]}
+            if event["type"] == "orphan":
+                orphans.append(event)
+    except Exception as e:
+        return {"error": f"Error getting orphaned torrents data: {e}"}
 
-        # Find orphaned files
-        orphans = set(completed_items.keys()) - torrent_files
+    if not orphans:
+        return {"orphans": [], "iso_orphans": [], "deletable_orphans": []}
 
-        if not orphans:
-            return {"orphans": [], "iso_orphans": [], "deletable_orphans": []}
-
-        # Categorize orphans
-        iso_orphans = []
-        deletable_orphans = []
+    # Categorize orphans
+    iso_orphans, deletable_orphans = split_orphans(orphans)
 
-        for orphan in sorted(orphans):
-            category = completed_items[orphan]
-            if category == "ISOs":
-                iso_orphans.append((orphan, category))
-            else:
-                deletable_orphans.append((orphan, category))
+    return {
+        "orphans": [orphan["name"] for orphan in orphans],
+        "iso_orphans": iso_orphans,
+        "deletable_orphans": deletable_orphans,
+        "completed_folder": completed_folder,
+    }
 
-        return {
-            "orphans": list(orphans),
-            "iso_orphans": iso_orphans,
-            "deletable_orphans": deletable_orphans,
-            "completed_folder": completed_folder,
-        }
 
-    except Exception as e:
-        return {"error": f"Error getting orphaned torrents data: {e}"}
+def delete_selected_files(files_to_delete, completed_folder, mode=None):
+    """Delete the selected orphaned files
 
+    With mode "quarantine" (DELETE_MODE by default) the files are moved to
+    the quarantine folder instead, see quarantine.py.
+    """
+    if (DELETE_MODE if mode is None else mode) == "quarantine":
+        return quarantine_files(files_to_delete, completed_folder)
 
-def delete_selected_files(files_to_delete, completed_folder):
-    """Delete the selected orphaned files"""
     deleted_count = 0
     error_count = 0
     error_messages = []
@@ -139,113 +101,181 @@ def delete_selected_files(files_to_delete, completed_folder):
     }
 
 
-def remove_orphaned_torrents():
-    """Remove orphaned torrent files that are no longer in qBittorrent"""
-    # Get settings from environment
-    qb_url = os.getenv("QB_URL")
-    qb_user = os.getenv("QB_USER", "admin")
-    qb_pass = os.getenv("QB_PASS", "admin")
-    completed_folder = os.getenv("COMPLETED_FOLDER")
+def measure_orphans(orphans, completed_folder):
+    """{(orphan, category): tree_usage()} for (orphan, category) pairs"""
 
-    # Validate required environment variables
-    if not qb_url:
-        print("❌ QB_URL environment variable is required")
-        return False
-    if not completed_folder:
-        print("❌ COMPLETED_FOLDER environment variable is required")
-        return False
+    def measure(entry):
+        path = orphan_source(completed_folder, *entry)
+        try:
+            return entry, cached_tree_usage(path)
+        except OSError:
+            return entry, None
 
-    try:
-        # Login to qBittorrent Web API
-        s = requests.Session()
-        login_response = s.post(
-            f"{qb_url}/api/v2/auth/login",
-            data={"username": qb_user, "password": qb_pass},
-        )
+    with ThreadPoolExecutor(max_workers=max(1, SIZE_WORKERS)) as executor:
+        return {
+            entry: usage
+            for entry, usage in executor.map(measure, orphans)
+            if usage is not None
+        }
 
-        if login_response.status_code != 200:
-            print(f"❌ Failed to login to qBittorrent: {login_response.status_code}")
-            return False
 
-        # Get list of torrents from qBittorrent
-        torrents_response = s.get(f"{qb_url}/api/v2/torrents/info")
-        if torrents_response.status_code != 200:
+def split_hardlinked(orphans, usages):
+    """Split off orphans that deleting would free (next to) nothing of
+
+    Their data is still hardlinked from elsewhere, e.g. a media library.
+    Returns (linked, others).
+    """
+    linked = []
+    others = []
+    for entry in orphans:
+        usage = usages.get(entry)
+        if usage and usage["reclaimable"] * 100 < usage["allocated"]:
+            linked.append(entry)
+        else:
+            others.append(entry)
+    return linked, others
+
+
+def remove_orphaned_torrents(use_index=None, deep=None, roots=None):
+    """Remove orphaned torrent files that are no longer in qBittorrent
+
+    With deep (DEEP_SCAN by default) stray files inside the folders of
+    torrents qBittorrent still has are offered for deletion too. With roots
+    (SCAN_ROOTS=auto by default) every folder qBittorrent saves to is
+    scanned instead of COMPLETED_FOLDER. The two can't be combined.
+    """
+    if roots is None:
+        roots = SCAN_ROOTS == "auto"
+    if deep is None:
+        deep = DEEP_SCAN
+    if roots:
+        if deep:
             print(
-                f"❌ Failed to get torrents from qBittorrent: {torrents_response.status_code}"
+                "❌ The deep scan only covers COMPLETED_FOLDER, it can't be "
+                "combined with scanning every folder (--all-roots, SCAN_ROOTS=auto)"
             )
             return False
+        return remove_orphaned_from_roots(use_index)
 
-        torrents = torrents_response.json()
-        torrent_files = {os.path.basename(t["content_path"]) for t in torrents}
+    completed_folder = os.getenv("COMPLETED_FOLDER")
+    scan = scan_orphans_deep if deep else scan_orphans
+    orphans = []
 
-        # Get files in Completed folder (including subdirectories for categories)
-        completed_items = {}  # Changed to dict to track which folder each item is in
-        category_count = 0
-        total_items = 0
+    try:
+        for event in scan(completed_folder, use_index):
+            if event["type"] == "error":
+                print(f"❌ {event['message']}")
+                return False
+            elif event["type"] == "warning":
+                print(f"Warning: {event['message']}")
+            elif event["type"] == "torrents":
+                torrent_count = event["count"]
+                torrent_sample = event["sample"]
+            elif event["type"] == "index":
+                print(
+                    f"Index updated in {event['seconds']:.2f}s "
+                    f"({event['listed']} of {event['checked']} folders re-listed)"
+                )
+            elif event["type"] == "deep":
+                print(
+                    f"Checking {event['torrents']} torrent folders for extra files "
+                    f"({event['fetched']} file lists fetched)"
+                )
+            elif event["type"] == "category":
+                print(
+                    f"Category '{event['category']}': {event['items']} items "
+                    f"({event['seconds']:.2f}s)"
+                )
+            elif event["type"] == "orphan":
+                orphans.append(event)
+            elif event["type"] == "done":
+                print(
+                    f"Scanned {event['category_count']} category folders, found {event['total_items']} total items"
+                )
+
+                # Debug information
+                print(f"Found {torrent_count} torrents in qBittorrent")
+                print(f"Torrent files: {torrent_sample}...")  # Show first 5
+                print()
 
-        # Check if completed folder exists
-        if not os.path.exists(completed_folder):
-            print(f"❌ Completed folder not found: {completed_folder}")
-            return False
+        if not orphans:
+            print("✅ No orphaned files found!")
+            return True
 
-        try:
-            folder_contents = os.listdir(completed_folder)
-        except PermissionError:
-            print(f"❌ Cannot access completed folder: {completed_folder}")
-            return False
+        return review_orphans(orphans, completed_folder)
 
-        for item in folder_contents:
-            item_path = os.path.join(completed_folder, item)
-            if os.path.isdir(item_path):
-                # This is a category folder, check inside it
-                category_count += 1
-                try:
-                    subitems = os.listdir(item_path)
-                    print(f"Category '{item}': {len(subitems)} items")
-                    for subitem in subitems:
-                        completed_items[subitem] = (
-                            item  # Track which category folder it's in
-                        )
-                        total_items += 1
-                except PermissionError:
-                    print(f"Warning: Cannot access {item_path}")
-            else:
-                # This is a file in the root completed folder
-                completed_items[item] = "root"
-                total_items += 1
+    except Exception as e:
+        print(f"❌ Error removing orphaned torrents: {e}")
+        return False
 
-        print(
-            f"Scanned {category_count} category folders, found {total_items} total items"
-        )
 
-        # Debug information
-        print(f"Found {len(torrents)} torrents in qBittorrent")
-        print(f"Found {len(completed_items)} items in completed folder")
-        print(f"Torrent files: {sorted(list(torrent_files))[:5]}...")  # Show first 5
-        print(
-            f"Completed items: {sorted(list(completed_items.keys()))[:5]}..."
-        )  # Show first 5
-        print()
+def remove_orphaned_from_roots(use_index=None):
+    """remove_orphaned_torrents() for every folder qBittorrent saves to
 
-        # Find orphaned files
-        orphans = set(completed_items.keys()) - torrent_files
+    Roots are discovered from qBittorrent and scanned concurrently per
+    device (see scan_roots.py), then reviewed one root at a time.
+    """
+    by_root = {}
 
-        if not orphans:
+    try:
+        for event in scan_orphans_roots(use_index):
+            if event["type"] == "error" and "root" not in event:
+                print(f"❌ {event['message']}")
+                return False
+            elif event["type"] in ("error", "warning"):
+                print(f"Warning: {event['message']}")
+            elif event["type"] == "torrents":
+                print(f"Found {event['count']} torrents in qBittorrent")
+            elif event["type"] == "roots":
+                devices = len({root["device"] for root in event["roots"]})
+                print(
+                    f"📂 Scanning {len(event['roots'])} folders on {devices} devices:"
+                )
+                for root in event["roots"]:
+                    print(f"   {root['path']} ({', '.join(root['sources'])})")
+            elif event["type"] == "orphan":
+                by_root.setdefault(event["root"], []).append(event)
+            elif event["type"] == "done":
+                print(
+                    f"Scanned {event['root']}: {event['category_count']} category "
+                    f"folders, {event['total_items']} items"
+                )
+
+        if not by_root:
             print("✅ No orphaned files found!")
             return True
 
+        success = True
+        for root, orphans in sorted(by_root.items()):
+            print(f"\n📂 {root}")
+            success = review_orphans(orphans, root) and success
+        return success
+
+    except Exception as e:
+        print(f"❌ Error removing orphaned torrents: {e}")
+        return False
+
+
+def review_orphans(orphans, completed_folder):
+    """Show orphans found under completed_folder and delete the ones confirmed"""
+    try:
         print(f"\n🔍 Found {len(orphans)} orphaned files:")
 
         # Categorize orphans
-        iso_orphans = []
-        deletable_orphans = []
-
-        for orphan in sorted(orphans):
-            category = completed_items[orphan]
-            if category == "ISOs":
-                iso_orphans.append((orphan, category))
-            else:
-                deletable_orphans.append((orphan, category))
+        iso_orphans, deletable_orphans = split_orphans(orphans)
+        usages = measure_orphans(deletable_orphans, completed_folder)
+        linked_orphans, deletable_orphans = split_hardlinked(deletable_orphans, usages)
+
+        def size_note(entry):
+            usage = usages.get(entry)
+            if usage is None:
+                return ""
+            if usage["shared"]:
+                return (
+                    f" - frees {format_bytes(usage['reclaimable'])} of "
+                    f"{format_bytes(usage['allocated'])}, partly hardlinked"
+                )
+            return f" - {format_bytes(usage['reclaimable'])}"
 
         # Show ISO files (excluded by default)
         if iso_orphans:
@@ -253,13 +283,32 @@ def remove_orphaned_torrents():
             for i, (orphan, category) in enumerate(iso_orphans, 1):
                 print(f"  {i}. {orphan} (in {category})")
 
+        # Show orphans whose data lives on through hardlinks (excluded)
+        if linked_orphans:
+            inode_index = build_inode_index([completed_folder] + LIBRARY_ROOTS)
+            print(
+                f"\n🔗 Still hardlinked elsewhere, deleting frees nothing (excluded):"
+            )
+            for i, (orphan, category) in enumerate(linked_orphans, 1):
+                print(f"  {i}. {orphan} (in {category})")
+                path = orphan_source(completed_folder, orphan, category)
+                others = linked_from(path, usages[(orphan, category)], inode_index)
+                for other in others[:3]:
+                    print(f"       ↳ {other}")
+                if len(others) > 3:
+                    print(f"       ↳ ... and {len(others) - 3} more")
+
         # Show deletable orphans
         if deletable_orphans:
             print(f"\n🗑️  Files available for deletion:")
             for i, (orphan, category) in enumerate(deletable_orphans, 1):
-                print(f"  {i}. {orphan} (in {category})")
+                print(f"  {i}. {orphan} (in {category}){size_note((orphan, category))}")
+            reclaim = reclaimable_together(
+                usages[entry] for entry in deletable_orphans if entry in usages
+            )
+            print(f"\n💾 Deleting all of them frees {format_bytes(reclaim)}")
         else:
-            print("\n✅ No deletable orphaned files found (only ISOs)!")
+            print("\n✅ No deletable orphaned files found (only ISOs or hardlinks)!")
             return True
 
         # Get user confirmation and selection
@@ -279,7 +328,10 @@ def get_user_confirmation(deletable_orphans, completed_folder):
     if not deletable_orphans:
         return False
 
-    print(f"\n⚠️  WARNING: This will permanently delete the selected files from:")
+    if DELETE_MODE == "quarantine":
+        print(f"\n📦 The selected files will be moved to quarantine from:")
+    else:
+        print(f"\n⚠️  WARNING: This will permanently delete the selected files from:")
     print(f"   {completed_folder}")
 
     # Ask if user wants to proceed
@@ -362,6 +414,9 @@ def get_user_confirmation(deletable_orphans, completed_folder):
 
 def delete_files(files_to_delete, completed_folder):
     """Delete the selected orphaned files"""
+    if DELETE_MODE == "quarantine":
+        return quarantine_selected(files_to_delete, completed_folder)
+
     deleted_count = 0
     error_count = 0
 
@@ -397,8 +452,45 @@ def delete_files(files_to_delete, completed_folder):
     return error_count == 0
 
 
+def quarantine_selected(files_to_quarantine, completed_folder):
+    """Move the selected orphaned files to the quarantine folder"""
+    print(f"\n📦 Moving {len(files_to_quarantine)} files to quarantine...")
+    result = quarantine_files(files_to_quarantine, completed_folder)
+    for message in result["error_messages"]:
+        print(f"❌ {message}")
+
+    days = QUARANTINE_RETENTION / 86400
+    print(f"\n📊 Quarantine Summary:")
+    print(f"   ✅ Moved to quarantine: {result['deleted_count']} files")
+    if result["error_count"] > 0:
+        print(f"   ❌ Errors: {result['error_count']} files")
+    if result["batch"]:
+        print(
+            f"   📁 {os.path.join(quarantine_root(completed_folder), result['batch'])}"
+        )
+        print(
+            f"   ⏳ Purged after {days:g} days, undo with: "
+            f"python quarantine.py --restore {result['batch']}"
+        )
+
+    return result["error_count"] == 0
+
+
 def main():
-    remove_orphaned_torrents()
+    if "--watch" in sys.argv[1:]:
+        orphan_watch.main()
+        return
+    if "--readopt" in sys.argv[1:]:
+        readopt.main()
+        return
+    if "--incomplete" in sys.argv[1:]:
+        incomplete_files.main()
+        return
+    remove_orphaned_torrents(
+        use_index=True if "--index" in sys.argv[1:] else None,
+        deep=True if "--deep" in sys.argv[1:] else None,
+        roots=True if "--all-roots" in sys.argv[1:] else None,
+    )
 
 
 if __name__ == "__main__":
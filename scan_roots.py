@@ -0,0 +1,233 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from qb_client import QBittorrentError, get_client
+from torrent_store import get_torrents
+from fs_index import FsIndex
+from orphan_scan import (
+    FS_INDEX,
+    TORRENT_FIELDS,
+    ContentPathIndex,
+    fetch_folder_files,
+    iter_orphan_scan,
+    list_directory,
+    map_qb_path,
+    normalize_path,
+    torrent_content_path,
+    torrent_paths,
+)
+from extra_files import INCOMPLETE_EXT
+
+# Load environment variables from .env file
+load_dotenv()
+
+# "auto" scans every folder qBittorrent saves to instead of only COMPLETED_FOLDER
+SCAN_ROOTS = os.getenv("SCAN_ROOTS", "")
+
+
+def resolve_qb_path(path, default):
+    # qBittorrent resolves relative category paths against the default save path
+    if path.startswith(("/", "\\")) or path[1:3] in (":\\", ":/"):
+        return path
+    return default.rstrip("/\\") + "/" + path
+
+
+def root_sources(client, torrents):
+    """(path as qBittorrent sees it, source) for every folder it saves to
+
+    Sources are the default save path, the temp path (when enabled), every
+    category's save path and the distinct save paths of torrents.
+    """
+    preferences = client.get("app/preferences").json()
+    default = preferences.get("save_path", "")
+    sources = [(default, "default save path")]
+    if preferences.get("temp_path_enabled") and preferences.get("temp_path"):
+        sources.append(
+            (resolve_qb_path(preferences["temp_path"], default), "temp path")
+        )
+
+    for name, category in client.get("torrents/categories").json().items():
+        # Categories without a save path use a subfolder of the default one
+        path = category.get("savePath") or name
+        sources.append((resolve_qb_path(path, default), f"category {name}"))
+
+    for save_path in sorted({t.get("save_path") for t in torrents} - {None, ""}):
+        sources.append((save_path, "torrent save path"))
+    return sources
+
+
+def merge_roots(sources):
+    """Local scan roots for (qBittorrent path, source) pairs
+
+    Paths are mapped with QB_PATH_MAP and roots nested in another root are
+    folded into it, so no folder is scanned twice. Returns (roots,
+    warnings) where roots are {"path", "sources", "device"} dicts sorted by
+    path.
+    """
+    paths = {}
+    warnings = []
+    for qb_path, source in sources:
+        if not qb_path:
+            continue
+        path = os.path.abspath(map_qb_path(qb_path))
+        key = normalize_path(path)
+        if key not in paths:
+            paths[key] = {"path": path, "sources": []}
+        if source not in paths[key]["sources"]:
+            paths[key]["sources"].append(source)
+
+    roots = []
+    for key in sorted(paths):
+        root = paths[key]
+        if os.path.dirname(key) == key:
+            warnings.append(f"Not scanning filesystem root {root['path']}")
+            continue
+        if not os.path.isdir(root["path"]):
+            warnings.append(
+                f"{root['path']} ({', '.join(root['sources'])}) not found, set "
+                "QB_PATH_MAP if qBittorrent sees it under a different path"
+            )
+            continue
+        # Sorted order puts every root before the roots nested inside it
+        parent = next(
+            (r for r in roots if key.startswith(os.path.join(r["key"], ""))), None
+        )
+        if parent:
+            parent["sources"] += [
+                s for s in root["sources"] if s not in parent["sources"]
+            ]
+            continue
+        roots.append({"key": key, **root})
+
+    for root in roots:
+        del root["key"]
+        root["device"] = os.stat(root["path"]).st_dev
+    return roots, warnings
+
+
+def incomplete_index(torrents, roots):
+    """ContentPathIndex of every torrent's content, with and without .!qB
+
+    qBittorrent reports a downloading file's final name as its content
+    path while the file on disk still carries the INCOMPLETE_EXT suffix.
+    Torrents whose content path is a whole folder under or above roots
+    (see is_whole_folder()) are indexed by their file lists.
+    """
+    roots = [root["path"] for root in roots]
+    files = fetch_folder_files(torrents, roots)
+    paths = torrent_paths(torrents, files, roots)
+    return ContentPathIndex(paths + [path + INCOMPLETE_EXT for path in paths])
+
+
+def iter_root_scans(roots, index, use_index=None, stop=None, completed_folder=None):
+    """Scan several roots for orphans, one worker group per device
+
+    Roots on the same device are scanned one after the other, so a disk
+    never serves two scans at once, while different devices work in
+    parallel. Yields {"type": "root", ...root} when a root's scan starts,
+    then iter_orphan_scan()'s events for it, each with a "root" key.
+    Only the root that is completed_folder has category folders, orphaned
+    folders in other roots are reported whole. Setting stop (or closing
+    the generator) ends the scan early.
+    """
+    use_index = FS_INDEX if use_index is None else use_index
+    if completed_folder:
+        completed_folder = normalize_path(os.path.abspath(completed_folder))
+    stop = stop or threading.Event()
+    by_device = {}
+    for root in roots:
+        by_device.setdefault(root["device"], []).append(root)
+    events = queue.Queue()
+    # Roots share one index database, which takes one writer at a time
+    refresh_lock = threading.Lock()
+
+    def scan_device(device_roots):
+        try:
+            for root in device_roots:
+                if stop.is_set():
+                    return
+                events.put({"type": "root", **root})
+                fs_index = FsIndex(root["path"]) if use_index else None
+                try:
+                    lister = list_directory
+                    if fs_index:
+                        with refresh_lock:
+                            stats = fs_index.refresh()
+                        events.put({"type": "index", "root": root["path"], **stats})
+                        lister = fs_index.list_directory
+                    scan = iter_orphan_scan(
+                        root["path"],
+                        index,
+                        lister=lister,
+                        categories=normalize_path(root["path"]) == completed_folder,
+                    )
+                    for event in scan:
+                        if stop.is_set():
+                            scan.close()
+                            return
+                        events.put({**event, "root": root["path"]})
+                finally:
+                    if fs_index:
+                        fs_index.close()
+        except Exception as e:
+            events.put({"type": "warning", "message": f"Scan failed: {e}"})
+        finally:
+            events.put(None)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(by_device)))
+    try:
+        for device_roots in by_device.values():
+            executor.submit(scan_device, device_roots)
+        running = len(by_device)
+        while running:
+            event = events.get()
+            if event is None:
+                running -= 1
+            else:
+                yield event
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+def scan_orphans_roots(use_index=None):
+    """scan_orphans() over every folder qBittorrent saves to
+
+    Roots come from root_sources() and merge_roots(). Yields the
+    "torrents" event of scan_orphans(), {"type": "roots", "roots": [...]}
+    once they are known, then the events of iter_root_scans().
+    """
+    if not os.getenv("QB_URL"):
+        yield {"type": "error", "message": "QB_URL environment variable is required"}
+        return
+
+    try:
+        torrents = get_torrents(TORRENT_FIELDS)
+        sources = root_sources(get_client(), torrents)
+    except (QBittorrentError, ValueError) as e:
+        yield {"type": "error", "message": str(e)}
+        return
+
+    paths = sorted(p for p in map(torrent_content_path, torrents) if p)
+    yield {"type": "torrents", "count": len(torrents), "sample": paths[:5]}
+
+    roots, warnings = merge_roots(sources)
+    for message in warnings:
+        yield {"type": "warning", "message": message}
+    if not roots:
+        yield {"type": "error", "message": "No folder qBittorrent saves to was found"}
+        return
+    yield {"type": "roots", "roots": roots}
+
+    # Roots come from qBittorrent's own paths, so full paths always match.
+    # The temp path is among them, where downloads still end in .!qB
+    try:
+        index = incomplete_index(torrents, roots)
+    except (QBittorrentError, ValueError) as e:
+        yield {"type": "error", "message": str(e)}
+        return
+    yield from iter_root_scans(
+        roots, index, use_index, completed_folder=os.getenv("COMPLETED_FOLDER")
+    )
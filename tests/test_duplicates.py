@@ -0,0 +1,22 @@
+import os
+from disk_usage import allocated_size
+from duplicates import iter_duplicates
+
+
+def test_copies_linked_elsewhere_are_not_reclaimable(tmp_path):
+    root = tmp_path / "completed"
+    root.mkdir()
+    for name in ["a.mkv", "b.mkv", "c.mkv", "d.mkv", "e.mkv"]:
+        (root / name).write_bytes(b"x" * 8192)
+    # c.mkv and e.mkv are also linked from a library outside the scan
+    (tmp_path / "library").mkdir()
+    os.link(root / "c.mkv", tmp_path / "library" / "c.mkv")
+    os.link(root / "e.mkv", tmp_path / "library" / "e.mkv")
+
+    events = list(iter_duplicates([str(root)], workers=1, min_size=1))
+    size = allocated_size(os.stat(root / "a.mkv"))
+    (group,) = [e for e in events if e["type"] == "duplicate"]
+    assert len(group["paths"]) == 5
+    # Keeping c.mkv frees a, b and d, replacing e frees nothing
+    assert group["reclaimable"] == 3 * size
+    assert events[-1] == {"type": "done", "groups": 1, "reclaimable": 3 * size}
@@ -0,0 +1,41 @@
+import os
+from fs_index import FsIndex
+from orphan_scan import list_directory
+
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("x" * size)
+
+
+def test_nested_root_gets_its_own_categories(tmp_path):
+    root = tmp_path / "data"
+    write(root / "TV" / "Show" / "S01" / "e1.mkv", 10)
+    write(root / "TV" / "loose.mkv", 3)
+    write(root / "Movies" / "Film" / "f.mkv", 5)
+    db = str(tmp_path / "index.sqlite3")
+
+    parent = FsIndex(root, db)
+    parent.refresh()
+    assert parent.category_totals() == {"TV": 13, "Movies": 5}
+
+    nested = FsIndex(root / "TV", db)
+    nested.refresh()
+    assert nested.category_totals() == {"Show": 10, "root": 3}
+    assert parent.category_totals() == {"TV": 13, "Movies": 5}
+
+
+def test_symlinks_are_followed_like_the_disk_lister(tmp_path):
+    root = tmp_path / "data"
+    write(tmp_path / "elsewhere" / "Film" / "f.mkv", 7)
+    write(root / "Movies" / "m.mkv", 5)
+    os.symlink(tmp_path / "elsewhere" / "Film", root / "Movies" / "Film")
+    os.symlink(root, root / "Movies" / "loop")
+
+    index = FsIndex(root, str(tmp_path / "index.sqlite3"))
+    index.refresh()
+    movies = str(root / "Movies")
+    assert sorted(index.list_directory(movies)[0]) == sorted(list_directory(movies)[0])
+    assert index.list_directory(os.path.join(movies, "Film"))[0] == [("f.mkv", False)]
+    assert index.category_totals() == {"Movies": 12}
@@ -0,0 +1,32 @@
+from generate_report import StatisticsAggregator
+
+
+def torrent(torrent_hash, size, state="uploading", category="Movies"):
+    return {
+        "hash": torrent_hash,
+        "state": state,
+        "category": category,
+        "size": size,
+        "downloaded": size,
+        "uploaded": 0,
+        "upspeed": 0,
+        "dlspeed": 0,
+    }
+
+
+def test_updates_and_removals_match_a_fresh_pass():
+    torrents = {h: torrent(h, size) for h, size in zip("abcdef", range(10, 70, 10))}
+    stats = StatisticsAggregator(top_n=2).feed(list(torrents.values()))
+    assert [t["hash"] for _, t in stats.top("largest")] == ["f", "e"]
+
+    stats.remove("f")
+    del torrents["f"]
+    torrents["a"] = torrent("a", 100, state="pausedUP", category="TV")
+    stats.add(torrents["a"])
+
+    fresh = StatisticsAggregator(top_n=2).feed(
+        [torrents[h] for h in "bcdea"]  # updated torrents count as added last
+    )
+    assert stats.result() == fresh.result()
+    assert [t["hash"] for _, t in stats.top("largest")] == ["a", "e"]
+    assert stats.categories == {"Movies": 4, "TV": 1}
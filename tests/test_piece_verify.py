@@ -0,0 +1,68 @@
+import hashlib
+from piece_verify import verify_torrent
+from torrent_file import read_torrent
+
+PIECE_LENGTH = 16384
+
+
+def bencode(value):
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, list):
+        return b"l" + b"".join(map(bencode, value)) + b"e"
+    keys = sorted(value, key=str.encode)
+    return b"d" + b"".join(bencode(k) + bencode(value[k]) for k in keys) + b"e"
+
+
+def make_torrent(tmp_path, files):
+    """Write a multi-file v1 torrent and its data below tmp_path"""
+    blob = b"".join(data for _, data in files)
+    pieces = b"".join(
+        hashlib.sha1(blob[i : i + PIECE_LENGTH]).digest()
+        for i in range(0, len(blob), PIECE_LENGTH)
+    )
+    info = {
+        "name": "Pack",
+        "piece length": PIECE_LENGTH,
+        "pieces": pieces,
+        "files": [
+            {"length": len(data), "path": path.split("/")} for path, data in files
+        ],
+    }
+    content = tmp_path / "Pack"
+    for path, data in files:
+        (content / path).parent.mkdir(parents=True, exist_ok=True)
+        (content / path).write_bytes(data)
+    torrent = tmp_path / "pack.torrent"
+    torrent.write_bytes(bencode({"announce": "http://tracker/announce", "info": info}))
+    return read_torrent(str(torrent)), str(content)
+
+
+FILES = [
+    ("a.bin", bytes(range(256)) * 100),
+    ("empty.txt", b""),
+    ("sub/b.bin", b"b" * 30000),
+]
+
+
+def test_intact_data_matches_every_piece(tmp_path):
+    torrent, content = make_torrent(tmp_path, FILES)
+    result = verify_torrent(torrent, content, workers=1)
+    assert result["checked"] == 4
+    assert result["matched"] == 4
+    assert result["bad_files"] == []
+
+
+def test_damaged_and_missing_files_are_reported(tmp_path):
+    torrent, content = make_torrent(tmp_path, FILES)
+    with open(tmp_path / "Pack" / "a.bin", "r+b") as f:
+        f.write(b"corrupt")
+    (tmp_path / "Pack" / "sub" / "b.bin").unlink()
+    result = verify_torrent(torrent, content, workers=1)
+    assert result["mismatched"] == 1
+    assert result["missing"] == 3
+    assert result["bad_files"] == ["Pack/a.bin", "Pack/sub/b.bin"]
@@ -0,0 +1,45 @@
+import os
+import quarantine
+
+
+def quarantine_tree(tmp_path, monkeypatch, names):
+    monkeypatch.setattr(
+        quarantine, "QUARANTINE_REGISTRY", str(tmp_path / "registry.json")
+    )
+    folder = tmp_path / "downloads"
+    for name in names:
+        os.makedirs(folder / name)
+        (folder / name / "a.mkv").write_text("x")
+        (folder / name / "b.mkv").write_text("x")
+    result = quarantine.quarantine_files([(name, "root") for name in names], folder)
+    return str(folder), result["batch"]
+
+
+def purge(folder):
+    return list(quarantine.iter_purge(folder, everything=True, ops_per_second=0))
+
+
+def test_failed_removal_keeps_batch_for_retry(tmp_path, monkeypatch):
+    folder, batch = quarantine_tree(tmp_path, monkeypatch, ["Old"])
+    assert quarantine.quarantine_folders() == [folder]
+
+    remove = os.remove
+
+    def stuck(path):
+        if path.endswith("b.mkv"):
+            raise PermissionError("busy")
+        remove(path)
+
+    monkeypatch.setattr(quarantine.os, "remove", stuck)
+    events = purge(folder)
+    assert [e["batch"] for e in events if e["type"] == "partial"] == [batch]
+    assert not [e for e in events if e["type"] == "purged"]
+    assert events[-1]["batches"] == 0
+    assert [b["batch"] for b in quarantine.list_batches(folder)] == [batch]
+    assert quarantine.quarantine_folders() == [folder]
+
+    monkeypatch.setattr(quarantine.os, "remove", remove)
+    events = purge(folder)
+    assert {"type": "purged", "batch": batch} in events
+    assert quarantine.list_batches(folder) == []
+    assert quarantine.quarantine_folders() == []
@@ -0,0 +1,39 @@
+import pytest
+from qb_client import QBittorrentError
+from readopt import apply_match
+
+
+class Client:
+    def __init__(self, fail):
+        self.fail = fail
+        self.posts = []
+
+    def post(self, path, data=None):
+        if path == self.fail:
+            raise QBittorrentError(f"{path} failed")
+        self.posts.append(path)
+
+
+def match(tmp_path):
+    (tmp_path / "Old.Name").mkdir()
+    return {
+        "torrent": "New.Name",
+        "hash": "abc",
+        "location": str(tmp_path),
+        "rename": (str(tmp_path / "Old.Name"), str(tmp_path / "New.Name")),
+    }
+
+
+def test_rename_is_undone_when_set_location_fails(tmp_path):
+    client = Client("torrents/setLocation")
+    with pytest.raises(QBittorrentError):
+        apply_match(client, match(tmp_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["Old.Name"]
+    assert client.posts == []
+
+
+def test_rename_is_kept_once_the_location_is_set(tmp_path):
+    client = Client(None)
+    apply_match(client, match(tmp_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["New.Name"]
+    assert client.posts == ["torrents/setLocation", "torrents/recheck"]
@@ -0,0 +1,58 @@
+import os
+import quarantine
+from orphan_scan import ContentPathIndex
+from scan_roots import iter_root_scans
+
+
+def make_tree(base, paths):
+    for path in paths:
+        full = os.path.join(base, path)
+        if path.endswith("/"):
+            os.makedirs(full, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, "w") as f:
+                f.write("x")
+
+
+def scan(root, content, completed_folder=None):
+    index = ContentPathIndex([os.path.join(root, path) for path in content])
+    roots = [{"path": str(root), "sources": [], "device": os.stat(root).st_dev}]
+    events = iter_root_scans(roots, index, False, completed_folder=completed_folder)
+    return sorted((e["category"], e["name"]) for e in events if e["type"] == "orphan")
+
+
+def test_save_path_reports_orphaned_folders_whole(tmp_path):
+    make_tree(
+        tmp_path,
+        [
+            "Movie1/a.mkv",
+            "OldMovie/b.mkv",
+            "OldMovie/Subs/en.srt",
+            "stray.nfo",
+            "sub/Movie2/c.mkv",
+            "sub/Old2/d.mkv",
+        ],
+    )
+    orphans = scan(tmp_path, ["Movie1", "sub/Movie2"])
+    assert orphans == [("root", "OldMovie"), ("root", "stray.nfo"), ("sub", "Old2")]
+
+
+def test_aborted_download_is_one_leftover(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        quarantine, "QUARANTINE_REGISTRY", str(tmp_path / "registry.json")
+    )
+    temp = tmp_path / "temp"
+    make_tree(temp, ["Show.S01/e1.mkv.!qB", "Show.S01/e2.mkv.!qB", "Live/x.!qB"])
+    leftovers = scan(temp, ["Live"])
+    assert leftovers == [("root", "Show.S01")]
+
+    result = quarantine.quarantine_files([("Show.S01", "root")], str(temp))
+    assert result["deleted_count"] == 1
+    assert sorted(os.listdir(temp)) == [".quarantine", "Live"]
+
+
+def test_completed_folder_keeps_categories(tmp_path):
+    make_tree(tmp_path, ["Movies/Movie1/a.mkv", "Movies/Old/b.mkv", "TV/"])
+    orphans = scan(tmp_path, ["Movies/Movie1"], completed_folder=str(tmp_path))
+    assert orphans == [("Movies", "Old")]
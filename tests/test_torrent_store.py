@@ -0,0 +1,30 @@
+import threading
+from torrent_store import SingleFlightCache
+
+
+def test_invalidate_detaches_a_load_in_progress():
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(None)
+        if len(calls) == 1:
+            release.wait(5)
+            return "old"
+        return "new"
+
+    cache = SingleFlightCache(loader, ttl=60)
+    results = []
+    early = threading.Thread(target=lambda: results.append(cache.get()))
+    early.start()
+    while not calls:
+        pass
+
+    # A caller that widened the fields must not join the old load
+    cache.invalidate()
+    assert cache.get() == "new"
+
+    release.set()
+    early.join()
+    assert results == ["old"]
+    assert cache.get() == "new"
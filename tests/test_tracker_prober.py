@@ -0,0 +1,105 @@
+import socket
+import struct
+import threading
+import time
+import http.server
+import pytest
+from tracker_prober import probe_tracker, probe_trackers
+
+TIMEOUT = 0.5
+
+
+class TrackerHandler(http.server.BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        TrackerHandler.requests.append(self.path)
+        if self.path.startswith("/slow"):
+            time.sleep(TIMEOUT * 3)
+        code = 503 if self.path.startswith("/dead") else 200
+        body = b"d14:failure reason17:missing info_hashe"
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def http_tracker():
+    TrackerHandler.requests = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), TrackerHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def udp_tracker():
+    """A BEP 15 tracker answering connect requests, and a silent port"""
+    live = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    live.bind(("127.0.0.1", 0))
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.1", 0))
+    requests = []
+
+    def serve():
+        while True:
+            try:
+                data, address = live.recvfrom(2048)
+            except OSError:
+                return
+            requests.append(data)
+            protocol_id, action, transaction_id = struct.unpack(">QII", data[:16])
+            if protocol_id == 0x41727101980 and action == 0:
+                live.sendto(struct.pack(">IIQ", 0, transaction_id, 1234), address)
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield (
+        f"udp://127.0.0.1:{live.getsockname()[1]}/announce",
+        f"udp://127.0.0.1:{silent.getsockname()[1]}/announce",
+        requests,
+    )
+    live.close()
+    silent.close()
+
+
+def test_http_live_and_dead(http_tracker):
+    assert probe_tracker(f"{http_tracker}/announce", TIMEOUT) is True
+    assert probe_tracker(f"{http_tracker}/dead/announce", TIMEOUT) is False
+    assert probe_tracker(f"{http_tracker}/slow/announce", TIMEOUT) is False
+
+
+def test_udp_live_and_dead(udp_tracker):
+    live, silent, requests = udp_tracker
+    assert probe_tracker(live, TIMEOUT) is True
+    assert len(requests) == 1
+    assert probe_tracker(silent, TIMEOUT) is False
+
+
+def test_unprobeable_scheme():
+    assert probe_tracker("wss://tracker.example/announce", TIMEOUT) is None
+
+
+def test_results_are_cached_for_ttl(http_tracker, udp_tracker, tmp_path):
+    live_udp, _, udp_requests = udp_tracker
+    urls = [f"{http_tracker}/announce", f"{http_tracker}/dead/announce", live_udp]
+    cache = str(tmp_path / "probe.json")
+
+    first = probe_trackers(urls, timeout=TIMEOUT, ttl=3600, cache_path=cache)
+    assert first == {urls[0]: True, urls[1]: False, live_udp: True}
+    http_count, udp_count = len(TrackerHandler.requests), len(udp_requests)
+
+    # Within the TTL nothing is probed again, dead results included
+    assert probe_trackers(urls, timeout=TIMEOUT, ttl=3600, cache_path=cache) == first
+    assert len(TrackerHandler.requests) == http_count
+    assert len(udp_requests) == udp_count
+
+    # ttl=0 ignores the cache
+    probe_trackers(urls, timeout=TIMEOUT, ttl=0, cache_path=cache)
+    assert len(TrackerHandler.requests) == http_count + 2
+    assert len(udp_requests) == udp_count + 1
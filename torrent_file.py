@@ -0,0 +1,316 @@
+import os
+import sys
+import mmap
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from disk_usage import format_bytes
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Folder of exported .torrent files (qBittorrent's "Copy .torrent files to")
+TORRENT_FOLDER = os.getenv("TORRENT_FOLDER", "")
+
+# Processes parsing .torrent files in parallel when indexing a folder
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 2)))
+
+# Byte strings at least this long are returned as memoryviews into the file
+# instead of being copied (the pieces blob, piece layers)
+ZERO_COPY_MIN = 1024
+
+# Deepest nesting accepted, real torrents stay far below it
+MAX_DEPTH = 256
+
+_INT, _LIST, _DICT, _END, _COLON = b"i"[0], b"l"[0], b"d"[0], b"e"[0], b":"[0]
+
+
+class BencodeError(ValueError):
+    """Raised for data that isn't valid bencode or isn't a valid torrent"""
+
+
+def _read_number(buf, pos, terminator):
+    # Integers and string lengths are short, so a byte-by-byte scan is fine
+    end = pos
+    limit = min(len(buf), pos + 32)
+    while end < limit and buf[end] != terminator:
+        end += 1
+    if end == limit:
+        raise BencodeError(f"Unterminated number at offset {pos}")
+    try:
+        return int(bytes(buf[pos:end])), end + 1
+    except ValueError:
+        raise BencodeError(f"Invalid number at offset {pos}") from None
+
+
+def _decode(buf, pos, depth, spans):
+    if depth > MAX_DEPTH:
+        raise BencodeError(f"Nesting deeper than {MAX_DEPTH} at offset {pos}")
+    kind = buf[pos]
+
+    if kind == _INT:
+        return _read_number(buf, pos + 1, _END)
+
+    if kind == _LIST:
+        items = []
+        pos += 1
+        while buf[pos] != _END:
+            item, pos = _decode(buf, pos, depth + 1, None)
+            items.append(item)
+        return items, pos + 1
+
+    if kind == _DICT:
+        items = {}
+        pos += 1
+        while buf[pos] != _END:
+            key, pos = _decode(buf, pos, depth + 1, None)
+            if not isinstance(key, (bytes, memoryview)):
+                raise BencodeError(f"Dictionary key is not a string at offset {pos}")
+            key = bytes(key)
+            start = pos
+            items[key], pos = _decode(buf, pos, depth + 1, None)
+            if spans is not None:
+                spans[key] = (start, pos)
+        return items, pos + 1
+
+    length, start = _read_number(buf, pos, _COLON)
+    end = start + length
+    if length < 0 or end > len(buf):
+        raise BencodeError(f"String at offset {pos} runs past the end of the data")
+    value = buf[start:end]
+    return (value if length >= ZERO_COPY_MIN else bytes(value)), end
+
+
+def decode(data, spans=None):
+    """Decode bencoded data (bytes, a memoryview or an mmap)
+
+    Byte strings of ZERO_COPY_MIN bytes or more come back as memoryviews
+    into data, shorter ones (and all dictionary keys) as bytes. When spans
+    is a dict it receives {key: (start, end)} with the byte range of every
+    value of the top-level dictionary, so e.g. the info dict can be hashed
+    exactly as it appears in the file.
+    """
+    buf = memoryview(data).cast("B")
+    try:
+        value, _ = _decode(buf, 0, 0, spans)
+    except IndexError:
+        raise BencodeError("Data ends in the middle of a value") from None
+    return value
+
+
+def _text(value):
+    return bytes(value).decode("utf-8", errors="replace")
+
+
+def _utf8_field(info, key):
+    # Older clients put the UTF-8 version of a field under "<key>.utf-8"
+    return _text(info.get(key + b".utf-8", info.get(key, b"")))
+
+
+def _v1_files(info, name):
+    """Files of a v1 (or hybrid) torrent in piece order, padding included"""
+    if b"files" not in info:
+        return [{"path": name, "size": info[b"length"], "offset": 0, "pad": False}]
+    files = []
+    offset = 0
+    for entry in info[b"files"]:
+        parts = entry.get(b"path.utf-8", entry.get(b"path", []))
+        files.append(
+            {
+                "path": "/".join([name] + [_text(part) for part in parts]),
+                "size": entry[b"length"],
+                "offset": offset,
+                "pad": b"p" in entry.get(b"attr", b""),
+            }
+        )
+        offset += entry[b"length"]
+    return files
+
+
+def _v2_files(tree, prefix, files):
+    """Flatten a v2 "file tree" into files, in the tree's (sorted) order"""
+    for key, node in tree.items():
+        if key == b"":
+            continue
+        path = f"{prefix}/{_text(key)}" if prefix else _text(key)
+        leaf = node.get(b"")
+        if leaf is not None:
+            files.append(
+                {
+                    "path": path,
+                    "size": leaf[b"length"],
+                    "pieces_root": bytes(leaf.get(b"pieces root", b"")),
+                }
+            )
+        else:
+            _v2_files(node, path, files)
+    return files
+
+
+def parse_torrent(data):
+    """Parse the contents of a .torrent file into a dict
+
+    - "name", "private", "piece_length", "size" (excluding padding files)
+    - "infohash_v1" / "infohash_v2": hex digests of the info dict's bytes,
+      None when the torrent isn't v1 / v2
+    - "id": the hash qBittorrent identifies the torrent by (v1, or the v2
+      hash truncated to 40 characters for v2-only torrents)
+    - "files": [{"path", "size", "offset", "pad"}] in piece order for v1
+      and hybrid torrents, [{"path", "size", "pieces_root"}] for v2-only
+      ones; paths are "/"-joined like qBittorrent's and include the root
+      folder of multi-file torrents
+    - "pieces": the concatenated 20-byte SHA-1 piece hashes (memoryview)
+    - "piece_layers": {pieces root: concatenated SHA-256 hashes} for v2
+    - "trackers": announce URLs, tiers flattened
+    """
+    spans = {}
+    meta = decode(data, spans)
+    if not isinstance(meta, dict) or not isinstance(meta.get(b"info"), dict):
+        raise BencodeError("Not a torrent: no info dictionary")
+    info = meta[b"info"]
+    start, end = spans[b"info"]
+    info_bytes = memoryview(data).cast("B")[start:end]
+
+    v2 = info.get(b"meta version") == 2
+    v1 = b"pieces" in info
+    if not v1 and not v2:
+        raise BencodeError("Not a torrent: no pieces and no v2 file tree")
+    name = _utf8_field(info, b"name")
+    infohash_v1 = hashlib.sha1(info_bytes).hexdigest() if v1 else None
+    infohash_v2 = hashlib.sha256(info_bytes).hexdigest() if v2 else None
+
+    if v1:
+        files = _v1_files(info, name)
+    else:
+        files = _v2_files(info.get(b"file tree", {}), "", [])
+        if len(files) > 1 or files and files[0]["path"] != name:
+            # Multi-file torrents live in a folder named after the torrent
+            for entry in files:
+                entry["path"] = f"{name}/{entry['path']}"
+
+    trackers = []
+    for tier in meta.get(b"announce-list", []) or [[meta.get(b"announce", b"")]]:
+        for url in tier:
+            url = _text(url)
+            if url and url not in trackers:
+                trackers.append(url)
+
+    return {
+        "name": name,
+        "private": info.get(b"private") == 1,
+        "piece_length": info.get(b"piece length", 0),
+        "size": sum(f["size"] for f in files if not f.get("pad")),
+        "infohash_v1": infohash_v1,
+        "infohash_v2": infohash_v2,
+        "id": infohash_v1 or infohash_v2[:40],
+        "files": files,
+        "pieces": memoryview(info[b"pieces"]) if v1 else None,
+        "piece_layers": {
+            bytes(root): memoryview(layer)
+            for root, layer in meta.get(b"piece layers", {}).items()
+        },
+        "trackers": trackers,
+    }
+
+
+def read_torrent(path):
+    """parse_torrent() of a .torrent file, mapped into memory rather than read
+
+    The pieces and piece layer memoryviews point into the mapping, which
+    stays open for as long as they are referenced.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise BencodeError(f"{path} is empty")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    torrent = parse_torrent(data)
+    torrent["path"] = path
+    return torrent
+
+
+def torrent_summary(path):
+    """read_torrent() without the piece hashes, small enough to send between processes"""
+    torrent = read_torrent(path)
+    del torrent["pieces"], torrent["piece_layers"]
+    return torrent
+
+
+def _summarize(path):
+    # Runs in a worker process, never raises so one bad file can't stop the run
+    try:
+        return path, torrent_summary(path), None
+    except (OSError, BencodeError, KeyError, TypeError, AttributeError) as e:
+        return path, None, str(e) or type(e).__name__
+
+
+def iter_torrent_folder(folder=None, workers=None):
+    """Parse every .torrent file under folder in a pool of processes
+
+    folder defaults to TORRENT_FOLDER and workers to PARSE_WORKERS. Events:
+
+    - {"type": "torrent", "torrent": torrent_summary()}
+    - {"type": "error", "path": path, "message": text}
+    """
+    folder = folder or TORRENT_FOLDER
+    workers = PARSE_WORKERS if workers is None else workers
+    paths = []
+    for dirpath, _, filenames in os.walk(folder):
+        paths.extend(
+            os.path.join(dirpath, name)
+            for name in filenames
+            if name.lower().endswith(".torrent")
+        )
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        for path, torrent, error in executor.map(_summarize, paths, chunksize=64):
+            if error is None:
+                yield {"type": "torrent", "torrent": torrent}
+            else:
+                yield {"type": "error", "path": path, "message": error}
+
+
+def index_torrent_folder(folder=None, workers=None):
+    """{qBittorrent hash: torrent_summary()} for a folder of .torrent files,
+    plus a list of (path, error message) for the files that couldn't be read
+    """
+    index = {}
+    errors = []
+    for event in iter_torrent_folder(folder, workers):
+        if event["type"] == "torrent":
+            index[event["torrent"]["id"]] = event["torrent"]
+        else:
+            errors.append((event["path"], event["message"]))
+    return index, errors
+
+
+def main():
+    target = sys.argv[1] if len(sys.argv) > 1 else TORRENT_FOLDER
+    if not target:
+        print("❌ Pass a .torrent file or folder, or set TORRENT_FOLDER")
+        return False
+
+    if os.path.isfile(target):
+        try:
+            torrent = read_torrent(target)
+        except (OSError, BencodeError) as e:
+            print(f"❌ {e}")
+            return False
+        print(f"📄 {torrent['name']}")
+        print(f"   v1: {torrent['infohash_v1'] or '-'}")
+        print(f"   v2: {torrent['infohash_v2'] or '-'}")
+        print(
+            f"   {len(torrent['files'])} files, {format_bytes(torrent['size'])}, "
+            f"pieces of {format_bytes(torrent['piece_length'])}"
+        )
+        return True
+
+    index, errors = index_torrent_folder(target)
+    total = sum(torrent["size"] for torrent in index.values())
+    print(f"📚 {len(index)} torrents in {target}, {format_bytes(total)} of content")
+    for path, message in errors:
+        print(f"❌ {path}: {message}")
+    return not errors
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import copy
+import time
+import threading
+from dotenv import load_dotenv
+from qb_client import get_client, iter_json_object, project
+from torrent_table import TorrentTable
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Seconds a fetched torrent listing is shared before asking qBittorrent again
+TORRENT_CACHE_TTL = float(os.getenv("TORRENT_CACHE_TTL", "5"))
+
+
+class TorrentStore:
+    """In-memory mirror of qBittorrent's torrents, categories and tags
+
+    Bootstraps from /api/v2/sync/maindata and then applies the rid-based
+    deltas qBittorrent sends on every following refresh, so only changed
+    fields travel over the wire.
+
+    Only the torrent fields callers declared with require_fields() are kept
+    (all of them once a caller asks for fields=None), and responses are
+    parsed one torrent at a time, so memory scales with those fields rather
+    than with the full payload.
+    """
+
+    def __init__(self, client, fields=()):
+        self.client = client
+        self.fields = None if fields is None else set(fields)
+        self.rid = 0
+        self.torrents_by_hash = {}
+        self.categories = {}
+        self.tags = set()
+        self.server_state = {}
+        self._table = None
+        self._lock = threading.Lock()
+
+    def require_fields(self, fields):
+        """Start keeping the given torrent fields (None = every field)
+
+        Returns True if that widened the kept fields, in which case the next
+        refresh is a full one so the new fields get filled in.
+        """
+        with self._lock:
+            if self.fields is None:
+                return False
+            if fields is not None:
+                if set(fields) <= self.fields:
+                    return False
+                self.fields |= set(fields)
+            else:
+                self.fields = None
+            self.rid = 0
+            return True
+
+    def refresh(self):
+        """Fetch and apply the changes since the last refresh"""
+        with self._lock:
+            data = {"torrents": {}}
+            chunks = self.client.stream("sync/maindata", params={"rid": self.rid})
+            for key, value in iter_json_object(chunks, expand=("torrents",)):
+                if isinstance(key, tuple):
+                    data["torrents"][key[1]] = project(value, self.fields)
+                else:
+                    data[key] = value
+            self._apply(data)
+
+    def _apply(self, data):
+        if data.get("full_update"):
+            self.torrents_by_hash = {}
+            self.categories = {}
+            self.tags = set()
+            self.server_state = {}
+            self._table = None
+
+        for torrent_hash, changes in data.get("torrents", {}).items():
+            torrent = self.torrents_by_hash.setdefault(
+                torrent_hash, {"hash": torrent_hash}
+            )
+            torrent.update(changes)
+            if self._table is not None:
+                self._table.set(torrent)
+        for torrent_hash in data.get("torrents_removed", []):
+            self.torrents_by_hash.pop(torrent_hash, None)
+            if self._table is not None:
+                self._table.remove(torrent_hash)
+
+        for name, changes in data.get("categories", {}).items():
+            self.categories.setdefault(name, {}).update(changes)
+        for name in data.get("categories_removed", []):
+            self.categories.pop(name, None)
+
+        self.tags.update(data.get("tags", []))
+        self.tags.difference_update(data.get("tags_removed", []))
+
+        self.server_state.update(data.get("server_state", {}))
+        self.rid = data.get("rid", self.rid)
+
+    def torrents(self, refresh=True):
+        """Return a snapshot list of torrent dicts, refreshing first by default
+
+        The dicts are copies, callers can't corrupt the store by editing them.
+        """
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return [copy.copy(t) for t in self.torrents_by_hash.values()]
+
+    def table(self, refresh=True):
+        """Return a TorrentTable snapshot, refreshing first by default
+
+        The table is built once and then kept current from the deltas, only
+        the rows of changed torrents are touched. Columns of fields nobody
+        declared with require_fields() read as 0 / unknown.
+        """
+        if refresh:
+            self.refresh()
+        with self._lock:
+            if self._table is None:
+                self._table = TorrentTable.from_torrents(self.torrents_by_hash.values())
+            return self._table.copy()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightCache:
+    """Cache one value for ttl seconds, loading it at most once at a time
+
+    Callers arriving while a load is in progress wait for it and share its
+    result (or its exception) instead of starting their own.
+    """
+
+    def __init__(self, loader, ttl):
+        self.loader = loader
+        self.ttl = ttl
+        self._value = None
+        self._loaded_at = None
+        self._generation = 0
+        self._flight = None
+        self._lock = threading.Lock()
+
+    def get(self, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+
+        with self._lock:
+            if (
+                self._loaded_at is not None
+                and time.monotonic() - self._loaded_at < max_age
+            ):
+                return self._value
+
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+                generation = self._generation
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self.loader()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flight is flight:
+                    self._flight = None
+                # Don't cache a result that was invalidated while loading
+                if flight.error is None and generation == self._generation:
+                    self._value = flight.value
+                    self._loaded_at = time.monotonic()
+            flight.done.set()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def invalidate(self):
+        """Drop the cached value so the next get() loads a fresh one
+
+        A load already in progress is detached too: its current waiters
+        still get its result, later callers start a new load.
+        """
+        with self._lock:
+            self._value = None
+            self._loaded_at = None
+            self._flight = None
+            self._generation += 1
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide store for the current qBittorrent client"""
+    global _store
+
+    client = get_client()
+    with _store_lock:
+        if _store is None or _store.client is not client:
+            _store = TorrentStore(client)
+        return _store
+
+
+_listing_cache = SingleFlightCache(lambda: get_store().torrents(), TORRENT_CACHE_TTL)
+
+
+def get_torrents(fields=None, max_age=None):
+    """Current torrent list, transferring only what changed since last time
+
+    Each torrent dict holds "hash" plus the requested fields (every field
+    if fields is None). Listings are shared for TORRENT_CACHE_TTL seconds
+    (or max_age) and concurrent callers share a single request. Treat the
+    result as read-only.
+    """
+    if get_store().require_fields(fields):
+        _listing_cache.invalidate()
+
+    torrents = _listing_cache.get(max_age)
+    if fields is None:
+        return torrents
+    keep = ("hash",) + tuple(fields)
+    return [project(t, keep) for t in torrents]
+
+
+def get_torrent_table(fields):
+    """TorrentTable of the current torrents, see TorrentStore.table()
+
+    fields are the table columns the caller reads, e.g. ("category", "size").
+    """
+    store = get_store()
+    if store.require_fields(fields):
+        _listing_cache.invalidate()
+    return store.table()
+
+
+def invalidate_torrents():
+    """Forget the cached listing, call after anything that changes torrents"""
+    _listing_cache.invalidate()
@@ -0,0 +1,211 @@
+from array import array
+
+# NumPy is optional - aggregations fall back to plain Python without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+UNCATEGORIZED = "Uncategorized"
+
+
+class TorrentTable:
+    """Column-oriented torrent table for statistics and charts
+
+    Numeric fields are stored in typed arrays and states/categories are
+    interned as small integer codes, so a row costs a few dozen bytes
+    instead of a full dict. Aggregations use NumPy when it is installed.
+    Rows are keyed by torrent hash, so a table can be kept current with
+    set() and remove() instead of being rebuilt.
+    """
+
+    __slots__ = (
+        "size",
+        "downloaded",
+        "uploaded",
+        "progress",
+        "state",
+        "category",
+        "state_labels",
+        "category_labels",
+        "_state_codes",
+        "_category_codes",
+        "keys",
+        "_rows",
+    )
+
+    INT_COLUMNS = ("size", "downloaded", "uploaded")
+    FLOAT_COLUMNS = ("progress",)
+
+    def __init__(self):
+        self.size = array("q")
+        self.downloaded = array("q")
+        self.uploaded = array("q")
+        self.progress = array("d")
+        self.state = array("H")
+        self.category = array("H")
+        self.state_labels = []
+        self.category_labels = []
+        self._state_codes = {}
+        self._category_codes = {}
+        self.keys = []
+        self._rows = {}
+
+    @classmethod
+    def from_torrents(cls, torrents):
+        table = cls()
+        for torrent in torrents:
+            table.append(torrent)
+        return table
+
+    def copy(self):
+        """Independent copy, cheap since columns are flat arrays"""
+        table = TorrentTable()
+        for name in ("size", "downloaded", "uploaded", "progress", "state", "category"):
+            column = getattr(self, name)
+            setattr(table, name, array(column.typecode, column))
+        table.state_labels = list(self.state_labels)
+        table.category_labels = list(self.category_labels)
+        table._state_codes = dict(self._state_codes)
+        table._category_codes = dict(self._category_codes)
+        table.keys = list(self.keys)
+        table._rows = dict(self._rows)
+        return table
+
+    def __len__(self):
+        return len(self.size)
+
+    @staticmethod
+    def _intern(codes, labels, label):
+        code = codes.get(label)
+        if code is None:
+            code = codes[label] = len(labels)
+            labels.append(label)
+        return code
+
+    def _values(self, torrent):
+        return (
+            torrent.get("size", 0) or 0,
+            torrent.get("downloaded", 0) or 0,
+            torrent.get("uploaded", 0) or 0,
+            torrent.get("progress", 0.0) or 0.0,
+            self._intern(
+                self._state_codes, self.state_labels, torrent.get("state", "unknown")
+            ),
+            self._intern(
+                self._category_codes,
+                self.category_labels,
+                torrent.get("category") or UNCATEGORIZED,
+            ),
+        )
+
+    def _columns(self):
+        return (
+            self.size,
+            self.downloaded,
+            self.uploaded,
+            self.progress,
+            self.state,
+            self.category,
+        )
+
+    def append(self, torrent):
+        """Add one torrent dict; missing fields count as 0 / unknown"""
+        key = torrent.get("hash", len(self.keys))
+        self._rows[key] = len(self.keys)
+        self.keys.append(key)
+        for column, value in zip(self._columns(), self._values(torrent)):
+            column.append(value)
+
+    def set(self, torrent):
+        """Add a torrent dict or overwrite the row with the same hash"""
+        row = self._rows.get(torrent.get("hash"))
+        if row is None:
+            self.append(torrent)
+            return
+        for column, value in zip(self._columns(), self._values(torrent)):
+            column[row] = value
+
+    def remove(self, key):
+        """Drop the row of a torrent hash; the last row takes its place"""
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self.keys) - 1
+        for column in self._columns():
+            column[row] = column[last]
+            column.pop()
+        if row != last:
+            self.keys[row] = self.keys[last]
+            self._rows[self.keys[row]] = row
+        self.keys.pop()
+
+    def _group(self, by):
+        if by == "state":
+            return self.state, self.state_labels
+        if by == "category":
+            return self.category, self.category_labels
+        raise ValueError(f"Can't group torrents by {by!r}")
+
+    def total(self, column):
+        """Sum of a numeric column"""
+        return sum(getattr(self, column))
+
+    def ratio(self):
+        """Overall upload/download ratio"""
+        downloaded = self.total("downloaded")
+        return self.total("uploaded") / downloaded if downloaded > 0 else 0
+
+    def counts(self, by="state"):
+        """Number of torrents per state or category label"""
+        codes, labels = self._group(by)
+        if np is not None and len(codes):
+            totals = np.bincount(
+                np.frombuffer(codes, dtype=np.uint16), minlength=len(labels)
+            ).tolist()
+        else:
+            totals = [0] * len(labels)
+            for code in codes:
+                totals[code] += 1
+        return dict(zip(labels, totals))
+
+    def group_sum(self, column, by="category"):
+        """Sum of a numeric column per state or category label"""
+        codes, labels = self._group(by)
+        values = getattr(self, column)
+        if np is not None and len(codes):
+            dtype = np.int64 if column in self.INT_COLUMNS else np.float64
+            totals = np.zeros(len(labels), dtype=dtype)
+            np.add.at(
+                totals,
+                np.frombuffer(codes, dtype=np.uint16),
+                np.frombuffer(values, dtype=dtype),
+            )
+            totals = totals.tolist()
+        else:
+            totals = [0] * len(labels)
+            for code, value in zip(codes, values):
+                totals[code] += value
+        return dict(zip(labels, totals))
+
+    def group_ratio(self, by="category"):
+        """Upload/download ratio per state or category label"""
+        uploaded = self.group_sum("uploaded", by)
+        downloaded = self.group_sum("downloaded", by)
+        return {
+            label: uploaded[label] / downloaded[label] if downloaded[label] > 0 else 0
+            for label in uploaded
+        }
+
+    def count_where(self, by, labels):
+        """Number of torrents whose state/category is one of labels"""
+        codes, _ = self._group(by)
+        lookup = self._state_codes if by == "state" else self._category_codes
+        wanted = {lookup[label] for label in labels if label in lookup}
+        if not wanted:
+            return 0
+        if np is not None and len(codes):
+            return int(
+                np.isin(np.frombuffer(codes, dtype=np.uint16), list(wanted)).sum()
+            )
+        return sum(1 for code in codes if code in wanted)
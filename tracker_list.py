@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import hashlib
+import requests
+from urllib.parse import urlsplit, urlunsplit
+from dotenv import load_dotenv
+from qb_client import REQUEST_TIMEOUT, state_path
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Best trackers list, updated regularly
+TRACKERS_URL = (
+    "https://raw.githubusercontent.com/ngosang/trackerslist/master/trackers_best.txt"
+)
+
+# Comma-separated list of tracker list URLs and/or local files to merge
+TRACKER_SOURCES = [
+    source.strip()
+    for source in os.getenv("TRACKER_SOURCES", TRACKERS_URL).split(",")
+    if source.strip()
+]
+
+# Where downloaded lists are cached, and how long (seconds) a copy stays fresh
+TRACKER_CACHE_DIR = state_path(os.getenv("TRACKER_CACHE_DIR", ".tracker_cache"))
+TRACKER_CACHE_MAX_AGE = int(os.getenv("TRACKER_CACHE_MAX_AGE", "3600"))
+
+
+def is_url(source):
+    return urlsplit(source).scheme in ("http", "https")
+
+
+def normalize_tracker(tracker):
+    """Normalize an announce URL so that trivial variants compare equal"""
+    tracker = tracker.strip()
+    if not tracker or tracker.startswith("#"):
+        return None
+
+    parts = urlsplit(tracker)
+    if not parts.scheme or not parts.netloc:
+        return None
+
+    # Scheme and host are case-insensitive, the path is not
+    netloc = parts.netloc.lower()
+    scheme = parts.scheme.lower()
+
+    # Drop default ports so "http://x:80/announce" == "http://x/announce"
+    if (scheme == "http" and netloc.endswith(":80")) or (
+        scheme == "https" and netloc.endswith(":443")
+    ):
+        netloc = netloc.rsplit(":", 1)[0]
+
+    return urlunsplit((scheme, netloc, parts.path, parts.query, ""))
+
+
+def parse_tracker_text(text):
+    """Return the normalized trackers in a list body, in order"""
+    trackers = []
+    for line in text.splitlines():
+        tracker = normalize_tracker(line)
+        if tracker:
+            trackers.append(tracker)
+    return trackers
+
+
+def merge_tracker_lists(lists):
+    """Merge several tracker lists into one, keeping first-seen order"""
+    seen = set()
+    merged = []
+    for trackers in lists:
+        for tracker in trackers:
+            if tracker not in seen:
+                seen.add(tracker)
+                merged.append(tracker)
+    return merged
+
+
+def _cache_paths(url, cache_dir):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return (
+        os.path.join(cache_dir, f"{key}.txt"),
+        os.path.join(cache_dir, f"{key}.json"),
+    )
+
+
+def _read_cache(url, cache_dir):
+    body_path, meta_path = _cache_paths(url, cache_dir)
+    try:
+        with open(body_path, "r", encoding="utf-8") as f:
+            body = f.read()
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return body, meta
+    except (OSError, ValueError):
+        return None, {}
+
+
+def _write_cache(url, cache_dir, body, meta):
+    body_path, meta_path = _cache_paths(url, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    for path, content in ((body_path, body), (meta_path, json.dumps(meta))):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+def fetch_url_cached(url, cache_dir=None, max_age=None, session=None):
+    """Fetch a tracker list URL through the on-disk cache
+
+    A cached copy younger than max_age is used without any request. Older
+    copies are revalidated with If-None-Match / If-Modified-Since, and if the
+    request fails the last good copy is returned instead. Returns the body
+    text, or None if nothing is available.
+    """
+    cache_dir = cache_dir or TRACKER_CACHE_DIR
+    max_age = TRACKER_CACHE_MAX_AGE if max_age is None else max_age
+    http = session or requests
+
+    body, meta = _read_cache(url, cache_dir)
+    now = time.time()
+
+    if body is not None and now - meta.get("fetched_at", 0) < max_age:
+        print(f"ℹ️ Using cached tracker list for {url}")
+        return body
+
+    headers = {}
+    if body is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = http.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304 and body is not None:
+            meta["fetched_at"] = now
+            try:
+                _write_cache(url, cache_dir, body, meta)
+            except OSError as e:
+                print(f"⚠️ Could not cache tracker list: {e}")
+            print(f"ℹ️ Tracker list unchanged: {url}")
+            return body
+
+        response.raise_for_status()
+        body = response.text
+        meta = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": now,
+        }
+        try:
+            _write_cache(url, cache_dir, body, meta)
+        except OSError as e:
+            print(f"⚠️ Could not cache tracker list: {e}")
+        return body
+
+    except requests.exceptions.RequestException as e:
+        if body is not None:
+            print(f"⚠️ Error fetching {url}: {e}")
+            print("ℹ️ Falling back to the last cached copy.")
+            return body
+        print(f"❌ Error fetching trackers from {url}: {e}")
+        return None
+
+
+def read_source(source, cache_dir=None, max_age=None, session=None):
+    """Return the raw text of a URL or local file source, or None"""
+    if is_url(source):
+        return fetch_url_cached(source, cache_dir, max_age, session)
+
+    try:
+        with open(os.path.expanduser(source), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError as e:
+        print(f"❌ Error reading tracker file {source}: {e}")
+        return None
+
+
+def get_trackers(sources=None, cache_dir=None, max_age=None):
+    """Fetch, merge and normalize the trackers from every configured source"""
+    sources = sources or TRACKER_SOURCES
+    lists = []
+    with requests.Session() as session:
+        for source in sources:
+            text = read_source(source, cache_dir, max_age, session)
+            if text is not None:
+                lists.append(parse_tracker_text(text))
+    return merge_tracker_lists(lists)
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import random
+import socket
+import struct
+import requests
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from qb_client import state_path
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Probe settings
+TRACKER_PROBE_TIMEOUT = float(os.getenv("TRACKER_PROBE_TIMEOUT", "3"))
+TRACKER_PROBE_WORKERS = int(os.getenv("TRACKER_PROBE_WORKERS", "32"))
+TRACKER_PROBE_CACHE = state_path(
+    os.getenv("TRACKER_PROBE_CACHE", ".tracker_probe.json")
+)
+TRACKER_PROBE_TTL = int(os.getenv("TRACKER_PROBE_TTL", "21600"))
+
+# BEP 15 connect request constants
+UDP_PROTOCOL_ID = 0x41727101980
+UDP_ACTION_CONNECT = 0
+
+# qBittorrent /torrents/trackers status values
+TRACKER_STATUS_NOT_WORKING = 4
+
+
+def probe_http(url, timeout=None):
+    """An HTTP(S) tracker is alive if it answers the announce URL at all"""
+    timeout = TRACKER_PROBE_TIMEOUT if timeout is None else timeout
+    try:
+        with requests.get(
+            url, timeout=(timeout, timeout), allow_redirects=False, stream=True
+        ) as response:
+            # Announces without an info_hash are normally rejected with a
+            # 200 failure reason or a 4xx, both prove the tracker is up
+            return response.status_code < 500
+    except requests.exceptions.RequestException:
+        return False
+
+
+def probe_udp(url, timeout=None):
+    """Send a BEP 15 connect request and check for a matching reply"""
+    timeout = TRACKER_PROBE_TIMEOUT if timeout is None else timeout
+    parts = urlsplit(url)
+    if not parts.hostname or not parts.port:
+        return False
+
+    transaction_id = random.getrandbits(32)
+    request = struct.pack(">QII", UDP_PROTOCOL_ID, UDP_ACTION_CONNECT, transaction_id)
+
+    try:
+        # Resolve first so IPv6-only trackers use the right socket family
+        family, _, _, _, address = socket.getaddrinfo(
+            parts.hostname, parts.port, 0, socket.SOCK_DGRAM
+        )[0]
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            sock.sendto(request, address)
+            data, _ = sock.recvfrom(2048)
+    except (OSError, IndexError):
+        return False
+
+    if len(data) < 16:
+        return False
+    action, reply_transaction_id = struct.unpack(">II", data[:8])
+    return action == UDP_ACTION_CONNECT and reply_transaction_id == transaction_id
+
+
+def probe_tracker(url, timeout=None):
+    """Return True/False for a live/dead tracker, or None if it can't be probed"""
+    scheme = urlsplit(url).scheme.lower()
+    if scheme in ("http", "https"):
+        return probe_http(url, timeout)
+    if scheme == "udp":
+        return probe_udp(url, timeout)
+    # e.g. wss:// WebTorrent trackers
+    return None
+
+
+def load_probe_cache(path=None):
+    path = path or TRACKER_PROBE_CACHE
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_probe_cache(cache, path=None):
+    path = path or TRACKER_PROBE_CACHE
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def probe_trackers(urls, workers=None, timeout=None, ttl=None, cache_path=None):
+    """Probe trackers concurrently, reusing cached results younger than ttl
+
+    Returns a {url: True/False/None} dict. Pass ttl=0 to ignore the cache.
+    """
+    workers = TRACKER_PROBE_WORKERS if workers is None else workers
+    ttl = TRACKER_PROBE_TTL if ttl is None else ttl
+
+    cache = load_probe_cache(cache_path)
+    now = time.time()
+    results = {}
+    to_probe = []
+
+    for url in dict.fromkeys(urls):
+        entry = cache.get(url)
+        if entry and now - entry.get("checked_at", 0) < ttl:
+            results[url] = entry.get("alive")
+        else:
+            to_probe.append(url)
+
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            probed = executor.map(lambda url: probe_tracker(url, timeout), to_probe)
+            for url, alive in zip(to_probe, probed):
+                results[url] = alive
+                cache[url] = {"alive": alive, "checked_at": now}
+
+        try:
+            save_probe_cache(cache, cache_path)
+        except OSError as e:
+            print(f"⚠️ Could not save tracker probe cache: {e}")
+
+    return results
+
+
+def filter_live_trackers(urls, **kwargs):
+    """Return the trackers that answered (or can't be probed), in order"""
+    results = probe_trackers(urls, **kwargs)
+    live = [url for url in urls if results.get(url) is not False]
+    print(f"ℹ️ {len(live)} of {len(urls)} trackers are reachable.")
+    return live
+
+
+def dead_trackers_from_status(trackers):
+    """Pick the announce URLs qBittorrent reports as not working
+
+    Takes the list returned by /api/v2/torrents/trackers. The DHT, PeX and
+    LSD pseudo-entries are never returned.
+    """
+    return [
+        t["url"]
+        for t in trackers
+        if t.get("status") == TRACKER_STATUS_NOT_WORKING
+        and not t["url"].startswith("** [")
+    ]